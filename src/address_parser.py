@@ -1,16 +1,74 @@
 """
 Модуль для парсинга российских адресов с помощью Natasha.
 Результат — словарь с разбитыми по полям компонентами адреса:
-индекс, регион, район, населённый пункт, улица, дом, квартира.
+индекс, регион (с кодом субъекта из справочника regions.py), район,
+населённый пункт, улица, дом, квартира.
 
 Функция parse_address поддерживает основные варианты написания и сокращения
 адресов, а также обработки для случаев, когда Natasha не распознаёт компонент.
 """
 
 import re
+import sys
+import time
 
 from natasha import AddrExtractor, MorphVocab
 
+from metrics import count, stage, timed
+from regions import region_id_by_name, resolve_region
+
+# Уровни разбора: полный (с Natasha) или только индекс, регион и район
+ADDRESS_LEVELS = ('full', 'region')
+
+POSTAL_CODE_RE = re.compile(r'(?<!\d)(\d{6})(?!\d)')
+DISTRICT_RE = re.compile(r'([А-Яа-яё\-]+)\s+(?:район\b|р-н\b|р-он\b)')
+# Части адреса, после которых регион уже не ищется
+STREET_PART_RE = re.compile(
+    r'^\s*(?:ул\b|улица|пр-кт|просп|пер\b|ш\b|шоссе|мкр|микрорайон|пл\b|д\b)',
+    re.IGNORECASE,
+)
+
+# Нормализация сокращений одним проходом: «гор.» -> «г.», «р-н»/«р-он»
+# -> «район»
+NORMALIZE_RE = re.compile(r'\bгор\.\s*|\bр-о?н\b', re.IGNORECASE)
+# Разделитель адресов при пакетной нормализации (в адресах не встречается)
+BATCH_SEPARATOR = '\x00'
+MKR_RE = re.compile(r'мкр\.?\s*\d+[а-яА-Я]?', re.IGNORECASE)
+TER_RE = re.compile(r'тер\.?\s*[^,]+', re.IGNORECASE)
+DISTRICT_WORD_RE = re.compile(r'([А-Яа-яё\-]+)\s+район')
+NOT_LOCALITY_RE = re.compile(
+    r'(район|р-н|ул\.|улица|мкр\.|микрорайон|просп\.|пер\.|шоссе|пл\.|дом|д\.)',
+    re.IGNORECASE,
+)
+NOT_LOCALITY_AFTER_DISTRICT_RE = re.compile(
+    r'(ул\.|улица|мкр\.|микрорайон|просп\.|пер\.|шоссе|пл\.|дом|д\.)',
+    re.IGNORECASE,
+)
+RP_RE = re.compile(r'р\.п\.?\s*([А-Яа-яё\- ]+?)(?:,|ул\.|улица|$)')
+STANICA_RE = re.compile(r'ст\.?\s*([А-Яа-яё\- ]+?)(?:,|ул\.|улица|$)')
+
+# Бюджет на один адрес. Адреса длиннее max_length, а также адреса
+# с несколькими индексами или больше чем из max_segments частей через
+# запятую (обычно это несколько склеенных адресов или свободный текст)
+# разбираются только шаблонами: эти проверки дешёвые и делаются до Natasha.
+# max_seconds — не ограничение, а порог для отчёта: прервать Natasha нельзя,
+# поэтому адреса, на которых она потратила больше max_seconds процессорного
+# времени потока, выводятся в stderr и считаются в метриках, но результат
+# Natasha сохраняется. Ноль или None отключает проверку.
+DEFAULT_MAX_LENGTH = 200
+DEFAULT_MAX_SEGMENTS = 12
+DEFAULT_MAX_SECONDS = 0.25
+BUDGET = {
+    'max_length': DEFAULT_MAX_LENGTH,
+    'max_segments': DEFAULT_MAX_SEGMENTS,
+    'max_seconds': DEFAULT_MAX_SECONDS,
+}
+OVER_BUDGET_MESSAGES = {
+    'length': 'Адрес разобран без Natasha',
+    'shape': 'Адрес похож на несколько адресов, разобран без Natasha',
+    'time': 'Natasha разбирала адрес дольше порога',
+}
+
 morph_vocab = MorphVocab()
 addr_extractor = AddrExtractor(morph_vocab)
 
@@ -45,30 +103,66 @@ PART_TYPE_MAP = {
 }
 
 
-def parse_address(address):
+def add_arguments(parser):
     """
-    Парсинг адресов с фиксированными полями. Возвращает словарь.
+    Добавляет в argparse-парсер ключи бюджета на разбор адреса.
     """
-    if not address:
-        return {
-            'raw': None,
-            'postal_code': None,
-            'region': None,
-            'district': None,
-            'locality': None,
-            'street': None,
-            'house': None,
-            'flat': None,
-        }
-
-    address = re.sub(r'\bгор\.\s*', 'г. ', address, flags=re.IGNORECASE)
-    address = re.sub(r'\bр-н\b', 'район', address, flags=re.IGNORECASE)
-    address = re.sub(r'\bр-он\b', 'район', address, flags=re.IGNORECASE)
-    matches = list(addr_extractor(address))
-    result = {
-        'raw': address,
+    parser.add_argument(
+        '--address-max-length',
+        type=int,
+        default=DEFAULT_MAX_LENGTH,
+        help='адреса длиннее разбирать без Natasha (0 — без ограничения)',
+    )
+    parser.add_argument(
+        '--address-max-segments',
+        type=int,
+        default=DEFAULT_MAX_SEGMENTS,
+        help='адреса из большего числа частей через запятую разбирать '
+        'без Natasha (0 — без ограничения)',
+    )
+    parser.add_argument(
+        '--address-max-seconds',
+        type=float,
+        default=DEFAULT_MAX_SECONDS,
+        help='сообщать об адресах, на которые Natasha тратит больше, с '
+        '(0 — не сообщать)',
+    )
+
+
+def configure(args):
+    """
+    Применяет бюджет из ключей командной строки.
+    """
+    set_budget(
+        args.address_max_length,
+        args.address_max_seconds,
+        args.address_max_segments,
+    )
+
+
+def set_budget(
+    max_length=DEFAULT_MAX_LENGTH,
+    max_seconds=DEFAULT_MAX_SECONDS,
+    max_segments=DEFAULT_MAX_SEGMENTS,
+):
+    """
+    :param max_length: максимальная длина адреса для Natasha, символов
+    :param max_seconds: порог для отчёта: адрес, на который Natasha
+        потратила больше, выводится в stderr, но результат сохраняется
+    :param max_segments: максимальное число частей адреса через запятую
+        для Natasha
+    """
+    BUDGET['max_length'] = max_length
+    BUDGET['max_seconds'] = max_seconds
+    BUDGET['max_segments'] = max_segments
+
+
+def _empty_result(raw):
+    return {
+        'raw': raw,
         'postal_code': None,
         'region': None,
+        'region_id': None,
         'district': None,
         'locality': None,
         'street': None,
@@ -76,6 +170,163 @@ def parse_address(address):
         'flat': None,
     }
 
+
+def _region_from_parts(address):
+    """
+    :return: первая часть адреса до улицы, в которой есть регион
+        из справочника (например, «г. Москва»), или None
+    """
+    for part in address.split(','):
+        if STREET_PART_RE.match(part):
+            break
+        if region_id_by_name(part):
+            return part.strip()
+    return None
+
+
+def parse_region(address):
+    """
+    Быстрый разбор без Natasha: индекс, регион и район.
+    Регион определяется по первым трём цифрам индекса, а если индекса
+    нет — по частям адреса до улицы (по справочнику regions.py).
+    :param address: строка адреса
+    :return: словарь с теми же полями, что у parse_address
+    """
+    result = _empty_result(address)
+    if not address:
+        return result
+    postal_match = POSTAL_CODE_RE.search(address)
+    if postal_match:
+        result['postal_code'] = postal_match.group(1)
+    result['region_id'], result['region'] = resolve_region(
+        _region_from_parts(address), result['postal_code']
+    )
+    district_match = DISTRICT_RE.search(address)
+    if district_match:
+        result['district'] = f'{district_match.group(1)} район'
+    return result
+
+
+def _normalize_match(match):
+    return 'г. ' if match.group(0)[0] in 'гГ' else 'район'
+
+
+def normalize_address(address):
+    """
+    Приводит сокращения «гор.», «р-н», «р-он» к виду, который
+    понимает Natasha.
+    """
+    return NORMALIZE_RE.sub(_normalize_match, address)
+
+
+def normalize_addresses(addresses):
+    """
+    Нормализует список адресов одним вызовом регулярного выражения
+    по склеенной строке.
+    :param addresses: список непустых строк адресов
+    :return: список нормализованных адресов в том же порядке
+    """
+    if not addresses:
+        return []
+    joined = normalize_address(BATCH_SEPARATOR.join(addresses))
+    return joined.split(BATCH_SEPARATOR)
+
+
+@timed('address')
+def parse_address(address, level='full'):
+    """
+    Парсинг адресов с фиксированными полями. Возвращает словарь.
+    :param address: строка адреса
+    :param level: 'full' — все поля (с Natasha), 'region' — только
+        индекс, регион и район без Natasha (см. parse_region)
+    """
+    if level == 'region':
+        return parse_region(address)
+    if not address:
+        return _empty_result(None)
+    return _extract(normalize_address(address))
+
+
+def parse_addresses(addresses, level='full'):
+    """
+    Пакетный разбор адресов. Одинаковые строки разбираются один раз,
+    нормализация выполняется для всего пакета сразу.
+    :param addresses: итерируемый объект строк адресов (допускается None)
+    :param level: 'full' или 'region', как у parse_address
+    :return: список словарей в порядке входных адресов; для одинаковых
+        адресов возвращается один и тот же словарь
+    """
+    addresses = list(addresses)
+    unique = list(dict.fromkeys(address for address in addresses if address))
+    count('address_duplicates', len(addresses) - len(unique))
+    if level == 'region':
+        parsed = dict(zip(unique, map(parse_region, unique)))
+    else:
+        parsed = {}
+        for address, normalized in zip(unique, normalize_addresses(unique)):
+            with stage('address'):
+                parsed[address] = _extract(normalized)
+    empty = _empty_result(None)
+    return [parsed[address] if address else empty for address in addresses]
+
+
+def _over_budget(address, reason, detail):
+    count(f'address_over_{reason}')
+    message = OVER_BUDGET_MESSAGES[reason]
+    print(f'{message} ({detail}): {address[:200]!r}', file=sys.stderr)
+
+
+def _joined_address(address):
+    """
+    :return: описание, почему адрес похож на несколько склеенных адресов
+        или свободный текст, или None
+    """
+    postal_codes = len(POSTAL_CODE_RE.findall(address))
+    if postal_codes > 1:
+        return f'индексов: {postal_codes}'
+    max_segments = BUDGET['max_segments']
+    segments = address.count(',') + 1
+    if max_segments and segments > max_segments:
+        return f'частей: {segments}'
+    return None
+
+
+def _natasha_matches(address):
+    """
+    Компоненты адреса от Natasha в пределах бюджета (BUDGET).
+    Прервать Natasha на середине нельзя, поэтому длина и форма адреса
+    проверяются заранее, а время — после вызова и только для статистики:
+    готовый результат не отбрасывается. Время считается по процессору текущего
+    потока (time.thread_time), чтобы конкуренция потоков за GIL
+    не выдавала обычные адреса за медленные.
+    :return: список совпадений или пустой список, если адрес слишком
+        длинный или похож на несколько адресов
+    """
+    max_length = BUDGET['max_length']
+    if max_length and len(address) > max_length:
+        _over_budget(address, 'length', f'{len(address)} символов')
+        return []
+    joined = _joined_address(address)
+    if joined:
+        _over_budget(address, 'shape', joined)
+        return []
+    started = time.thread_time()
+    matches = list(addr_extractor(address))
+    elapsed = time.thread_time() - started
+    max_seconds = BUDGET['max_seconds']
+    if max_seconds and elapsed > max_seconds:
+        _over_budget(address, 'time', f'{elapsed:.3f} с')
+    return matches
+
+
+def _extract(address):
+    """
+    Разбор нормализованного адреса с помощью Natasha и шаблонов.
+    Если адрес не укладывается в бюджет, работают только шаблоны.
+    """
+    matches = _natasha_matches(address)
+    result = _empty_result(address)
+
     # Основной проход по найденным Natasha компонентам
     for match in matches:
         fact = match.fact
@@ -100,18 +351,18 @@ def parse_address(address):
     # Обработка специфичных зон как улиц
     if result['street'] is None:
         # Обработка микрорайона как улицы
-        mkr_match = re.search(r'мкр\.?\s*\d+[а-яА-Я]?', address, re.IGNORECASE)
+        mkr_match = MKR_RE.search(address)
         if mkr_match:
             result['street'] = mkr_match.group(0).strip()
 
         # Обработка для территории (тер.)
-        ter_match = re.search(r'тер\.?\s*[^,]+', address, re.IGNORECASE)
+        ter_match = TER_RE.search(address)
         if ter_match:
             result['street'] = ter_match.group(0).strip()
 
     # Обработка для района (ищем "слово район" после региона)
     if result['district'] is None:
-        district_match = re.search(r'([А-Яа-яё\-]+)\s+район', address)
+        district_match = DISTRICT_WORD_RE.search(address)
         if district_match:
             result['district'] = f'{district_match.group(1).strip()} район'
 
@@ -123,11 +374,7 @@ def parse_address(address):
             candidate = locality_match.group(1).strip()
 
             # Пропускаем если это район, улица и т.п.
-            if not re.search(
-                r'(район|р-н|ул\.|улица|мкр\.|микрорайон|просп\.|пер\.|шоссе|пл\.|дом|д\.)',
-                candidate,
-                re.IGNORECASE,
-            ):
+            if not NOT_LOCALITY_RE.search(candidate):
                 result['locality'] = candidate
 
     # Обработка если locality всё ещё не найден — ищем после
@@ -141,11 +388,7 @@ def parse_address(address):
             )
             if locality_match:
                 candidate = locality_match.group(1).strip()
-                if not re.search(
-                    r'(район|р-н|ул\.|улица|мкр\.|микрорайон|просп\.|пер\.|шоссе|пл\.|дом|д\.)',
-                    candidate,
-                    re.IGNORECASE,
-                ):
+                if not NOT_LOCALITY_RE.search(candidate):
                     result['locality'] = candidate
         # После района
         if result['locality'] is None and result['district']:
@@ -155,25 +398,29 @@ def parse_address(address):
             )
             if locality_match:
                 candidate = locality_match.group(1).strip()
-                if not re.search(
-                    r'(ул\.|улица|мкр\.|микрорайон|просп\.|пер\.|шоссе|пл\.|дом|д\.)',
-                    candidate,
-                    re.IGNORECASE,
-                ):
+                if not NOT_LOCALITY_AFTER_DISTRICT_RE.search(candidate):
                     result['locality'] = candidate
         # р.п. (рабочий поселок) <название>
         if result['locality'] is None:
-            rp_match = re.search(
-                r'р\.п\.?\s*([А-Яа-яё\- ]+?)(?:,|ул\.|улица|$)', address
-            )
+            rp_match = RP_RE.search(address)
             if rp_match:
                 result['locality'] = f'р.п. {rp_match.group(1).strip()}'
 
         # ст. (станица) <название>
         if result['locality'] is None:
-            stanica_match = re.search(
-                r'ст\.?\s*([А-Яа-яё\- ]+?)(?:,|ул\.|улица|$)', address
-            )
+            stanica_match = STANICA_RE.search(address)
             if stanica_match:
                 result['locality'] = f'ст. {stanica_match.group(1).strip()}'
+
+    if result['postal_code'] is None:
+        postal_match = POSTAL_CODE_RE.search(address)
+        if postal_match:
+            result['postal_code'] = postal_match.group(1)
+
+    # Приводим регион к справочнику (regions.py): одно название и код
+    # субъекта вместо разных написаний. Natasha считает «г. Москва»
+    # городом, а не регионом, поэтому без региона ищем его в частях адреса
+    result['region_id'], result['region'] = resolve_region(
+        result['region'] or _region_from_parts(address), result['postal_code']
+    )
     return result
@@ -0,0 +1,297 @@
+"""
+Модуль для пакетного построения графиков без экрана (backend Agg).
+
+Для каждого региона, источника сообщения и месяца публикации, а также
+для всех данных целиком строятся графики по регионам и возрастным группам
+(см. visualization.py). Агрегаты считаются один раз в основном процессе,
+а отрисовка распределяется по пулу процессов. Каждый процесс использует
+заранее настроенные шаблоны фигур, а графики, агрегаты которых
+не изменились с прошлого запуска, пропускаются.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import matplotlib
+import pandas as pd
+import pyarrow.dataset as ds
+import pymysql
+from matplotlib.figure import Figure
+
+from regions import REGION_NAMES
+from snapshot import SNAPSHOT_PATH, load_snapshot
+from visualization import (
+    AGE_FIGSIZE,
+    AGE_TITLE,
+    DB_CONFIG,
+    REGION_FIGSIZE,
+    REGION_TITLE,
+    compute_aggregates,
+    draw_age_debt,
+    draw_region_debt,
+    prepare_data,
+)
+
+OUTPUT_DIR = 'charts'
+MANIFEST_NAME = 'manifest.json'
+
+# Разрезы, для которых строятся отдельные графики
+SLICE_COLUMNS = {
+    'region_id': 'Регион',
+    'publisher_name': 'Источник',
+    'publish_month': 'Месяц публикации',
+}
+
+BATCH_QUERY = """
+    SELECT
+        d.region_id,
+        d.birth_date,
+        mo.debt_sum,
+        p.name AS publisher_name,
+        DATE_FORMAT(m.publish_date, '%Y-%m') AS publish_month
+    FROM
+        Debtor d
+        JOIN ExtrajudicialBankruptcyMessage m ON m.debtor_id = d.id
+        LEFT JOIN publisher p ON m.publisher_id = p.id
+        LEFT JOIN creditors_non_from_entrepreneurship cne ON m.creditors_non_from_entrepreneurship_id = cne.id
+        LEFT JOIN cne_monetary_obligation cne_mo ON cne.id = cne_mo.cne_id
+        LEFT JOIN MonetaryObligation mo ON cne_mo.mo_id = mo.id
+    WHERE
+        mo.debt_sum IS NOT NULL
+    """
+
+# Шаблоны фигур текущего процесса: вид графика -> (Figure, Axes)
+_templates = {}
+
+
+def load_batch_data(snapshot=None):
+    """
+    Загружает данные для пакетного построения из локального снимка
+    или из базы данных.
+    :param snapshot: директория снимка или None для чтения из БД
+    :return: DataFrame с колонками region_id, birth_date, debt_sum,
+        publisher_name, publish_month в компактных типах
+    """
+    columns = ['region_id', 'birth_date', 'debt_sum'] + [
+        column for column in SLICE_COLUMNS if column != 'region_id'
+    ]
+    if snapshot:
+        df = load_snapshot(
+            snapshot,
+            columns=columns,
+            filters=ds.field('debt_sum').is_valid(),
+        )
+    else:
+        conn = pymysql.connect(**DB_CONFIG)
+        try:
+            df = pd.read_sql(BATCH_QUERY, conn)
+        finally:
+            conn.close()
+    prepared = prepare_data(df)
+    for column in SLICE_COLUMNS:
+        if column != 'region_id':
+            prepared[column] = df[column].astype('category')
+    return prepared
+
+
+def safe_name(value):
+    """
+    Преобразует значение разреза в имя файла или директории.
+    """
+    return re.sub(r'[^\w.-]+', '_', str(value)).strip('_') or 'unknown'
+
+
+def aggregates_digest(aggregates, title):
+    """
+    Считает отпечаток агрегатов и заголовка графика.
+    По нему определяется, изменились ли данные с прошлого запуска.
+    """
+    digest = hashlib.sha1(title.encode())
+    for key in ('region_debt', 'age_debt', 'age_counts'):
+        series = aggregates[key]
+        digest.update(
+            pd.util.hash_pandas_object(series, index=True).to_numpy().tobytes()
+        )
+    return digest.hexdigest()
+
+
+def iter_slices(df, now=None):
+    """
+    Один раз считает агрегаты для всех данных и для каждого значения
+    каждого разреза.
+    :param df: DataFrame из load_batch_data
+    :param now: дата, относительно которой считается возраст
+    :return: генератор кортежей (относительная директория, подпись, агрегаты)
+    """
+    now = now or datetime.now()
+    yield '', None, compute_aggregates(df, now)
+    for column, label in SLICE_COLUMNS.items():
+        for value, group in df.groupby(column, observed=True):
+            if column == 'region_id':
+                value = REGION_NAMES.get(value, value)
+            yield (
+                os.path.join(safe_name(column), safe_name(value)),
+                f'{label}: {value}',
+                compute_aggregates(group, now),
+            )
+
+
+def build_jobs(df, out_dir=OUTPUT_DIR, manifest=None, force=False):
+    """
+    Формирует задания на отрисовку, пропуская графики,
+    агрегаты которых не изменились.
+    :param df: DataFrame из load_batch_data
+    :param out_dir: директория для PNG-файлов
+    :param manifest: словарь путь -> отпечаток с прошлого запуска
+    :param force: перерисовать все графики
+    :return: кортеж (список заданий, количество пропущенных графиков)
+    """
+    manifest = manifest or {}
+    jobs = []
+    skipped = 0
+    for subdir, caption, aggregates in iter_slices(df):
+        for kind, title in (('region', REGION_TITLE), ('age', AGE_TITLE)):
+            if caption:
+                title = f'{title}\n{caption}'
+            path = os.path.join(out_dir, subdir, f'{kind}_debt.png')
+            digest = aggregates_digest(aggregates, title)
+            if (
+                not force
+                and manifest.get(path) == digest
+                and os.path.exists(path)
+            ):
+                skipped += 1
+                continue
+            jobs.append((kind, title, aggregates, path, digest))
+    return jobs, skipped
+
+
+def _init_worker():
+    matplotlib.use('Agg')
+
+
+def _template(kind):
+    """
+    Возвращает шаблон фигуры для вида графика, создавая его
+    один раз на процесс.
+    """
+    if kind not in _templates:
+        figsize = REGION_FIGSIZE if kind == 'region' else AGE_FIGSIZE
+        fig = Figure(figsize=figsize)
+        _templates[kind] = (fig, fig.add_subplot())
+    return _templates[kind]
+
+
+def render_job(job):
+    """
+    Отрисовывает один график на шаблоне фигуры и сохраняет его в PNG.
+    :param job: кортеж (вид, заголовок, агрегаты, путь, отпечаток)
+    :return: кортеж (путь, отпечаток)
+    """
+    kind, title, aggregates, path, digest = job
+    fig, ax = _template(kind)
+    ax.clear()
+    ax.set_axis_on()
+    if kind == 'region':
+        draw_region_debt(ax, aggregates, title)
+    else:
+        draw_age_debt(ax, aggregates, title)
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fig.savefig(path, bbox_inches='tight')
+    return path, digest
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(out_dir, manifest):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+
+
+def render_batch(df, out_dir=OUTPUT_DIR, workers=None, force=False):
+    """
+    Строит все графики по разрезам в пуле процессов.
+    Ошибка одного графика не прерывает остальные, а отпечатки уже
+    построенных графиков сохраняются в манифест в любом случае.
+    :param df: DataFrame из load_batch_data
+    :param out_dir: директория для PNG-файлов
+    :param workers: количество процессов (по умолчанию — число ядер)
+    :param force: перерисовать все графики, даже неизменившиеся
+    :return: кортеж (количество построенных, количество пропущенных,
+        количество графиков с ошибкой)
+    """
+    matplotlib.use('Agg')
+    manifest = load_manifest(out_dir)
+    jobs, skipped = build_jobs(df, out_dir, manifest, force)
+    rendered = failed = 0
+    if not jobs:
+        return rendered, skipped, failed
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker
+        ) as executor:
+            futures = {executor.submit(render_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    path, digest = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(
+                        f'Ошибка построения {futures[future][3]}: {e!r}',
+                        file=sys.stderr,
+                    )
+                    continue
+                manifest[path] = digest
+                rendered += 1
+    finally:
+        save_manifest(out_dir, manifest)
+    return rendered, skipped, failed
+
+
+def main(snapshot=None, out_dir=OUTPUT_DIR, workers=None, force=False):
+    """
+    Загружает данные и строит графики по всем разрезам.
+    """
+    rendered, skipped, failed = render_batch(
+        load_batch_data(snapshot), out_dir, workers, force
+    )
+    print(
+        f'Построено графиков: {rendered}, без изменений: {skipped}, '
+        f'с ошибкой: {failed}'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Пакетное построение графиков по разрезам'
+    )
+    parser.add_argument(
+        '--snapshot',
+        nargs='?',
+        const=SNAPSHOT_PATH,
+        help='строить графики по локальному снимку (snapshot.py)',
+    )
+    parser.add_argument('--out', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='перерисовать все графики, даже неизменившиеся',
+    )
+    args = parser.parse_args()
+    main(args.snapshot, args.out, args.workers, args.force)
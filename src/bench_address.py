@@ -0,0 +1,310 @@
+"""
+Регрессионный набор для разбора адресов: точность и хвостовые задержки.
+
+Эталонный корпус address_corpus.jsonl — адреса в том виде, в каком они
+встречаются в выгрузках, с проверенными вручную значениями полей
+(индекс, регион, район, населённый пункт, улица, дом, квартира).
+
+Для каждой конфигурации разбора (ENGINES) считаются:
+- точность по каждому полю — доля адресов, где значение совпало
+  с эталоном;
+- задержка разбора одного адреса: p50, p95, p99 и максимум (для
+  пакетного разбора — среднее на адрес в каждом проходе);
+- пропускная способность (адресов в секунду).
+
+Результаты сохраняются в JSON вместе с хэшем коммита. С ключом
+--compare запуск завершается с ненулевым кодом, если точность
+какого-либо поля упала или p95/p99 выросли больше допустимого
+(--max-slowdown); без сравнения проверяются только пороги точности
+ACCURACY_FLOOR.
+
+Запуск:
+    python bench_address.py
+    python bench_address.py --compare ../bench_results/address-<commit>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import address_parser
+from address_parser import parse_address, parse_addresses
+from bench_parsing import BENCH_RESULTS_DIR, current_commit
+from main import BASE_DIR
+
+CORPUS_PATH = os.path.join(BASE_DIR, 'address_corpus.jsonl')
+FIELDS = (
+    'postal_code',
+    'region',
+    'district',
+    'locality',
+    'street',
+    'house',
+    'flat',
+)
+REGION_FIELDS = ('postal_code', 'region', 'district')
+# Конфигурации разбора: проверяемые поля, бюджет Natasha (None — как
+# настроено в address_parser, 0 — без ограничений), пакетный разбор
+# (parse_addresses) и уровень разбора
+ENGINES = {
+    'full': {'fields': FIELDS, 'budget': None, 'batch': False},
+    'full_batch': {'fields': FIELDS, 'budget': None, 'batch': True},
+    'full_unbudgeted': {'fields': FIELDS, 'budget': 0, 'batch': False},
+    'region': {
+        'fields': REGION_FIELDS,
+        'budget': None,
+        'batch': False,
+        'level': 'region',
+    },
+}
+# Минимальная точность по полю для всех конфигураций
+ACCURACY_FLOOR = {
+    'postal_code': 1.0,
+    'region': 1.0,
+    'district': 1.0,
+    'locality': 0.95,
+    'street': 0.95,
+    'house': 0.95,
+    'flat': 0.95,
+}
+DEFAULT_REPEAT = 5
+# Во сколько раз могут вырасти p95/p99 относительно сравниваемого запуска
+DEFAULT_MAX_SLOWDOWN = 1.25
+# Задержки короче этого порога не сравниваются: для разбора только
+# региона они измеряются микросекундами и зависят от шума
+MIN_COMPARED_MS = 0.5
+
+
+def load_corpus(path=CORPUS_PATH):
+    """
+    :param path: путь к корпусу в формате JSON Lines
+    :return: список словарей с адресом ('address') и эталонными полями
+    """
+    with open(path, encoding='utf-8') as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def percentile(values, fraction):
+    """
+    Перцентиль по методу ближайшего ранга.
+    :param values: отсортированный список значений
+    :param fraction: доля от 0 до 1
+    """
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * fraction // 1))
+    return values[int(rank) - 1]
+
+
+def accuracy(corpus, results, fields):
+    """
+    :return: словарь поле -> доля совпадений с эталоном и список
+        расхождений (адрес, поле, ожидалось, получено)
+    """
+    matched = dict.fromkeys(fields, 0)
+    mismatches = []
+    for row, result in zip(corpus, results):
+        for field in fields:
+            if result[field] == row[field]:
+                matched[field] += 1
+            else:
+                mismatches.append(
+                    (row['address'], field, row[field], result[field])
+                )
+    scores = {
+        field: round(matched[field] / len(corpus), 4) for field in fields
+    }
+    return scores, mismatches
+
+
+def run_engine(engine, corpus, repeat=DEFAULT_REPEAT):
+    """
+    Разбирает корпус repeat раз в заданной конфигурации. Первый проход
+    прогревочный (загрузка словарей Natasha) и в замер не входит.
+    :return: словарь с точностью, задержками и расхождениями
+    """
+    config = ENGINES[engine]
+    level = config.get('level', 'full')
+    addresses = [row['address'] for row in corpus]
+    budget = dict(address_parser.BUDGET)
+    if config['budget'] is not None:
+        address_parser.set_budget(
+            max_length=config['budget'],
+            max_seconds=config['budget'],
+            max_segments=config['budget'],
+        )
+    try:
+        results = [parse_address(address, level) for address in addresses]
+        latencies = []
+        total = 0.0
+        for _ in range(repeat):
+            if config['batch']:
+                started = time.perf_counter()
+                results = parse_addresses(addresses, level)
+                elapsed = time.perf_counter() - started
+                # Для пакета задержка одного адреса — средняя по пакету
+                latencies.extend([elapsed / len(addresses)] * len(addresses))
+                total += elapsed
+                continue
+            results = []
+            for address in addresses:
+                started = time.perf_counter()
+                results.append(parse_address(address, level))
+                elapsed = time.perf_counter() - started
+                latencies.append(elapsed)
+                total += elapsed
+    finally:
+        address_parser.set_budget(**budget)
+    scores, mismatches = accuracy(corpus, results, config['fields'])
+    latencies.sort()
+    return {
+        'engine': engine,
+        'addresses': len(addresses),
+        'accuracy': scores,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'addresses_per_second': round(len(latencies) / total, 1),
+        'mismatches': mismatches,
+    }
+
+
+def check_floor(results):
+    """
+    :return: список нарушений порогов точности ACCURACY_FLOOR
+    """
+    failures = []
+    for item in results:
+        for field, score in item['accuracy'].items():
+            if score < ACCURACY_FLOOR[field]:
+                failures.append(
+                    f'{item["engine"]}: точность {field} {score:.2%}'
+                    f' ниже порога {ACCURACY_FLOOR[field]:.0%}'
+                )
+    return failures
+
+
+def compare(results, baseline_path, max_slowdown=DEFAULT_MAX_SLOWDOWN):
+    """
+    Выводит изменение точности и задержек относительно сохранённых
+    результатов другого запуска.
+    :return: список регрессий (пустой, если их нет)
+    """
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {item['engine']: item for item in baseline['results']}
+    print(f'Сравнение с {baseline["commit"]}:')
+    failures = []
+    for item in results:
+        old = previous.get(item['engine'])
+        if not old:
+            continue
+        for field, score in item['accuracy'].items():
+            old_score = old['accuracy'].get(field)
+            if old_score is not None and score < old_score:
+                failures.append(
+                    f'{item["engine"]}: точность {field}'
+                    f' {old_score:.2%} -> {score:.2%}'
+                )
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            ratio = item[key] / old[key] if old[key] else None
+            changes.append(f'{key[:3]} x{ratio:.2f}' if ratio else key[:3])
+            if (
+                key != 'p50_ms'
+                and ratio
+                and ratio > max_slowdown
+                and item[key] >= MIN_COMPARED_MS
+            ):
+                failures.append(
+                    f'{item["engine"]}: {key[:3]} {old[key]} мс'
+                    f' -> {item[key]} мс'
+                )
+        print(f'{item["engine"]:<18}' + '  '.join(changes))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Точность и задержки разбора адресов'
+    )
+    parser.add_argument(
+        '--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES)
+    )
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--output', help='путь к JSON с результатами')
+    parser.add_argument('--compare', help='JSON с результатами для сравнения')
+    parser.add_argument(
+        '--max-slowdown',
+        type=float,
+        default=DEFAULT_MAX_SLOWDOWN,
+        help='допустимый рост p95/p99 относительно --compare',
+    )
+    parser.add_argument(
+        '--verbose', action='store_true', help='вывести расхождения с эталоном'
+    )
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    commit = current_commit()
+    results = []
+    print(
+        f'{"конфигурация":<18}{"точность":>10}{"p50, мс":>10}'
+        f'{"p95, мс":>10}{"p99, мс":>10}{"адр./с":>10}'
+    )
+    for engine in args.engines:
+        item = run_engine(engine, corpus, args.repeat)
+        results.append(item)
+        scores = item['accuracy'].values()
+        print(
+            f'{engine:<18}{sum(scores) / len(scores):>10.2%}'
+            f'{item["p50_ms"]:>10}{item["p95_ms"]:>10}{item["p99_ms"]:>10}'
+            f'{item["addresses_per_second"]:>10}'
+        )
+        print(
+            '    '
+            + '  '.join(
+                f'{field} {score:.0%}'
+                for field, score in item['accuracy'].items()
+            )
+        )
+        if args.verbose:
+            for address, field, expected, actual in item['mismatches']:
+                print(f'    {field}: {expected!r} != {actual!r} — {address}')
+
+    output = args.output or os.path.join(
+        BENCH_RESULTS_DIR, f'address-{commit}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump(
+            {
+                'commit': commit,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'corpus': len(corpus),
+                'results': results,
+            },
+            output_file,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(f'Результаты сохранены в {os.path.abspath(output)}')
+
+    failures = check_floor(results)
+    if args.compare:
+        failures += compare(results, args.compare, args.max_slowdown)
+    for failure in failures:
+        print(f'Регрессия: {failure}', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Бенчмарк загрузки сообщений в базу данных (save_to_sql.insert_messages).
+
+Курсор оборачивается в CountingCursor, который считает SQL-запросы
+(обращения к серверу) по типу запроса и таблице и замеряет их время.
+По умолчанию загрузка идёт во встроенную SQLite в памяти со схемой,
+переведённой из create_tables.sql, — сервер MySQL не нужен. С ключом
+--backend mysql используется DB_CONFIG из save_to_sql (только
+для одноразовой тестовой базы!).
+
+Отчёт: запросов на сообщение, строк в секунду и самые медленные
+типы запросов.
+
+Запуск:
+    python bench_loader.py --count 1000
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import pymysql
+
+from bench_parsing import dataset_path
+from main import BASE_DIR, parse_messages
+from save_to_sql import DB_CONFIG, ensure_regions, insert_messages
+
+CREATE_TABLES_PATH = os.path.join(BASE_DIR, 'sql_queries', 'create_tables.sql')
+
+# Суммы из парсера — Decimal. pymysql передаёт их как есть, а SQLite
+# получает строку, которую столбец DECIMAL приводит к числу
+sqlite3.register_adapter(Decimal, str)
+
+STATEMENT_RE = re.compile(
+    r'^\s*(?:(SELECT)\b.*?\bFROM\s+(\w+)|(INSERT)\s+INTO\s+(\w+)'
+    r'|(UPDATE)\s+(\w+))',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def statement_type(sql):
+    """
+    Определяет тип запроса и таблицу, например 'INSERT Debtor'.
+    """
+    match = STATEMENT_RE.match(sql)
+    if not match:
+        return sql.split(None, 1)[0].upper()
+    verb, table = [group for group in match.groups() if group]
+    return f'{verb.upper()} {table}'
+
+
+class StatementStats:
+    """
+    Счётчики запросов: количество, суммарное время и число
+    затронутых строк по типам запросов.
+    """
+
+    def __init__(self):
+        self.count = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.rows = defaultdict(int)
+
+    @property
+    def total(self):
+        return sum(self.count.values())
+
+    @property
+    def inserted_rows(self):
+        return sum(
+            rows
+            for kind, rows in self.rows.items()
+            if kind.startswith('INSERT')
+        )
+
+
+class CountingCursor:
+    """
+    Обёртка над курсором DB-API, которая считает и замеряет
+    каждый execute. Для SQLite плейсхолдеры %s заменяются на ?,
+    а INSERT ... () VALUES () — на INSERT ... DEFAULT VALUES.
+    """
+
+    def __init__(self, cursor, stats, paramstyle='format'):
+        self._cursor = cursor
+        self._stats = stats
+        self._qmark = paramstyle == 'qmark'
+
+    def execute(self, sql, args=None):
+        kind = statement_type(sql)
+        if self._qmark:
+            sql = sql.replace('%s', '?')
+            sql = re.sub(r'\(\)\s*VALUES\s*\(\)', 'DEFAULT VALUES', sql)
+        started = time.perf_counter()
+        if args is None:
+            result = self._cursor.execute(sql)
+        else:
+            result = self._cursor.execute(sql, args)
+        self._stats.seconds[kind] += time.perf_counter() - started
+        self._stats.count[kind] += 1
+        self._stats.rows[kind] += max(self._cursor.rowcount, 0)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def sqlite_schema():
+    """
+    Переводит create_tables.sql в диалект SQLite.
+    """
+    with open(CREATE_TABLES_PATH, encoding='utf-8') as sql_file:
+        schema = sql_file.read()
+    schema = re.sub(
+        r'INT PRIMARY KEY AUTO_INCREMENT',
+        'INTEGER PRIMARY KEY AUTOINCREMENT',
+        schema,
+    )
+    return re.sub(r'UNIQUE KEY \w+ \(', 'UNIQUE (', schema)
+
+
+def connect(backend):
+    """
+    :param backend: 'sqlite' или 'mysql'
+    :return: кортеж (соединение, paramstyle)
+    """
+    if backend == 'mysql':
+        return pymysql.connect(**DB_CONFIG), 'format'
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(sqlite_schema())
+    ensure_regions(CountingCursor(conn.cursor(), StatementStats(), 'qmark'))
+    return conn, 'qmark'
+
+
+def run(messages, backend='sqlite'):
+    """
+    Загружает сообщения через insert_messages и собирает статистику.
+    :param messages: список словарей сообщений
+    :param backend: 'sqlite' или 'mysql'
+    :return: кортеж (StatementStats, секунды)
+    """
+    stats = StatementStats()
+    conn, paramstyle = connect(backend)
+    try:
+        cur = CountingCursor(conn.cursor(), stats, paramstyle)
+        debtors = {}
+        started = time.perf_counter()
+        for msg in messages:
+            insert_messages(cur, msg, debtors)
+        conn.commit()
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+    return stats, elapsed
+
+
+def report(stats, elapsed, messages_count, top=10):
+    """
+    Выводит сводку по загрузке в терминал.
+    """
+    print(f'Сообщений: {messages_count}, время загрузки: {elapsed:.3f} с')
+    print(
+        f'Запросов (обращений к БД): {stats.total}, '
+        f'на сообщение: {stats.total / messages_count:.1f}'
+    )
+    print(
+        f'Вставлено строк: {stats.inserted_rows}, '
+        f'строк в секунду: {stats.inserted_rows / elapsed:.0f}'
+    )
+    print(
+        f'\n{"тип запроса":<45}{"кол-во":>9}{"на сообщ.":>11}'
+        f'{"всего, мс":>12}{"среднее, мкс":>14}'
+    )
+    kinds = sorted(stats.seconds, key=stats.seconds.get, reverse=True)
+    for kind in kinds[:top]:
+        count = stats.count[kind]
+        seconds = stats.seconds[kind]
+        print(
+            f'{kind:<45}{count:>9}{count / messages_count:>11.2f}'
+            f'{seconds * 1000:>12.1f}{seconds / count * 1_000_000:>14.1f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк загрузки в БД')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--backend', choices=('sqlite', 'mysql'), default='sqlite'
+    )
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    messages = parse_messages(dataset_path(args.count, args.seed))
+    stats, elapsed = run(messages, args.backend)
+    report(stats, elapsed, len(messages), args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Бенчмарк парсинга XML-архива.
+
+Для каждого размера архива (по умолчанию 10k, 100k и 1M сообщений,
+архивы создаются generate_data.py и кэшируются) замеряются:
+- parse_messages — полный разбор архива;
+- parse_address — только разбор адресов должников;
+- parse_addresses — пакетный разбор тех же адресов (с дедупликацией);
+- parse_region — разбор адресов только до региона (без Natasha);
+- to_dict — только преобразование готовых объектов в словари.
+
+Каждый замер выполняется в отдельном процессе, чтобы пиковый RSS
+относился только к нему. Результаты сохраняются в JSON вместе с хэшем
+коммита, и их можно сравнить с результатами другого коммита (--compare).
+
+Запуск:
+    python bench_parsing.py --sizes 10000 100000
+    python bench_parsing.py --compare bench_results/parsing-<commit>.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from address_parser import parse_address, parse_addresses
+from generate_data import generate
+from main import (
+    BASE_DIR,
+    ExtrajudicialBankruptcyMessage,
+    iter_message_elements,
+    parse_messages,
+)
+
+BENCH_DATA_DIR = os.path.join(BASE_DIR, '..', 'bench_data')
+BENCH_RESULTS_DIR = os.path.join(BASE_DIR, '..', 'bench_results')
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+# Как часто проверять, жив ли процесс замера, пока нет результата
+POLL_SECONDS = 1.0
+CASES = [
+    'parse_messages',
+    'parse_address',
+    'parse_addresses',
+    'parse_region',
+    'to_dict',
+]
+
+
+def dataset_path(size, seed=0):
+    """
+    Возвращает путь к синтетическому архиву нужного размера,
+    создавая его при первом обращении.
+    """
+    os.makedirs(BENCH_DATA_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DATA_DIR, f'messages_{size}_{seed}.xml.gz')
+    if not os.path.exists(path):
+        generate(path, size, seed)
+    return path
+
+
+def peak_rss_mb():
+    """
+    Пиковый RSS текущего процесса в МБ.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS — в байтах
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def run_parse_messages(path):
+    started = time.perf_counter()
+    count = len(parse_messages(path))
+    return count, time.perf_counter() - started
+
+
+def run_parse_address(path):
+    addresses = [
+        elem.findtext('Debtor/Address') for elem in iter_message_elements(path)
+    ]
+    started = time.perf_counter()
+    for address in addresses:
+        parse_address(address)
+    return len(addresses), time.perf_counter() - started
+
+
+def run_parse_addresses(path):
+    addresses = [
+        elem.findtext('Debtor/Address') for elem in iter_message_elements(path)
+    ]
+    started = time.perf_counter()
+    parse_addresses(addresses)
+    return len(addresses), time.perf_counter() - started
+
+
+def run_parse_region(path):
+    addresses = [
+        elem.findtext('Debtor/Address') for elem in iter_message_elements(path)
+    ]
+    started = time.perf_counter()
+    for address in addresses:
+        parse_address(address, 'region')
+    return len(addresses), time.perf_counter() - started
+
+
+def run_to_dict(path):
+    messages = [
+        ExtrajudicialBankruptcyMessage(elem)
+        for elem in iter_message_elements(path)
+    ]
+    started = time.perf_counter()
+    for message in messages:
+        message.to_dict()
+    return len(messages), time.perf_counter() - started
+
+
+RUNNERS = {
+    'parse_messages': run_parse_messages,
+    'parse_address': run_parse_address,
+    'parse_addresses': run_parse_addresses,
+    'parse_region': run_parse_region,
+    'to_dict': run_to_dict,
+}
+
+
+def _run_case(case, path, results):
+    count, seconds = RUNNERS[case](path)
+    results.put((count, seconds, peak_rss_mb()))
+
+
+def _wait_result(process, results):
+    """
+    Ждёт результат замера, проверяя, что процесс ещё жив.
+    :raise RuntimeError: процесс завершился, не отправив результат
+        (например, убит OOM killer или упал с исключением)
+    """
+    while True:
+        try:
+            return results.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # Результат мог прийти между проверками
+        try:
+            return results.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            process.join()
+            raise RuntimeError(
+                f'процесс замера завершился с кодом {process.exitcode}'
+            ) from None
+
+
+def measure(case, size, seed=0):
+    """
+    Выполняет один замер в отдельном процессе.
+    :return: словарь с результатами замера
+    :raise RuntimeError: процесс замера завершился без результата
+    """
+    path = dataset_path(size, seed)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(case, path, results))
+    process.start()
+    try:
+        count, seconds, peak = _wait_result(process, results)
+    finally:
+        process.join()
+    return {
+        'case': case,
+        'size': size,
+        'messages': count,
+        'seconds': round(seconds, 4),
+        'messages_per_second': round(count / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(peak, 1),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BASE_DIR,
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline_path):
+    """
+    Выводит изменение скорости и памяти относительно сохранённых
+    результатов другого запуска.
+    """
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {
+        (item['case'], item['size']): item for item in baseline['results']
+    }
+    print(f'Сравнение с {baseline["commit"]}:')
+    for item in results:
+        old = previous.get((item['case'], item['size']))
+        if not old or not old['messages_per_second']:
+            continue
+        speed = item['messages_per_second'] / old['messages_per_second']
+        memory = item['peak_rss_mb'] / old['peak_rss_mb']
+        print(
+            f'{item["case"]:<16}{item["size"]:>10}'
+            f'  скорость x{speed:.2f}  память x{memory:.2f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк парсинга')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='путь к JSON с результатами')
+    parser.add_argument('--compare', help='JSON с результатами для сравнения')
+    args = parser.parse_args()
+
+    commit = current_commit()
+    results = []
+    failed = 0
+    print(
+        f'{"замер":<16}{"размер":>10}{"сообщ./с":>14}'
+        f'{"время, с":>12}{"пик RSS, МБ":>14}'
+    )
+    for size in args.sizes:
+        for case in args.cases:
+            try:
+                item = measure(case, size, args.seed)
+            except RuntimeError as e:
+                failed += 1
+                print(f'{case:<16}{size:>10}  ошибка: {e}', file=sys.stderr)
+                continue
+            results.append(item)
+            print(
+                f'{case:<16}{size:>10}{item["messages_per_second"]:>14}'
+                f'{item["seconds"]:>12}{item["peak_rss_mb"]:>14}'
+            )
+
+    output = args.output or os.path.join(
+        BENCH_RESULTS_DIR, f'parsing-{commit}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump(
+            {
+                'commit': commit,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'results': results,
+            },
+            output_file,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(f'Результаты сохранены в {os.path.abspath(output)}')
+    if args.compare:
+        compare(results, args.compare)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Бенчмарк аналитики из модуля visualization.
+
+Сравнивает прежний построчный расчёт возраста и групп (apply с
+datetime.now() на каждую строку, отдельные группировки) с векторным
+расчётом compute_aggregates на синтетическом DataFrame.
+Для каждого варианта выводит время и пиковое потребление памяти.
+
+Запуск:
+    python bench_visualization.py --rows 10000000
+"""
+
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from visualization import (
+    AGE_BINS,
+    AGE_LABELS,
+    compute_aggregates,
+    prepare_data,
+)
+
+# Коды регионов из справочника regions.py
+REGION_IDS = [77, 50, 78, 47, 16, 23, 66, 54, 2, 52]
+
+
+def make_frame(rows, seed=0):
+    """
+    Создаёт синтетический DataFrame в том виде, в котором его возвращает
+    pd.read_sql: даты рождения — Python-объекты.
+
+    :param rows: количество строк
+    :param seed: зерно генератора случайных чисел
+    :return: DataFrame с колонками region_id, birth_date, debt_sum
+    """
+    rng = np.random.default_rng(seed)
+    regions = np.array(REGION_IDS)[rng.integers(0, len(REGION_IDS), rows)]
+    birth_date = (
+        np.datetime64('1940-01-01')
+        + rng.integers(0, 365 * 65, rows).astype('timedelta64[D]')
+    ).astype(object)
+    debt_sum = rng.gamma(2.0, 150_000.0, rows).round(2)
+    return pd.DataFrame(
+        {
+            'region_id': regions,
+            'birth_date': birth_date,
+            'debt_sum': debt_sum,
+        }
+    )
+
+
+def legacy_aggregates(df):
+    """
+    Прежний расчёт агрегатов: построчный apply и отдельные группировки.
+    """
+    df['birth_date'] = pd.to_datetime(df['birth_date'], errors='coerce')
+    df['age'] = df['birth_date'].apply(
+        lambda x: datetime.now().year - x.year if pd.notnull(x) else None
+    )
+    df['age_group'] = pd.cut(
+        df['age'], bins=AGE_BINS, labels=AGE_LABELS, right=False
+    )
+    region_debt = df.groupby('region_id')['debt_sum'].sum()
+    age_debt = df.groupby('age_group', observed=False)['debt_sum'].sum()
+    age_counts = df['age_group'].value_counts(sort=False).sort_index()
+    return {
+        'region_debt': region_debt,
+        'age_debt': age_debt,
+        'age_counts': age_counts,
+    }
+
+
+def vectorized_aggregates(df):
+    """
+    Новый расчёт: компактные типы и один проход compute_aggregates.
+    """
+    return compute_aggregates(prepare_data(df))
+
+
+def measure(func, df):
+    """
+    Замеряет время и пиковую память выполнения func(df).
+
+    :return: кортеж (результат, секунды, пиковая память в МБ)
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(df)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    print(f'Генерация {args.rows} строк...')
+    df = make_frame(args.rows)
+
+    legacy, legacy_time, legacy_peak = measure(legacy_aggregates, df.copy())
+    fast, fast_time, fast_peak = measure(vectorized_aggregates, df)
+
+    for key in ('region_debt', 'age_debt', 'age_counts'):
+        np.testing.assert_allclose(
+            legacy[key].sort_index().to_numpy(dtype='float64'),
+            fast[key].sort_index().to_numpy(dtype='float64'),
+            rtol=1e-5,
+        )
+
+    print(f'{"вариант":<12}{"время, с":>12}{"пик памяти, МБ":>18}')
+    print(f'{"legacy":<12}{legacy_time:>12.2f}{legacy_peak:>18.1f}')
+    print(f'{"vectorized":<12}{fast_time:>12.2f}{fast_peak:>18.1f}')
+    print(
+        f'Ускорение: x{legacy_time / fast_time:.1f}, '
+        f'память: x{legacy_peak / fast_peak:.1f} меньше'
+    )
+
+
+if __name__ == '__main__':
+    main()
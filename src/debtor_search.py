@@ -0,0 +1,447 @@
+"""
+Модуль для быстрого поиска должников по ИНН, ФИО и предыдущим ФИО.
+
+Индекс строится в памяти по XML-архиву или по базе данных и содержит:
+- словарь ИНН -> должники для точного поиска;
+- словарь нормализованное ФИО -> должники;
+- триграммный индекс по различным нормализованным ФИО и предыдущим ФИО
+  для нечёткого поиска (опечатки, пропущенное отчество, «е» вместо «ё»).
+
+Нечёткий поиск ранжирует кандидатов по коэффициенту Жаккара между
+множествами триграмм. Кандидаты берутся только из самых редких триграмм
+запроса: у имени с похожестью не ниже порога обязательно есть хотя бы
+одна из них, поэтому частые триграммы вроде «ова» не просматриваются.
+
+Индекс обновляется инкрементально (add_message, add_debtor), так что его
+можно дополнять по мере поступления новых сообщений.
+
+Запуск:
+    python debtor_search.py --inn 770123456789
+    python debtor_search.py --name "Иванова Анна Сергеевна"
+    python debtor_search.py --source db --serve --port 8081
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pymysql
+
+from main import FILE_PATH, iter_message_elements
+from save_to_sql import DB_CONFIG
+
+# Минимальная похожесть (коэффициент Жаккара) для нечёткого поиска
+DEFAULT_THRESHOLD = 0.4
+DEFAULT_LIMIT = 10
+
+NON_LETTERS_RE = re.compile(r'[^0-9a-zа-я]+')
+
+DB_DEBTORS_QUERY = """
+    SELECT d.id, d.name, d.birth_date, d.inn, m.message_id
+    FROM Debtor d
+    LEFT JOIN ExtrajudicialBankruptcyMessage m ON m.debtor_id = d.id
+    """
+DB_PREVIOUS_NAMES_QUERY = 'SELECT debtor_id, value FROM debtor_previous_name'
+
+
+def normalize_name(name):
+    """
+    Приводит ФИО к виду для сравнения: нижний регистр, «ё» -> «е»,
+    знаки препинания и лишние пробелы убираются.
+    """
+    if not name:
+        return ''
+    name = name.lower().replace('ё', 'е')
+    return NON_LETTERS_RE.sub(' ', name).strip()
+
+
+def normalize_inn(inn):
+    if not inn:
+        return ''
+    return ''.join(char for char in str(inn) if char.isdigit())
+
+
+def validate_message(msg):
+    """
+    Проверяет, что из словаря сообщения можно добавить должника
+    (см. DebtorSearchIndex.add_message).
+    :return: описание ошибки или None, если сообщение корректно
+    """
+    if not isinstance(msg, dict):
+        return 'message must be an object'
+    debtor = msg.get('debtor')
+    if not isinstance(debtor, dict):
+        return 'debtor must be an object'
+    if not isinstance(debtor.get('name'), str) or not debtor['name']:
+        return 'debtor.name must be a non-empty string'
+    if 'inn' not in debtor:
+        return 'debtor.inn is required'
+    if not isinstance(debtor['inn'], (str, int, type(None))):
+        return 'debtor.inn must be a string or null'
+    previous_names = debtor.get('previous_names') or []
+    if not isinstance(previous_names, list) or not all(
+        isinstance(name, str) for name in previous_names
+    ):
+        return 'debtor.previous_names must be a list of strings'
+    return None
+
+
+def trigrams(normalized):
+    """
+    :return: множество триграмм строки с пробелами по краям слов
+    """
+    padded = f'  {normalized} '
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2)) - {
+        '   '
+    }
+
+
+class DebtorRecord:
+    """
+    Запись индекса: должник, его предыдущие ФИО и id сообщений.
+    """
+
+    __slots__ = (
+        'id',
+        'name',
+        'birth_date',
+        'inn',
+        'previous_names',
+        'messages',
+    )
+
+    def __init__(self, record_id, name, birth_date, inn):
+        self.id = record_id
+        self.name = name
+        self.birth_date = birth_date
+        self.inn = inn
+        self.previous_names = []
+        self.messages = []
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'birth_date': self.birth_date,
+            'inn': self.inn,
+            'previous_names': self.previous_names,
+            'messages': self.messages,
+        }
+
+
+class DebtorSearchIndex:
+    """
+    Индекс должников в памяти для поиска по ИНН и ФИО.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._by_key = {}
+        self._by_inn = defaultdict(list)
+        # Нормализованное ФИО -> id записей. Одно и то же ФИО встречается
+        # у многих должников, поэтому триграммы считаются по различным ФИО
+        self._by_name = defaultdict(set)
+        self._postings = defaultdict(set)
+        self._grams = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def add_debtor(
+        self, name, birth_date=None, inn=None, previous_names=(), message=None
+    ):
+        """
+        Добавляет должника или дополняет уже известного (ключ — ФИО,
+        дата рождения и ИНН) новыми предыдущими ФИО и сообщением.
+        :return: DebtorRecord
+        """
+        birth_date = str(birth_date)[:10] if birth_date else None
+        inn = normalize_inn(inn) or None
+        key = (name, birth_date, inn)
+        record = self._by_key.get(key)
+        if record is None:
+            record = DebtorRecord(len(self.records), name, birth_date, inn)
+            self.records.append(record)
+            self._by_key[key] = record
+            if inn:
+                self._by_inn[inn].append(record.id)
+            self._index_name(record.id, name)
+        for prev_name in previous_names:
+            if prev_name and prev_name not in record.previous_names:
+                record.previous_names.append(prev_name)
+                self._index_name(record.id, prev_name)
+        if message is not None and message not in record.messages:
+            record.messages.append(message)
+        return record
+
+    def add_message(self, msg):
+        """
+        Добавляет должника из словаря сообщения (результат to_dict).
+        """
+        debtor = msg.get('debtor')
+        if debtor:
+            self.add_debtor(
+                debtor['name'],
+                debtor.get('birth_date'),
+                debtor['inn'],
+                debtor.get('previous_names') or (),
+                msg.get('id'),
+            )
+
+    def add_message_element(self, elem):
+        """
+        Добавляет должника прямо из XML-элемента сообщения, без разбора
+        адреса и построения сущностей.
+        """
+        debtor = elem.find('Debtor')
+        if debtor is None:
+            return
+        self.add_debtor(
+            debtor.findtext('Name'),
+            debtor.findtext('BirthDate'),
+            debtor.findtext('Inn'),
+            [
+                name.findtext('Value')
+                for name in debtor.iterfind('NameHistory/PreviousName')
+            ],
+            elem.findtext('Id'),
+        )
+
+    def _index_name(self, record_id, name):
+        normalized = normalize_name(name)
+        if not normalized:
+            return
+        self._by_name[normalized].add(record_id)
+        if normalized in self._grams:
+            return
+        grams = trigrams(normalized)
+        self._grams[normalized] = grams
+        for gram in grams:
+            self._postings[gram].add(normalized)
+
+    def by_inn(self, inn):
+        """
+        :return: список словарей должников с этим ИНН
+        """
+        return [
+            self._result(self.records[record_id], 1.0, None)
+            for record_id in self._by_inn.get(normalize_inn(inn), ())
+        ]
+
+    def search(self, query, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+        """
+        Поиск по ФИО и предыдущим ФИО. Точное совпадение нормализованного
+        ФИО имеет похожесть 1 и идёт первым.
+        :param query: ФИО или его часть
+        :param limit: максимальное количество результатов
+        :param threshold: минимальная похожесть от 0 до 1
+        :return: список словарей должников с полями score и matched
+        """
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        exact = self._by_name.get(normalized, ())
+        if len(exact) >= limit:
+            # Точные совпадения не уступят никаким похожим
+            return [
+                self._result(self.records[record_id], 1.0, normalized)
+                for record_id in sorted(exact)[:limit]
+            ]
+        query_grams = trigrams(normalized)
+        # Имени с похожестью >= threshold нужно не меньше required общих
+        # триграмм, значит, хотя бы одна из самых редких len - required + 1
+        required = max(1, math.ceil(threshold * len(query_grams)))
+        rare = sorted(
+            query_grams, key=lambda gram: len(self._postings.get(gram, ()))
+        )[: len(query_grams) - required + 1]
+        candidates = set()
+        for gram in rare:
+            candidates.update(self._postings.get(gram, ()))
+        scored = []
+        for name in candidates:
+            grams = self._grams[name]
+            shared = len(query_grams & grams)
+            score = shared / (len(query_grams) + len(grams) - shared)
+            if score >= threshold:
+                scored.append((score, name))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        results = []
+        seen = set()
+        for score, name in scored:
+            for record_id in sorted(self._by_name[name]):
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+                results.append(
+                    self._result(self.records[record_id], score, name)
+                )
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def _result(self, record, score, matched):
+        result = record.to_dict()
+        result['score'] = round(score, 3)
+        result['matched'] = matched
+        return result
+
+
+def build_from_xml(file_path):
+    """
+    Строит индекс по XML-архиву (адреса не разбираются).
+    """
+    index = DebtorSearchIndex()
+    for elem in iter_message_elements(file_path):
+        index.add_message_element(elem)
+    return index
+
+
+def build_from_db(conn):
+    """
+    Строит индекс по таблицам Debtor и debtor_previous_name.
+    :param conn: соединение с БД
+    """
+    index = DebtorSearchIndex()
+    by_id = {}
+    with conn.cursor() as cur:
+        cur.execute(DB_DEBTORS_QUERY)
+        for debtor_id, name, birth_date, inn, message_id in cur.fetchall():
+            by_id[debtor_id] = index.add_debtor(
+                name, birth_date, inn, message=message_id
+            )
+        cur.execute(DB_PREVIOUS_NAMES_QUERY)
+        for debtor_id, value in cur.fetchall():
+            record = by_id.get(debtor_id)
+            if record is not None:
+                index.add_debtor(
+                    record.name, record.birth_date, record.inn, [value]
+                )
+    return index
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """
+    HTTP-интерфейс индекса:
+    GET /debtors?inn=... — поиск по ИНН;
+    GET /debtors?q=...&limit=10 — поиск по ФИО;
+    POST /messages — добавить сообщения (JSON: словарь или список).
+    """
+
+    index = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {
+            key: values[0] for key, values in parse_qs(url.query).items()
+        }
+        if url.path != '/debtors':
+            return self._send(404, {'error': 'not found'})
+        started = time.perf_counter()
+        if 'inn' in params:
+            results = self.index.by_inn(params['inn'])
+        elif 'q' in params:
+            try:
+                limit = int(params.get('limit', DEFAULT_LIMIT))
+            except ValueError:
+                return self._send(400, {'error': 'limit must be an integer'})
+            results = self.index.search(params['q'], limit)
+        else:
+            return self._send(400, {'error': 'inn or q is required'})
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._send(200, {'results': results, 'took_ms': round(elapsed_ms, 3)})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/messages':
+            return self._send(404, {'error': 'not found'})
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self._send(400, {'error': 'invalid JSON'})
+        messages = payload if isinstance(payload, list) else [payload]
+        # Сначала проверяются все сообщения, чтобы ошибка в одном
+        # не оставила в индексе часть пакета
+        for position, msg in enumerate(messages):
+            error = validate_message(msg)
+            if error:
+                return self._send(
+                    400,
+                    {
+                        'error': f'message {position}: {error}',
+                        'index': position,
+                    },
+                )
+        for msg in messages:
+            self.index.add_message(msg)
+        self._send(200, {'added': len(messages), 'debtors': len(self.index)})
+
+    def _send(self, code, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(index, port):
+    """
+    Запускает HTTP-сервер поиска. Запросы обрабатываются по одному,
+    поэтому инкрементальные обновления не требуют блокировок.
+    """
+    SearchHandler.index = index
+    server = HTTPServer(('', port), SearchHandler)
+    print(
+        f'Индекс: {len(index)} должников, '
+        f'поиск: http://localhost:{port}/debtors?q=...',
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Поиск должников')
+    parser.add_argument('--source', choices=('xml', 'db'), default='xml')
+    parser.add_argument('--path', default=FILE_PATH, help='путь к архиву XML')
+    parser.add_argument('--inn', help='найти должника по ИНН')
+    parser.add_argument('--name', help='найти должника по ФИО')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--serve', action='store_true', help='HTTP-сервер')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.source == 'db':
+        conn = pymysql.connect(**DB_CONFIG)
+        try:
+            index = build_from_db(conn)
+        finally:
+            conn.close()
+    else:
+        index = build_from_xml(args.path)
+    print(
+        f'Индекс построен за {time.perf_counter() - started:.2f} с',
+        file=sys.stderr,
+    )
+    if args.serve:
+        serve(index, args.port)
+    else:
+        if args.inn:
+            results = index.by_inn(args.inn)
+        elif args.name:
+            results = index.search(args.name, args.limit, args.threshold)
+        else:
+            parser.error('нужно указать --inn, --name или --serve')
+        print(json.dumps(results, ensure_ascii=False, indent=2))
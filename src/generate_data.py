@@ -0,0 +1,341 @@
+"""
+Генератор синтетических XML-архивов в формате ExtrajudicialData.xml.gz.
+
+Данные детерминированы: при одинаковых seed и количестве сообщений
+получается побайтно одинаковый архив. Адреса, ФИО, банки и обязательства
+похожи на реальные, часть должников повторяется в нескольких сообщениях.
+
+Запуск:
+    python generate_data.py data_100k.xml.gz --count 100000
+"""
+
+import argparse
+import gzip
+import io
+import random
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+SURNAMES = [
+    ('Иванов', 'Иванова'),
+    ('Смирнов', 'Смирнова'),
+    ('Кузнецов', 'Кузнецова'),
+    ('Попов', 'Попова'),
+    ('Васильев', 'Васильева'),
+    ('Петров', 'Петрова'),
+    ('Соколов', 'Соколова'),
+    ('Михайлов', 'Михайлова'),
+    ('Новиков', 'Новикова'),
+    ('Фёдоров', 'Фёдорова'),
+    ('Морозов', 'Морозова'),
+    ('Волков', 'Волкова'),
+    ('Алексеев', 'Алексеева'),
+    ('Лебедев', 'Лебедева'),
+    ('Семёнов', 'Семёнова'),
+    ('Егоров', 'Егорова'),
+    ('Павлов', 'Павлова'),
+    ('Козлов', 'Козлова'),
+    ('Степанов', 'Степанова'),
+    ('Николаев', 'Николаева'),
+]
+MALE_NAMES = ['Александр', 'Сергей', 'Дмитрий', 'Андрей', 'Алексей', 'Иван']
+FEMALE_NAMES = ['Елена', 'Ольга', 'Наталья', 'Татьяна', 'Ирина', 'Анна']
+PATRONYMICS = [
+    ('Александрович', 'Александровна'),
+    ('Сергеевич', 'Сергеевна'),
+    ('Владимирович', 'Владимировна'),
+    ('Николаевич', 'Николаевна'),
+    ('Петрович', 'Петровна'),
+    ('Викторович', 'Викторовна'),
+]
+
+# (индекс, регион, районы, населённые пункты)
+REGIONS = [
+    ('101000', 'г. Москва', [], ['г. Москва']),
+    ('190000', 'г. Санкт-Петербург', [], ['г. Санкт-Петербург']),
+    (
+        '141400',
+        'Московская область',
+        ['Одинцовский район', 'Раменский район'],
+        ['г. Химки', 'г. Подольск', 'г. Одинцово', 'р.п. Быково'],
+    ),
+    (
+        '350000',
+        'Краснодарский край',
+        ['Абинский район', 'Динской район'],
+        ['г. Краснодар', 'ст. Холмская', 'ст. Динская'],
+    ),
+    (
+        '420000',
+        'Республика Татарстан',
+        ['Зеленодольский район'],
+        ['г. Казань', 'г. Набережные Челны'],
+    ),
+    (
+        '620000',
+        'Свердловская обл.',
+        ['Белоярский район'],
+        ['г. Екатеринбург', 'г. Нижний Тагил'],
+    ),
+    (
+        '630000',
+        'Новосибирская область',
+        ['Новосибирский р-н'],
+        ['г. Новосибирск', 'р.п. Кольцово'],
+    ),
+    (
+        '603000',
+        'Нижегородская обл',
+        ['Кстовский район'],
+        ['г. Нижний Новгород', 'г. Дзержинск'],
+    ),
+    (
+        '450000',
+        'Республика Башкортостан',
+        ['Уфимский р-н'],
+        ['г. Уфа', 'г. Стерлитамак'],
+    ),
+    (
+        '344000',
+        'Ростовская область',
+        ['Аксайский район'],
+        ['г. Ростов-на-Дону'],
+    ),
+]
+STREETS = [
+    'ул. Ленина',
+    'ул. Мира',
+    'ул. Советская',
+    'ул. Гагарина',
+    'пр-кт Победы',
+    'пер. Школьный',
+    'ул. Садовая',
+    'мкр. 3',
+    'ул. Молодёжная',
+    'ш. Энтузиастов',
+]
+BANKS = [
+    ('ПАО Сбербанк', '044525225'),
+    ('Банк ВТБ (ПАО)', '044525187'),
+    ('АО "Альфа-Банк"', '044525593'),
+    ('АО "Тинькофф Банк"', '044525974'),
+    ('ПАО "Совкомбанк"', '043469743'),
+    ('АО "Почта Банк"', '044525214'),
+]
+CREDITORS = [
+    'ООО МФК "Займер"',
+    'ООО "Феникс"',
+    'ПАО Сбербанк',
+    'АО "Тинькофф Банк"',
+    'ООО ПКО "Айди Коллект"',
+    'ООО МКК "Макро"',
+    'ПАО "Совкомбанк"',
+]
+PAYMENTS = ['Налог на доходы физических лиц', 'Транспортный налог', 'Штраф']
+PUBLISHERS = [
+    ('МФЦ г. Москвы', '7703752013', '1127746056150'),
+    ('ГАУ МО "МФЦ"', '5024145600', '1145024003730'),
+    ('ГАУ КК "МФЦ КК"', '2308185474', '1122308005490'),
+]
+FINISH_REASONS = [None, 'Завершение процедуры', 'Прекращение процедуры']
+
+# Доля сообщений о должниках, уже встречавшихся в архиве
+REPEAT_DEBTOR_SHARE = 0.2
+
+
+def _digits(rng, count):
+    return ''.join(rng.choice('0123456789') for _ in range(count))
+
+
+def _amount(rng, low, high):
+    return f'{rng.uniform(low, high):.2f}'
+
+
+def make_address(rng):
+    """
+    Возвращает случайный адрес в одном из распространённых в выгрузке
+    форматов написания.
+    """
+    postal_code, region, districts, localities = rng.choice(REGIONS)
+    parts = []
+    if rng.random() < 0.7:
+        parts.append(postal_code[:3] + _digits(rng, 3))
+    parts.append(region)
+    if districts and rng.random() < 0.4:
+        parts.append(rng.choice(districts))
+    locality = rng.choice(localities)
+    if locality != region:
+        parts.append(locality)
+    parts.append(rng.choice(STREETS))
+    parts.append(f'д. {rng.randint(1, 150)}')
+    if rng.random() < 0.2:
+        parts.append(f'корп. {rng.randint(1, 5)}')
+    if rng.random() < 0.75:
+        parts.append(f'кв. {rng.randint(1, 300)}')
+    return ', '.join(parts)
+
+
+def make_debtor(rng):
+    """
+    Возвращает словарь с данными случайного должника.
+    """
+    female = rng.random() < 0.5
+    surname = rng.choice(SURNAMES)[female]
+    first_name = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+    patronymic = rng.choice(PATRONYMICS)[female]
+    birth_date = date(1950, 1, 1) + timedelta(days=rng.randint(0, 365 * 55))
+    previous_names = []
+    if female and rng.random() < 0.15:
+        previous_names.append(
+            f'{rng.choice(SURNAMES)[1]} {first_name} {patronymic}'
+        )
+    return {
+        'name': f'{surname} {first_name} {patronymic}',
+        'birth_date': f'{birth_date.isoformat()}T00:00:00',
+        'birth_place': rng.choice(REGIONS)[3][0],
+        'address': make_address(rng),
+        'inn': _digits(rng, 12) if rng.random() < 0.9 else None,
+        'previous_names': previous_names,
+    }
+
+
+def _tag(name, value):
+    if value is None:
+        return ''
+    return f'<{name}>{escape(str(value))}</{name}>'
+
+
+def debtor_xml(debtor):
+    names = ''.join(
+        f'<PreviousName>{_tag("Value", name)}</PreviousName>'
+        for name in debtor['previous_names']
+    )
+    return (
+        '<Debtor>'
+        + _tag('Name', debtor['name'])
+        + _tag('BirthDate', debtor['birth_date'])
+        + _tag('BirthPlace', debtor['birth_place'])
+        + _tag('Address', debtor['address'])
+        + _tag('Inn', debtor['inn'])
+        + (f'<NameHistory>{names}</NameHistory>' if names else '')
+        + '</Debtor>'
+    )
+
+
+def payments_xml(rng, count):
+    payments = ''.join(
+        '<ObligatoryPayment>'
+        + _tag('Name', rng.choice(PAYMENTS))
+        + _tag('Sum', _amount(rng, 100, 50_000))
+        + '</ObligatoryPayment>'
+        for _ in range(count)
+    )
+    return f'<ObligatoryPayments>{payments}</ObligatoryPayments>'
+
+
+def obligations_xml(rng, count):
+    obligations = []
+    for _ in range(count):
+        total_sum = rng.uniform(5_000, 1_000_000)
+        debt_sum = total_sum * rng.choice((1, 1, rng.random()))
+        obligations.append(
+            '<MonetaryObligation>'
+            + _tag('CreditorName', rng.choice(CREDITORS))
+            + _tag('Content', 'Займ' if rng.random() < 0.5 else 'Кредит')
+            + _tag('Basis', f'Договор № {_digits(rng, 8)}')
+            + _tag('TotalSum', f'{total_sum:.2f}')
+            + _tag('DebtSum', f'{debt_sum:.2f}')
+            + '</MonetaryObligation>'
+        )
+    return f'<MonetaryObligations>{"".join(obligations)}</MonetaryObligations>'
+
+
+def message_xml(rng, number, debtor):
+    """
+    Возвращает XML одного сообщения ExtrajudicialBankruptcyMessage.
+    """
+    publish_date = date(2023, 1, 1) + timedelta(days=rng.randint(0, 730))
+    publisher = rng.choice(PUBLISHERS)
+    banks = ''.join(
+        '<Bank>' + _tag('Name', name) + _tag('Bik', bik) + '</Bank>'
+        for name, bik in rng.sample(BANKS, rng.randint(0, 3))
+    )
+    from_ent = ''
+    if rng.random() < 0.1:
+        from_ent = (
+            '<CreditorsFromEntrepreneurship>'
+            + payments_xml(rng, rng.randint(1, 2))
+            + '</CreditorsFromEntrepreneurship>'
+        )
+    non_from_ent = (
+        '<CreditorsNonFromEntrepreneurship>'
+        + obligations_xml(rng, rng.randint(1, 6))
+        + (payments_xml(rng, 1) if rng.random() < 0.3 else '')
+        + '</CreditorsNonFromEntrepreneurship>'
+    )
+    return (
+        '<ExtrajudicialBankruptcyMessage>'
+        + _tag('Id', f'{number:032x}')
+        + _tag('Number', str(10_000_000 + number))
+        + _tag('Type', 'ExtrajudicialBankruptcy')
+        + _tag('PublishDate', f'{publish_date.isoformat()}T10:00:00')
+        + _tag('FinishReason', rng.choice(FINISH_REASONS))
+        + debtor_xml(debtor)
+        + '<Publisher>'
+        + _tag('Name', publisher[0])
+        + _tag('Inn', publisher[1])
+        + _tag('Ogrn', publisher[2])
+        + '</Publisher>'
+        + (f'<Banks>{banks}</Banks>' if banks else '')
+        + from_ent
+        + non_from_ent
+        + '</ExtrajudicialBankruptcyMessage>\n'
+    )
+
+
+def iter_messages_xml(count, seed=0):
+    """
+    Генерирует XML сообщений по одному.
+    :param count: количество сообщений
+    :param seed: зерно генератора случайных чисел
+    :return: генератор строк XML
+    """
+    rng = random.Random(seed)
+    debtors = []
+    for number in range(1, count + 1):
+        if debtors and rng.random() < REPEAT_DEBTOR_SHARE:
+            debtor = rng.choice(debtors)
+        else:
+            debtor = make_debtor(rng)
+            debtors.append(debtor)
+        yield message_xml(rng, number, debtor)
+
+
+def generate(path, count, seed=0):
+    """
+    Записывает архив с count сообщениями в формате ExtrajudicialData.
+    :param path: путь к создаваемому .xml.gz
+    :param count: количество сообщений
+    :param seed: зерно генератора случайных чисел
+    """
+    with open(path, 'wb') as raw:
+        with gzip.GzipFile(filename='', fileobj=raw, mode='wb', mtime=0) as gz:
+            with io.TextIOWrapper(gz, encoding='utf-8') as xml_file:
+                xml_file.write(
+                    '<?xml version="1.0" encoding="utf-8"?>\n'
+                    '<ExtrajudicialData>\n'
+                )
+                for message in iter_messages_xml(count, seed):
+                    xml_file.write(message)
+                xml_file.write('</ExtrajudicialData>\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Генерация синтетического ExtrajudicialData.xml.gz'
+    )
+    parser.add_argument('path')
+    parser.add_argument('--count', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.path, args.count, args.seed)
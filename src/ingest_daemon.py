@@ -0,0 +1,487 @@
+"""
+Демон загрузки: следит за директорией и загружает новые архивы в БД.
+
+В отличие от save_to_sql.py, процесс запускается один раз: словари
+морфологии Natasha загружаются при импорте address_parser, соединения
+с MySQL держатся в пуле, поэтому на каждый новый файл не тратится время
+запуска интерпретатора и подключения.
+
+Конвейер на asyncio: для каждого файла разбор XML идёт в отдельном потоке
+и порциями по batch_size сообщений передаётся через ограниченную очередь
+загрузчику, который вставляет порцию и фиксирует транзакцию. Одновременно
+обрабатывается не более workers файлов, но в БД пишет только один
+загрузчик за раз: get_or_create_* сначала ищут запись, потом вставляют,
+и параллельные транзакции по файлам с общими издателями, банками и
+должниками падали бы на дубликатах ключа (1062) и взаимных блокировках
+(1213). Разбор при этом идёт параллельно. Сообщения, уже записанные в БД,
+insert_messages пропускает, поэтому архив, загрузка которого прервалась,
+можно просто положить в директорию ещё раз.
+
+Файл считается готовым, когда он не менялся settle секунд. Загруженные
+архивы переносятся в поддиректорию done, архивы с ошибкой разбора или
+данных — в failed. Если к БД не удалось подключиться, архив остаётся
+в директории и загружается повторно при следующем опросе.
+Состояние отдаётся по HTTP: GET /health и GET /status (JSON).
+
+Запуск:
+    python ingest_daemon.py ../incoming --workers 2 --status-port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+
+import address_parser
+import metrics
+import sources
+from main import iter_messages
+from metrics import METRICS, stage
+from save_to_sql import DB_CONFIG, ensure_regions, insert_messages
+
+# Форматы выгрузок, которые умеет читать sources.open_source
+WATCH_SUFFIXES = ('.xml', '.xml.gz', '.xml.zst')
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+POLL_INTERVAL = 2.0
+SETTLE_SECONDS = 2.0
+BATCH_SIZE = 500
+# Количество порций, которые разбор может опережать загрузку
+QUEUE_SIZE = 4
+# Окно для расчёта текущей скорости загрузки, секунды
+THROUGHPUT_WINDOW = 60.0
+
+HTTP_REASONS = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}
+
+
+class DatabaseUnavailable(Exception):
+    """
+    Не удалось получить соединение с БД: архив не испорчен,
+    его нужно загрузить повторно.
+    """
+
+
+class ConnectionPool:
+    """
+    Пул соединений с БД. Соединения создаются по мере надобности,
+    но не больше size; перед выдачей проверяется, что соединение живо.
+    """
+
+    def __init__(self, connect, size):
+        """
+        :param connect: функция без аргументов, возвращающая соединение
+        :param size: максимальное количество соединений
+        """
+        self._connect = connect
+        self._size = size
+        self._created = 0
+        self._idle = asyncio.Queue()
+
+    @property
+    def idle(self):
+        return self._idle.qsize()
+
+    @property
+    def created(self):
+        return self._created
+
+    async def acquire(self):
+        if self._idle.empty() and self._created < self._size:
+            self._created += 1
+            try:
+                return await asyncio.to_thread(self._connect)
+            except Exception:
+                self._created -= 1
+                raise
+        conn = await self._idle.get()
+        ping = getattr(conn, 'ping', None)
+        if ping is not None:
+            await asyncio.to_thread(ping, reconnect=True)
+        return conn
+
+    def release(self, conn):
+        self._idle.put_nowait(conn)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+            self._created -= 1
+
+
+class IngestStatus:
+    """
+    Счётчики для /status: файлы, сообщения, скорость и последняя ошибка.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.files_done = 0
+        self.files_failed = 0
+        self.messages = 0
+        self.current = {}
+        self.last_error = None
+        self._recent = deque()
+
+    def add_messages(self, count):
+        self.messages += count
+        self._recent.append((time.monotonic(), count))
+
+    def throughput(self):
+        """
+        :return: сообщений в секунду за последние THROUGHPUT_WINDOW секунд
+        """
+        now = time.monotonic()
+        while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW:
+            self._recent.popleft()
+        window = min(THROUGHPUT_WINDOW, time.time() - self.started) or 1
+        return sum(count for _, count in self._recent) / window
+
+    def to_dict(self):
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'files_done': self.files_done,
+            'files_failed': self.files_failed,
+            'messages': self.messages,
+            'messages_per_second': round(self.throughput(), 1),
+            'in_progress': {
+                os.path.basename(path): progress
+                for path, progress in self.current.items()
+            },
+            'last_error': self.last_error,
+        }
+
+
+class IngestDaemon:
+    """
+    Следит за директорией watch_dir и загружает появляющиеся архивы.
+    """
+
+    def __init__(
+        self,
+        watch_dir,
+        connect,
+        workers=2,
+        batch_size=BATCH_SIZE,
+        poll_interval=POLL_INTERVAL,
+        settle=SETTLE_SECONDS,
+    ):
+        """
+        :param watch_dir: директория с входящими архивами
+        :param connect: функция без аргументов, возвращающая соединение
+        :param workers: сколько файлов обрабатывать одновременно
+        :param batch_size: сообщений в одной транзакции
+        :param poll_interval: период опроса директории, секунды
+        :param settle: сколько секунд файл не должен меняться
+        """
+        self.watch_dir = watch_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.status = IngestStatus()
+        self.pool = ConnectionPool(connect, workers)
+        self._connect_failed = False
+        self._in_progress = set()
+        self._tasks = set()
+        self._semaphore = asyncio.Semaphore(workers)
+        # Порции всех файлов записываются в БД по одной
+        self._db_lock = asyncio.Lock()
+        # На каждый файл нужны два потока: разбор и загрузка
+        self._executor = ThreadPoolExecutor(max_workers=workers * 2)
+
+    def scan(self):
+        """
+        :return: отсортированный список готовых к загрузке архивов
+        """
+        ready = []
+        now = time.time()
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if (
+                    not entry.is_file()
+                    or not entry.name.endswith(WATCH_SUFFIXES)
+                    or entry.path in self._in_progress
+                ):
+                    continue
+                if now - entry.stat().st_mtime >= self.settle:
+                    ready.append(entry.path)
+        return sorted(ready)
+
+    def start_ready(self):
+        """
+        Запускает загрузку всех готовых архивов.
+        :return: список запущенных задач
+        """
+        started = []
+        for path in self.scan():
+            self._in_progress.add(path)
+            task = asyncio.create_task(self._handle(path))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            started.append(task)
+        return started
+
+    async def run_once(self):
+        """
+        Загружает все готовые архивы и дожидается окончания.
+        """
+        await asyncio.gather(*self.start_ready())
+
+    async def run(self, status_port=None):
+        """
+        Основной цикл: опрашивает директорию, пока процесс не остановят.
+        :param status_port: порт HTTP для /health и /status
+        """
+        server = None
+        if status_port is not None:
+            server = await asyncio.start_server(
+                self._serve_status, port=status_port
+            )
+        try:
+            while True:
+                self.start_ready()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            if server is not None:
+                server.close()
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.pool.close()
+
+    async def _handle(self, path):
+        async with self._semaphore:
+            self.status.current[path] = 0
+            try:
+                await self.ingest_file(path)
+            except asyncio.CancelledError:
+                raise
+            except DatabaseUnavailable as e:
+                # Файл остаётся на месте и загрузится при следующем опросе
+                self.status.last_error = f'{os.path.basename(path)}: {e}'
+                print(
+                    f'БД недоступна, {path} будет загружен повторно: {e}',
+                    file=sys.stderr,
+                )
+            except Exception as e:
+                self.status.files_failed += 1
+                self.status.last_error = f'{os.path.basename(path)}: {e}'
+                print(
+                    f'Ошибка при загрузке {path}: {e}',
+                    file=sys.stderr,
+                )
+                self._move(path, FAILED_DIR)
+            else:
+                self.status.files_done += 1
+                self._move(path, DONE_DIR)
+            finally:
+                self.status.current.pop(path, None)
+                self._in_progress.discard(path)
+
+    async def ingest_file(self, path):
+        """
+        Загружает один архив: разбор в потоке, вставка порциями.
+        :param path: путь к архиву
+        """
+        loop = asyncio.get_running_loop()
+        batches = asyncio.Queue(maxsize=QUEUE_SIZE)
+        stop = threading.Event()
+        producer = loop.run_in_executor(
+            self._executor, self._produce, path, batches, stop, loop
+        )
+        error = None
+        # Должники, уже загруженные из этого файла
+        debtors = {}
+        try:
+            conn = await self.pool.acquire()
+            self._connect_failed = False
+        except Exception as e:
+            self._connect_failed = True
+            stop.set()
+            error = DatabaseUnavailable(e)
+            conn = None
+        try:
+            while (batch := await batches.get()) is not None:
+                # После ошибки только вычитываем очередь,
+                # чтобы поток разбора не завис на put
+                if error is not None:
+                    continue
+                try:
+                    async with self._db_lock:
+                        await loop.run_in_executor(
+                            self._executor,
+                            self._load_batch,
+                            conn,
+                            batch,
+                            debtors,
+                        )
+                except Exception as e:
+                    stop.set()
+                    error = e
+                else:
+                    self.status.add_messages(len(batch))
+                    self.status.current[path] += len(batch)
+        except asyncio.CancelledError:
+            stop.set()
+            raise
+        finally:
+            if conn is not None:
+                self.pool.release(conn)
+        await producer
+        if error is not None:
+            raise error
+
+    def _produce(self, path, batches, stop, loop):
+        def put(item):
+            future = asyncio.run_coroutine_threadsafe(batches.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=0.5)
+                except TimeoutError:
+                    # Загрузку отменили, и очередь больше никто не читает
+                    if stop.is_set():
+                        future.cancel()
+                        return
+
+        try:
+            batch = []
+            for msg in iter_messages(path, chunk_size=self.batch_size):
+                if stop.is_set():
+                    return
+                batch.append(msg)
+                if len(batch) >= self.batch_size:
+                    put(batch)
+                    batch = []
+            if batch and not stop.is_set():
+                put(batch)
+        finally:
+            put(None)
+
+    def _load_batch(self, conn, batch, debtors):
+        try:
+            cur = conn.cursor()
+            for msg in batch:
+                insert_messages(cur, msg, debtors)
+            with stage('db_commit'):
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _move(self, path, subdir):
+        target_dir = os.path.join(self.watch_dir, subdir)
+        os.makedirs(target_dir, exist_ok=True)
+        shutil.move(path, os.path.join(target_dir, os.path.basename(path)))
+
+    def health(self):
+        """
+        :return: кортеж (HTTP-код, словарь) для /health
+        """
+        if self._connect_failed:
+            return 503, {'status': 'db_unavailable'}
+        return 200, {'status': 'ok'}
+
+    def status_dict(self):
+        result = self.status.to_dict()
+        result['workers'] = self.workers
+        result['pool'] = {
+            'connections': self.pool.created,
+            'idle': self.pool.idle,
+        }
+        if METRICS.enabled:
+            result['metrics'] = METRICS.to_dict()
+        return result
+
+    async def _serve_status(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Заголовки запроса не нужны, но их надо вычитать
+            while await reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.split()
+            path = parts[1].decode() if len(parts) > 1 else '/'
+            if path == '/health':
+                code, body = self.health()
+            elif path == '/status':
+                code, body = 200, self.status_dict()
+            else:
+                code, body = 404, {'error': 'not found'}
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            writer.write(
+                f'HTTP/1.1 {code} {HTTP_REASONS[code]}\r\n'
+                'Content-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                'Connection: close\r\n\r\n'.encode('ascii')
+                + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def connect_mysql():
+    conn = pymysql.connect(**DB_CONFIG)
+    with conn.cursor() as cur:
+        ensure_regions(cur)
+    conn.commit()
+    return conn
+
+
+async def serve(args):
+    daemon = IngestDaemon(
+        args.watch_dir,
+        connect_mysql,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        settle=args.settle,
+    )
+    print(
+        f'Слежу за {os.path.abspath(args.watch_dir)}'
+        + (
+            f', статус: http://localhost:{args.status_port}/status'
+            if args.status_port
+            else ''
+        ),
+        file=sys.stderr,
+    )
+    await daemon.run(args.status_port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Демон загрузки архивов из директории в БД'
+    )
+    parser.add_argument('watch_dir', help='директория с входящими архивами')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS)
+    parser.add_argument(
+        '--status-port', type=int, help='порт HTTP для /health и /status'
+    )
+    address_parser.add_arguments(parser)
+    sources.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+    address_parser.configure(args)
+    sources.configure(args)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.finish(args)
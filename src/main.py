@@ -4,12 +4,23 @@
 и функции для преобразования XML-элементов в объекты Python.
 """
 
-import gzip
+import argparse
+import functools
 import os
+import sys
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
 from pprint import pprint
 
-from address_parser import parse_address
+import address_parser
+import export
+import metrics
+import profiling
+import sources
+from address_parser import ADDRESS_LEVELS, parse_address, parse_addresses
+from metrics import METRICS, TimedReader, count, stage
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FILE_PATH = os.path.join(
@@ -18,6 +29,8 @@ FILE_PATH = os.path.join(
     'СКБ_INTEGRA_Тестовое_задание_(1)',
     'ExtrajudicialData.xml.gz',
 )
+# Сколько сообщений собирается перед пакетным разбором адресов
+CHUNK_SIZE = 500
 
 
 def get_text(elem, tag):
@@ -30,6 +43,53 @@ def get_text(elem, tag):
     return elem.findtext(tag) if elem is not None else None
 
 
+# Форматы дат, кроме ISO 8601, которые встречаются в выгрузках, в порядке
+# проверки. Порядок не меняется: parse_date вызывается из нескольких потоков
+DATE_FORMATS = ('%d.%m.%Y', '%Y%m%d', '%d/%m/%Y')
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_date(value):
+    """
+    Преобразует дату из XML в datetime.date. Различных дат в архиве
+    немного, поэтому результат кэшируется по исходной строке.
+    :param value: дата в ISO 8601 (с временем и зоной или без)
+        или в одном из DATE_FORMATS
+    :return: datetime.date или None, если дата пустая или не распознана
+    """
+    if not value:
+        return None
+    # Быстрый путь: дата ISO 8601 в первых десяти символах
+    if len(value) >= 10 and value[4] == '-' and value[7] == '-':
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def get_date(elem, tag):
+    """
+    Получить дату из подэлемента по тегу.
+    :return: datetime.date или None
+    """
+    return parse_date(get_text(elem, tag))
+
+
+def get_decimal(elem, tag):
+    """
+    Получить денежную сумму из подэлемента по тегу. Сумма хранится
+    в Decimal без потери точности, как в столбцах DECIMAL(20,2).
+    :return: Decimal (0, если значения нет)
+    """
+    return Decimal(get_text(elem, tag) or 0)
+
+
 def get_list(elem, tag, cls):
     """
     Получить список объектов cls (узла XML)
@@ -69,9 +129,15 @@ class Debtor:
     Класс для хранения информации о должнике.
     """
 
-    def __init__(self, elem):
+    def __init__(self, elem, address_level='full', parse=True):
+        """
+        :param elem: XML-элемент Debtor
+        :param address_level: уровень разбора адреса (см. parse_address)
+        :param parse: False — не разбирать адрес сразу; его передают
+            позже в set_address (пакетный разбор, см. parse_addresses)
+        """
         self.name = get_text(elem, 'Name')
-        self.birth_date = get_text(elem, 'BirthDate')
+        self.birth_date = get_date(elem, 'BirthDate')
         self.birth_place = get_text(elem, 'BirthPlace')
         self.address = get_text(elem, 'Address')
         self.inn = get_text(elem, 'Inn')
@@ -83,10 +149,17 @@ class Debtor:
                 for name in names_elem.findall('PreviousName')
                 if name.findtext('Value') is not None
             ]
-        self.parsed_address = parse_address(self.address)
-        parsed_address = parse_address(self.address)
+        self.set_address(
+            parse_address(self.address, address_level) if parse else {}
+        )
+
+    def set_address(self, parsed_address):
+        """
+        :param parsed_address: словарь из parse_address
+        """
         self.postal_code = parsed_address.get('postal_code')
         self.region = parsed_address.get('region')
+        self.region_id = parsed_address.get('region_id')
         self.district = parsed_address.get('district')
         self.locality = parsed_address.get('locality')
         self.street = parsed_address.get('street')
@@ -101,6 +174,7 @@ class Debtor:
             'address': self.address,
             'postal_code': self.postal_code,
             'region': self.region,
+            'region_id': self.region_id,
             'locality': self.locality,
             'district': self.district,
             'street': self.street,
@@ -110,6 +184,107 @@ class Debtor:
             'previous_names': self.previous_names,
         }
 
+    @property
+    def key(self):
+        return (self.name, self.birth_date, self.inn)
+
+    def merge_previous_names(self, names):
+        """
+        Добавляет предыдущие имена, которых ещё нет у должника.
+        :param names: список предыдущих имён из очередного сообщения
+        """
+        for name in names:
+            if name not in self.previous_names:
+                self.previous_names.append(name)
+
+
+class DebtorIndex:
+    """
+    Индекс должников, уже встреченных при разборе архива.
+
+    Ключ — (ФИО, дата рождения, ИНН). Для повторного должника не создаётся
+    новый объект Debtor и не разбирается адрес: сообщение получает ссылку
+    на уже созданный объект, а предыдущие имена объединяются. Словарь
+    должника тоже общий для всех его сообщений.
+
+    Чтобы память не росла неограниченно на больших архивах, хранится
+    не больше max_size должников: давно не встречавшиеся вытесняются
+    и при следующей встрече разбираются заново.
+
+    С batch=True адреса новых должников не разбираются сразу, а
+    накапливаются до вызова parse_pending, который разбирает их
+    одним пакетом (parse_addresses).
+    """
+
+    def __init__(self, max_size=100_000, address_level='full', batch=False):
+        self.max_size = max_size
+        self.address_level = address_level
+        self.batch = batch
+        self.hits = 0
+        self._debtors = OrderedDict()
+        self._dicts = {}
+        self._pending = []
+
+    def __len__(self):
+        return len(self._debtors)
+
+    def get(self, elem):
+        """
+        Возвращает должника для XML-элемента Debtor.
+        :param elem: XML-элемент Debtor
+        :return: объект Debtor (общий для одинаковых должников)
+        """
+        key = (
+            get_text(elem, 'Name'),
+            get_date(elem, 'BirthDate'),
+            get_text(elem, 'Inn'),
+        )
+        debtor = self._debtors.get(key)
+        if debtor is None:
+            debtor = Debtor(elem, self.address_level, parse=not self.batch)
+            if self.batch:
+                self._pending.append(debtor)
+            self._debtors[key] = debtor
+            if len(self._debtors) > self.max_size:
+                evicted, _ = self._debtors.popitem(last=False)
+                self._dicts.pop(evicted, None)
+            return debtor
+        self.hits += 1
+        count('debtors_reused')
+        self._debtors.move_to_end(key)
+        names_elem = elem.find('NameHistory')
+        if names_elem is not None:
+            debtor.merge_previous_names(
+                [
+                    name.findtext('Value')
+                    for name in names_elem.findall('PreviousName')
+                    if name.findtext('Value') is not None
+                ]
+            )
+        return debtor
+
+    def parse_pending(self):
+        """
+        Разбирает адреса должников, добавленных после прошлого вызова.
+        """
+        if not self._pending:
+            return
+        parsed = parse_addresses(
+            [debtor.address for debtor in self._pending], self.address_level
+        )
+        for debtor, parsed_address in zip(self._pending, parsed):
+            debtor.set_address(parsed_address)
+        self._pending = []
+
+    def to_dict(self, debtor):
+        """
+        :return: общий словарь должника из индекса
+        """
+        result = self._dicts.get(debtor.key)
+        if result is None:
+            result = self._dicts[debtor.key] = debtor.to_dict()
+        return result
+
 
 class Bank:
     """
@@ -134,7 +309,7 @@ class ObligatoryPayment:
 
     def __init__(self, elem):
         self.name = get_text(elem, 'Name')
-        self.payment_sum = float(get_text(elem, 'Sum') or 0)
+        self.payment_sum = get_decimal(elem, 'Sum')
 
     def to_dict(self):
         return {
@@ -152,8 +327,8 @@ class MonetaryObligation:
         self.creditor_name = get_text(elem, 'CreditorName')
         self.content = get_text(elem, 'Content')
         self.basis = get_text(elem, 'Basis')
-        self.total_sum = float(get_text(elem, 'TotalSum') or 0)
-        self.debt_sum = float(get_text(elem, 'DebtSum') or 0)
+        self.total_sum = get_decimal(elem, 'TotalSum')
+        self.debt_sum = get_decimal(elem, 'DebtSum')
 
     def to_dict(self):
         return {
@@ -218,16 +393,26 @@ class ExtrajudicialBankruptcyMessage:
     о внесудебном банкротстве.
     """
 
-    def __init__(self, elem):
+    def __init__(self, elem, debtors=None):
+        """
+        :param elem: XML-элемент сообщения
+        :param debtors: DebtorIndex для переиспользования должников
+        """
         self.id = get_text(elem, 'Id')
+        self.debtors = debtors
         self.number = get_text(elem, 'Number')
         self.type = get_text(elem, 'Type')
-        self.publish_date = get_text(elem, 'PublishDate')
+        self.publish_date = get_date(elem, 'PublishDate')
         self.finish_reason = get_text(elem, 'FinishReason')
 
         # Должник
         debtor_elem = elem.find('Debtor')
-        self.debtor = Debtor(debtor_elem) if debtor_elem is not None else None
+        if debtor_elem is None:
+            self.debtor = None
+        elif debtors is not None:
+            self.debtor = debtors.get(debtor_elem)
+        else:
+            self.debtor = Debtor(debtor_elem)
 
         # Источник
         publisher_elem = elem.find('Publisher')
@@ -265,7 +450,7 @@ class ExtrajudicialBankruptcyMessage:
             'type': self.type,
             'publish_date': self.publish_date,
             'finish_reason': self.finish_reason,
-            'debtor': self.debtor.to_dict() if self.debtor else None,
+            'debtor': self._debtor_dict(),
             'publisher': self.publisher.to_dict() if self.publisher else None,
             'banks': [bank.to_dict() for bank in self.banks],
             'creditors_from_entrepreneurship': (
@@ -280,23 +465,183 @@ class ExtrajudicialBankruptcyMessage:
             ),
         }
 
+    def _debtor_dict(self):
+        if self.debtor is None:
+            return None
+        if self.debtors is not None:
+            return self.debtors.to_dict(self.debtor)
+        return self.debtor.to_dict()
+
 
-def parse_messages(file_path):
+def _next_message(events, state):
+    """
+    Продвигает iterparse до конца следующего элемента сообщения
+    верхнего уровня.
+    :param events: итератор событий ET.iterparse
+    :param state: словарь с текущей глубиной и корнем документа
+    :return: XML-элемент сообщения или None, если файл закончился
+    """
+    for event, elem in events:
+        if event == 'start':
+            if state['root'] is None:
+                state['root'] = elem
+            state['depth'] += 1
+            continue
+        state['depth'] -= 1
+        if (
+            state['depth'] == 1
+            and elem.tag == 'ExtrajudicialBankruptcyMessage'
+        ):
+            return elem
+    return None
+
+
+def iter_message_elements(file_path):
+    """
+    Потоково читает XML-архив и по одному возвращает элементы
+    ExtrajudicialBankruptcyMessage. Обработанные элементы удаляются
+    из дерева, поэтому память не зависит от размера файла.
+    Элемент действителен только до следующей итерации.
+    :param file_path: путь к выгрузке (.xml, .xml.gz, .xml.zst)
+        или '-' для стандартного ввода, см. sources.py
+    :return: генератор XML-элементов сообщений
+    """
+    with sources.open_source(file_path) as (xml_file, source_format):
+        if METRICS.enabled:
+            xml_file = TimedReader(xml_file, METRICS, source_format)
+        events = ET.iterparse(xml_file, events=('start', 'end'))
+        state = {'depth': 0, 'root': None}
+        while True:
+            with stage('xml_parse'):
+                elem = _next_message(events, state)
+            if elem is None:
+                return
+            yield elem
+            state['root'].clear()
+
+
+def iter_messages(
+    file_path, debtors=None, address_level='full', chunk_size=CHUNK_SIZE
+):
+    """
+    Потоково распарсить XML-файл и по одному возвращать сообщения
+    о банкротстве в виде словарей. Повторные должники разбираются
+    один раз, их словари общие для всех сообщений (см. DebtorIndex).
+
+    Сообщения собираются порциями по chunk_size, и адреса новых
+    должников порции разбираются одним вызовом parse_addresses.
+    :param file_path: путь к архиву XML
+    :param debtors: индекс должников; по умолчанию новый для файла
+    :param address_level: 'full' или 'region' — если нужны только регионы,
+        адреса разбираются без Natasha (см. parse_address)
+    :param chunk_size: размер порции сообщений
+    :return: генератор словарей сообщений
+    """
+    if debtors is None:
+        debtors = DebtorIndex(address_level=address_level, batch=True)
+    number = 0
+    chunk = []
+    elements = iter_message_elements(file_path)
+    while True:
+        # Объекты сообщений копируют данные из элемента, поэтому их можно
+        # копить, хотя сам элемент действителен до следующей итерации
+        for elem in elements:
+            with stage('entities'):
+                chunk.append(ExtrajudicialBankruptcyMessage(elem, debtors))
+            if len(chunk) >= chunk_size:
+                break
+        if not chunk:
+            return
+        debtors.parse_pending()
+        for msg in chunk:
+            with stage('to_dict'):
+                result = msg.to_dict()
+            count('messages')
+            number += 1
+            if number in profiling.snapshot_points:
+                profiling.take_snapshot(number)
+            yield result
+        chunk = []
+
+
+def parse_messages(file_path, address_level='full'):
     """
     Распарсить XML-файл и вернуть список сообщений о банкротстве
     в виде словарей.
     :param file_path: путь к архиву XML
+    :param address_level: уровень разбора адресов, 'full' или 'region'
     :return: список словарей сообщений
     """
-    with gzip.open(file_path) as xml_file:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        messages = []
-        for elem in root.findall('ExtrajudicialBankruptcyMessage'):
-            msg = ExtrajudicialBankruptcyMessage(elem)
-            messages.append(msg.to_dict())
-        return messages
+    return list(iter_messages(file_path, address_level=address_level))
+
+
+def export_messages(
+    file_path, export_format, output=None, compress=False, address_level='full'
+):
+    """
+    Потоково выгрузить сообщения в JSON Lines или CSV (см. export.py).
+    :param file_path: путь к архиву XML
+    :param export_format: 'jsonl' или 'csv'
+    :param output: файл для jsonl (None — стандартный вывод)
+        или директория для csv
+    :param compress: сжимать gzip
+    :param address_level: уровень разбора адресов, 'full' или 'region'
+    :return: количество выгруженных сообщений
+    """
+    messages = iter_messages(file_path, address_level=address_level)
+    if export_format == 'csv':
+        return export.write_csv(messages, output, compress)
+    return export.write_jsonl(messages, output, compress)
 
 
 if __name__ == '__main__':
-    pprint(parse_messages(FILE_PATH))
+    parser = argparse.ArgumentParser(description='Парсинг XML-архива')
+    parser.add_argument(
+        '--address-level',
+        choices=ADDRESS_LEVELS,
+        default='full',
+        help='region — разбирать только индекс, регион и район (быстро)',
+    )
+    parser.add_argument(
+        '--input',
+        default=FILE_PATH,
+        help='выгрузка .xml, .xml.gz или .xml.zst; - — стандартный ввод',
+    )
+    parser.add_argument(
+        '--export',
+        choices=export.EXPORT_FORMATS,
+        help='потоково выгрузить сообщения вместо вывода в терминал',
+    )
+    parser.add_argument(
+        '--output',
+        help='файл для jsonl (по умолчанию stdout) или директория для csv',
+    )
+    parser.add_argument(
+        '--gzip', action='store_true', help='сжимать выгрузку gzip'
+    )
+    address_parser.add_arguments(parser)
+    sources.add_arguments(parser)
+    metrics.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    if args.export == 'csv' and not args.output:
+        parser.error('для --export csv нужна директория --output')
+    metrics.configure(args)
+    address_parser.configure(args)
+    sources.configure(args)
+    if args.export:
+        exported = profiling.run(
+            args,
+            export_messages,
+            args.input,
+            args.export,
+            args.output,
+            args.gzip,
+            args.address_level,
+        )
+        print(f'Выгружено сообщений: {exported}', file=sys.stderr)
+    else:
+        pprint(
+            profiling.run(args, parse_messages, args.input, args.address_level)
+        )
+    metrics.finish(args)
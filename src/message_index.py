@@ -0,0 +1,493 @@
+"""
+Индекс для произвольного доступа к сообщениям в выгрузке.
+
+Чтобы посмотреть одно сообщение (по Id, номеру или ИНН должника),
+не нужно разбирать весь архив: индекс хранит смещение и длину каждого
+элемента ExtrajudicialBankruptcyMessage в распакованном XML, а также
+точки, с которых можно начать распаковку. get_message находит ближайшую
+точку перед сообщением, распаковывает только участок до него и разбирает
+один элемент.
+
+Индекс — файл SQLite рядом с выгрузкой (<выгрузка>.idx). Он строится
+один раз за проход по архиву и перестраивается, если выгрузка изменилась.
+
+Точки распаковки:
+- несжатый .xml читается прямо по смещению;
+- в .xml.gz сохраняются начала частей многотомного архива: с них zlib
+  распаковывает заново. Состояние zlib в середине части из Python
+  сохранить на диск нельзя, поэтому для архива из одной части
+  write_seekable переписывает его в многотомный gzip с частью на каждые
+  CHECKPOINT_SPACING байт (обычный gunzip читает его как раньше);
+- кроме того, при чтении в памяти процесса запоминаются копии состояния
+  zlib (decompressobj.copy) через каждые CHECKPOINT_SPACING байт, так что
+  повторные запросы в том же процессе распаковывают не больше этого;
+- .xml.zst распаковывается с начала.
+
+Если точка распаковки одна, а выгрузка длиннее CHECKPOINT_SPACING,
+первый запрос в процессе распаковывает всё до сообщения; build и get
+предупреждают об этом и предлагают --seekable.
+
+Запуск:
+    python message_index.py build ../dumps/ExtrajudicialData.xml.gz
+    python message_index.py get ../dumps/ExtrajudicialData.xml.gz --inn 7701
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import xml.etree.ElementTree as ET
+import zlib
+from pprint import pprint
+
+import sources
+from address_parser import ADDRESS_LEVELS
+from main import (
+    FILE_PATH,
+    DebtorIndex,
+    ExtrajudicialBankruptcyMessage,
+    get_text,
+)
+
+INDEX_SUFFIX = '.idx'
+# Шаг точек распаковки в распакованных данных
+CHECKPOINT_SPACING = 4 << 20
+# Блок сжатых данных при чтении по индексу: чем меньше, тем точнее
+# шаг копий состояния zlib
+LOOKUP_READ_SIZE = 64 << 10
+
+START_TAG_RE = re.compile(rb'<ExtrajudicialBankruptcyMessage[\s>]')
+END_TAG = b'</ExtrajudicialBankruptcyMessage>'
+ENCODING_RE = re.compile(rb'<\?xml[^>]*encoding=["\']([\w.-]+)')
+
+SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE checkpoint (
+        compressed_offset INTEGER,
+        decompressed_offset INTEGER PRIMARY KEY
+    );
+    CREATE TABLE message (
+        id TEXT PRIMARY KEY,
+        number TEXT,
+        inn TEXT,
+        offset INTEGER,
+        length INTEGER
+    );
+    CREATE INDEX message_number ON message (number);
+    CREATE INDEX message_inn ON message (inn);
+"""
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def iter_elements(chunks):
+    """
+    Находит элементы сообщений в потоке распакованных блоков.
+    :param chunks: итератор блоков bytes
+    :return: генератор пар (смещение в распакованных данных, байты элемента)
+    """
+    buffer = b''
+    base = 0
+    for chunk in chunks:
+        buffer += chunk
+        position = 0
+        while True:
+            start = START_TAG_RE.search(buffer, position)
+            if start is None:
+                # Начало тега может оказаться на границе блоков
+                keep = max(position, len(buffer) - len(END_TAG))
+                break
+            end = buffer.find(END_TAG, start.start())
+            if end < 0:
+                keep = start.start()
+                break
+            end += len(END_TAG)
+            yield base + start.start(), buffer[start.start() : end]
+            position = end
+        buffer = buffer[keep:]
+        base += keep
+
+
+def _element_keys(data, encoding):
+    elem = ET.fromstring(data, parser=ET.XMLParser(encoding=encoding))
+    return (
+        get_text(elem, 'Id'),
+        get_text(elem, 'Number'),
+        get_text(elem.find('Debtor'), 'Inn'),
+    )
+
+
+def build_index(path, output=None):
+    """
+    Строит индекс выгрузки за один проход.
+    :param path: путь к выгрузке (.xml, .xml.gz или .xml.zst)
+    :param output: путь к файлу индекса (по умолчанию <path>.idx)
+    :return: количество проиндексированных сообщений
+    """
+    output = output or index_path(path)
+    if os.path.exists(output):
+        os.remove(output)
+    conn = sqlite3.connect(output)
+    checkpoints = []
+    indexed = 0
+    try:
+        conn.executescript(SCHEMA)
+        with open(path, 'rb') as raw:
+            source_format = sources.detect_format(raw.read(4))
+            raw.seek(0)
+            if source_format == 'gzip':
+                chunks = sources.gzip_chunks(raw, checkpoints)
+            elif source_format == 'zstd':
+                chunks = sources.zstd_chunks(raw)
+            else:
+                chunks = iter(lambda: raw.read(sources.READ_SIZE), b'')
+            head = next(chunks, b'')
+            match = ENCODING_RE.search(head[:200])
+            encoding = match.group(1).decode('ascii') if match else 'utf-8'
+            rows = []
+            for offset, data in iter_elements(_chain(head, chunks)):
+                rows.append(
+                    (*_element_keys(data, encoding), offset, len(data))
+                )
+                if len(rows) >= 10_000:
+                    indexed += _insert_messages(conn, rows)
+                    rows = []
+            indexed += _insert_messages(conn, rows)
+        if not checkpoints:
+            checkpoints.append((0, 0))
+        conn.executemany(
+            'INSERT OR REPLACE INTO checkpoint VALUES (?, ?)', checkpoints
+        )
+        meta = {
+            'format': source_format,
+            'encoding': encoding,
+            **_file_signature(path),
+        }
+        conn.executemany(
+            'INSERT INTO meta VALUES (?, ?)',
+            [(key, json.dumps(value)) for key, value in meta.items()],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return indexed
+
+
+def _chain(head, chunks):
+    if head:
+        yield head
+    yield from chunks
+
+
+def _insert_messages(conn, rows):
+    # Повторный Id в выгрузке указывает на первое вхождение
+    conn.executemany(
+        'INSERT OR IGNORE INTO message VALUES (?, ?, ?, ?, ?)', rows
+    )
+    return len(rows)
+
+
+def write_seekable(path, output, member_size=CHECKPOINT_SPACING):
+    """
+    Переписывает выгрузку в многотомный gzip: новая часть начинается
+    примерно через каждые member_size байт распакованных данных,
+    на границе сообщения. По индексу такого архива любое сообщение
+    читается распаковкой не больше одной части.
+    :param path: исходная выгрузка в любом формате
+    :param output: путь к создаваемому .xml.gz
+    :param member_size: размер части в распакованных данных
+    """
+    with sources.open_source(path) as (xml_file, _), open(output, 'wb') as f:
+        buffer = b''
+        while True:
+            data = xml_file.read(sources.READ_SIZE)
+            buffer += data
+            while len(buffer) >= member_size:
+                # Часть заканчивается последним сообщением, целиком
+                # помещающимся в member_size, или первым, если оно длиннее
+                end = buffer.rfind(END_TAG, 0, member_size)
+                if end < 0:
+                    end = buffer.find(END_TAG)
+                if end < 0:
+                    break
+                cut = end + len(END_TAG)
+                f.write(gzip.compress(buffer[:cut], mtime=0))
+                buffer = buffer[cut:]
+            if not data:
+                if buffer:
+                    f.write(gzip.compress(buffer, mtime=0))
+                return
+
+
+class MessageIndex:
+    """
+    Открытый индекс выгрузки. Объект стоит переиспользовать: копии
+    состояния zlib, запомненные при чтении, ускоряют следующие запросы.
+    """
+
+    def __init__(self, path, index_file=None):
+        """
+        :param path: путь к выгрузке
+        :param index_file: путь к индексу; если его нет или выгрузка
+            изменилась, индекс строится заново
+        """
+        self.path = path
+        index_file = index_file or index_path(path)
+        if not self._is_fresh(index_file):
+            build_index(path, index_file)
+        self._conn = sqlite3.connect(index_file)
+        self.meta = {
+            key: json.loads(value)
+            for key, value in self._conn.execute('SELECT key, value FROM meta')
+        }
+        self._checkpoints = self._conn.execute(
+            'SELECT decompressed_offset, compressed_offset FROM checkpoint '
+            'ORDER BY decompressed_offset'
+        ).fetchall()
+        # Копии состояния zlib: смещения распакованных данных и кортежи
+        # (смещение в сжатом файле, decompressobj)
+        self._snapshot_offsets = []
+        self._snapshots = []
+
+    def _is_fresh(self, index_file):
+        if not os.path.exists(index_file):
+            return False
+        try:
+            with sqlite3.connect(index_file) as conn:
+                meta = dict(conn.execute('SELECT key, value FROM meta'))
+        except sqlite3.DatabaseError:
+            return False
+        signature = _file_signature(self.path)
+        return all(
+            json.loads(meta.get(key, 'null')) == value
+            for key, value in signature.items()
+        )
+
+    def close(self):
+        self._conn.close()
+
+    @property
+    def linear_lookups(self):
+        """
+        :return: True, если сообщения дальше CHECKPOINT_SPACING от начала
+            читаются распаковкой с начала выгрузки
+        """
+        if self.meta['format'] == 'xml' or len(self._checkpoints) > 1:
+            return False
+        (end,) = self._conn.execute(
+            'SELECT MAX(offset + length) FROM message'
+        ).fetchone()
+        return (end or 0) > CHECKPOINT_SPACING
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM message').fetchone()[0]
+
+    def ids_by_number(self, number):
+        return self._ids('number', number)
+
+    def ids_by_inn(self, inn):
+        return self._ids('inn', inn)
+
+    def _ids(self, column, value):
+        return [
+            row[0]
+            for row in self._conn.execute(
+                f'SELECT id FROM message WHERE {column} = ? ORDER BY offset',
+                (value,),
+            )
+        ]
+
+    def read_element(self, message_id):
+        """
+        :return: байты XML-элемента сообщения или None, если Id нет
+        """
+        row = self._conn.execute(
+            'SELECT offset, length FROM message WHERE id = ?', (message_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        offset, length = row
+        with open(self.path, 'rb') as raw:
+            if self.meta['format'] == 'xml':
+                raw.seek(offset)
+                return raw.read(length)
+            if self.meta['format'] == 'zstd':
+                return _slice(sources.zstd_chunks(raw), 0, offset, length)
+            return self._read_gzip(raw, offset, length)
+
+    def _read_gzip(self, raw, offset, length):
+        start, compressed, decompressor = self._nearest_checkpoint(offset)
+        raw.seek(compressed)
+        data = []
+        position = start
+        last_snapshot = start
+        while position < offset + length:
+            block = raw.read(LOOKUP_READ_SIZE)
+            if not block:
+                raise EOFError('Выгрузка короче, чем записано в индексе')
+            compressed += len(block)
+            while block:
+                chunk = decompressor.decompress(block)
+                if position + len(chunk) > offset:
+                    data.append(chunk[max(offset - position, 0) :])
+                position += len(chunk)
+                if not decompressor.eof:
+                    break
+                block = decompressor.unused_data
+                decompressor = zlib.decompressobj(sources.GZIP_WBITS)
+            # Блок распакован целиком, состояние zlib можно скопировать
+            if (
+                position - last_snapshot >= CHECKPOINT_SPACING
+                and position not in self._snapshot_offsets
+            ):
+                self._remember(position, compressed, decompressor)
+                last_snapshot = position
+        return b''.join(data)[:length]
+
+    def _nearest_checkpoint(self, offset):
+        """
+        :return: кортеж (смещение в распакованных данных, смещение
+            в сжатом файле, decompressobj для продолжения распаковки)
+        """
+        index = bisect.bisect_right(self._checkpoints, (offset, float('inf')))
+        start, compressed = self._checkpoints[index - 1]
+        decompressor = zlib.decompressobj(sources.GZIP_WBITS)
+        index = bisect.bisect_right(self._snapshot_offsets, offset)
+        if index and self._snapshot_offsets[index - 1] > start:
+            start = self._snapshot_offsets[index - 1]
+            compressed, snapshot = self._snapshots[index - 1]
+            decompressor = snapshot.copy()
+        return start, compressed, decompressor
+
+    def _remember(self, position, compressed, decompressor):
+        index = bisect.bisect_left(self._snapshot_offsets, position)
+        self._snapshot_offsets.insert(index, position)
+        self._snapshots.insert(index, (compressed, decompressor.copy()))
+
+    def get(self, message_id, address_level='full'):
+        """
+        :param message_id: Id сообщения
+        :param address_level: уровень разбора адреса (см. parse_address)
+        :return: словарь сообщения, как у iter_messages, или None
+        """
+        data = self.read_element(message_id)
+        if data is None:
+            return None
+        elem = ET.fromstring(
+            data, parser=ET.XMLParser(encoding=self.meta['encoding'])
+        )
+        debtors = DebtorIndex(address_level=address_level)
+        return ExtrajudicialBankruptcyMessage(elem, debtors).to_dict()
+
+
+def _slice(chunks, start, offset, length):
+    data = []
+    position = start
+    for chunk in chunks:
+        if position + len(chunk) > offset:
+            data.append(chunk[max(offset - position, 0) :])
+        position += len(chunk)
+        if position >= offset + length:
+            break
+    return b''.join(data)[:length]
+
+
+_indexes = {}
+
+
+def open_index(path):
+    """
+    :return: MessageIndex для выгрузки, общий в пределах процесса
+    """
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = MessageIndex(path)
+    return index
+
+
+def warn_if_linear(index):
+    """
+    Предупреждает, что поиск по индексу выгрузки будет линейным.
+    :param index: MessageIndex
+    """
+    if index.linear_lookups:
+        print(
+            f'Внимание: {index.path} распаковывается только с начала, '
+            'сообщения читаются тем дольше, чем дальше они от начала. '
+            'Перепишите выгрузку: message_index.py build --seekable <путь>',
+            file=sys.stderr,
+        )
+
+
+def get_message(path, message_id, address_level='full'):
+    """
+    Читает одно сообщение выгрузки по Id, не разбирая остальные.
+    :param path: путь к выгрузке
+    :param message_id: Id сообщения
+    :param address_level: уровень разбора адреса, 'full' или 'region'
+    :return: словарь сообщения или None, если такого Id нет
+    """
+    return open_index(path).get(message_id, address_level)
+
+
+def find_messages(path, number=None, inn=None, address_level='full'):
+    """
+    :param path: путь к выгрузке
+    :param number: номер сообщения
+    :param inn: ИНН должника
+    :return: список словарей сообщений
+    """
+    index = open_index(path)
+    ids = index.ids_by_number(number) if number else index.ids_by_inn(inn)
+    return [index.get(message_id, address_level) for message_id in ids]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Индекс сообщений выгрузки')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='построить индекс')
+    build.add_argument('path', nargs='?', default=FILE_PATH)
+    build.add_argument(
+        '--seekable',
+        help='сначала переписать выгрузку в многотомный gzip по этому пути '
+        'и индексировать его',
+    )
+    get = subparsers.add_parser('get', help='прочитать сообщения по индексу')
+    get.add_argument('path', nargs='?', default=FILE_PATH)
+    key = get.add_mutually_exclusive_group(required=True)
+    key.add_argument('--id')
+    key.add_argument('--number')
+    key.add_argument('--inn')
+    get.add_argument('--address-level', choices=ADDRESS_LEVELS, default='full')
+    args = parser.parse_args()
+    if args.command == 'build':
+        path = args.path
+        if args.seekable:
+            write_seekable(path, args.seekable)
+            path = args.seekable
+        print(f'Проиндексировано сообщений: {build_index(path)}')
+        warn_if_linear(open_index(path))
+    else:
+        warn_if_linear(open_index(args.path))
+        if args.id:
+            pprint(get_message(args.path, args.id, args.address_level))
+        else:
+            pprint(
+                find_messages(
+                    args.path,
+                    number=args.number,
+                    inn=args.inn,
+                    address_level=args.address_level,
+                )
+            )
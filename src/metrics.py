@@ -0,0 +1,308 @@
+"""
+Модуль для лёгкого сбора метрик по этапам обработки.
+
+Этапы (распаковка gzip, разбор XML, построение сущностей, разбор адресов,
+преобразование в словари, вставка в БД) замеряются контекстным менеджером
+stage или декоратором timed. Для каждого этапа копятся количество вызовов,
+собственное время (без времени вложенных этапов) и гистограмма задержек.
+
+По умолчанию сбор выключен, и stage возвращает пустой контекстный
+менеджер, поэтому накладные расходы почти нулевые. Включается вызовом
+enable(), ключом --metrics у скриптов или переменной окружения
+PIPELINE_METRICS=1. В конце работы печатается сводка, её можно записать
+в JSON или в textfile-формате Prometheus для node exporter.
+"""
+
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+# Верхние границы корзин гистограммы задержек, секунды
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+PROMETHEUS_PREFIX = 'bankruptcy_pipeline'
+
+_NULL_STAGE = nullcontext()
+
+
+class StageStats:
+    """
+    Статистика одного этапа: вызовы, время и гистограмма.
+    """
+
+    __slots__ = ('count', 'seconds', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # Последняя корзина — всё, что больше BUCKETS[-1] (+Inf)
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """
+        Оценка квантиля задержки по гистограмме (верхняя граница корзины).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, hits in zip(BUCKETS, self.buckets):
+            seen += hits
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'seconds': round(self.seconds, 6),
+            'buckets': dict(zip([*map(str, BUCKETS), '+Inf'], self.buckets)),
+        }
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'started', 'children')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0.0
+        self.metrics._stack().append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        stack = self.metrics._stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        self.metrics.observe(self.name, elapsed - self.children)
+        return False
+
+
+class Metrics:
+    """
+    Реестр метрик этапов и счётчиков.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = defaultdict(StageStats)
+        self.counters = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def stage(self, name):
+        """
+        Контекстный менеджер для замера этапа. Время вложенных этапов
+        вычитается из времени объемлющего.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def timed(self, name):
+        """
+        Декоратор: замеряет каждый вызов функции как этап name.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.stages[name].observe(seconds)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def to_dict(self):
+        return {
+            'stages': {
+                name: stats.to_dict() for name, stats in self.stages.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def summary(self):
+        """
+        :return: текстовая сводка по этапам, отсортированная по времени
+        """
+        total = sum(stats.seconds for stats in self.stages.values()) or 1
+        lines = [
+            f'{"этап":<16}{"вызовов":>10}{"время, с":>12}{"доля":>8}'
+            f'{"p50, мс":>10}{"p99, мс":>10}'
+        ]
+        for name, stats in sorted(
+            self.stages.items(), key=lambda item: -item[1].seconds
+        ):
+            p50 = stats.quantile(0.5) * 1000
+            p99 = stats.quantile(0.99) * 1000
+            lines.append(
+                f'{name:<16}{stats.count:>10}{stats.seconds:>12.3f}'
+                f'{stats.seconds / total:>8.1%}{p50:>10.2f}{p99:>10.2f}'
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{name}: {value}')
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        _write_atomic(
+            path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        )
+
+    def write_prometheus(self, path):
+        """
+        Записывает метрики в textfile-формате Prometheus. Файл заменяется
+        атомарно, как того требует textfile collector node exporter.
+        """
+        prefix = PROMETHEUS_PREFIX
+        lines = [
+            f'# HELP {prefix}_stage_seconds Stage latency (self time).',
+            f'# TYPE {prefix}_stage_seconds histogram',
+        ]
+        for name, stats in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, hits in zip([*BUCKETS, '+Inf'], stats.buckets):
+                cumulative += hits
+                lines.append(
+                    f'{prefix}_stage_seconds_bucket'
+                    f'{{stage="{name}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats.seconds}'
+            )
+            lines.append(
+                f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats.count}'
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        _write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def _write_atomic(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as metrics_file:
+        metrics_file.write(content)
+    os.replace(tmp_path, path)
+
+
+class TimedReader:
+    """
+    Обёртка над файловым объектом, замеряющая каждый read как этап name.
+    Используется, чтобы отделить чтение и распаковку архива от разбора XML.
+    """
+
+    def __init__(self, raw, metrics, name):
+        self._raw = raw
+        self._metrics = metrics
+        self._name = name
+
+    def read(self, size=-1):
+        with self._metrics.stage(self._name):
+            return self._raw.read(size)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+METRICS = Metrics()
+METRICS.enable(os.environ.get('PIPELINE_METRICS', '') not in ('', '0'))
+
+stage = METRICS.stage
+timed = METRICS.timed
+count = METRICS.count
+
+
+def add_arguments(parser):
+    """
+    Добавляет в argparse-парсер ключи для управления метриками.
+    """
+    parser.add_argument(
+        '--metrics',
+        action='store_true',
+        help='собирать метрики по этапам и вывести сводку в конце',
+    )
+    parser.add_argument('--metrics-json', help='записать метрики в JSON-файл')
+    parser.add_argument(
+        '--metrics-prom',
+        help='записать метрики в textfile Prometheus (*.prom)',
+    )
+
+
+def configure(args):
+    """
+    Включает сбор метрик, если это запрошено ключами командной строки.
+    """
+    if args.metrics or args.metrics_json or args.metrics_prom:
+        METRICS.enable()
+
+
+def finish(args):
+    """
+    Печатает сводку и записывает файлы метрик, если сбор был включён.
+    """
+    if not METRICS.enabled:
+        return
+    print(METRICS.summary(), file=sys.stderr)
+    if args.metrics_json:
+        METRICS.write_json(args.metrics_json)
+    if args.metrics_prom:
+        METRICS.write_prometheus(args.metrics_prom)
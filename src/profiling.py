@@ -0,0 +1,167 @@
+"""
+Модуль для профилирования скриптов загрузки и визуализации.
+
+Ключ --profile запускает задачу под cProfile и сохраняет файл .pstats
+и отчёт с самыми затратными функциями. С --profile-sampler используется
+семплирующий профилировщик pyinstrument (если он установлен): он пишет
+отчёт в текстовом виде и в HTML, но не .pstats. Ключ --tracemalloc-at
+делает снимки tracemalloc после обработки указанного количества
+сообщений — по ним видно, какие строки кода (например, классы
+сущностей) больше всего выделяют памяти.
+"""
+
+import cProfile
+import io
+import pstats
+import sys
+import tracemalloc
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Количество сообщений, после которых делается снимок tracemalloc
+snapshot_points = frozenset()
+
+_state = {'prefix': 'profile', 'top': 30, 'previous': None}
+
+
+def add_arguments(parser, messages=True):
+    """
+    Добавляет в argparse-парсер ключи профилирования.
+    :param messages: скрипт обрабатывает сообщения и вызывает
+        take_snapshot, поэтому ему нужен ключ --tracemalloc-at
+    """
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='profile',
+        metavar='PREFIX',
+        help='запустить под профилировщиком; результаты — PREFIX.pstats '
+        'и PREFIX-top.txt (с --profile-sampler — PREFIX-top.txt '
+        'и PREFIX.html)',
+    )
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=30,
+        help='количество функций в отчёте профилировщика',
+    )
+    parser.add_argument(
+        '--profile-sampler',
+        action='store_true',
+        help='использовать семплирующий профилировщик pyinstrument',
+    )
+    if not messages:
+        return
+    parser.add_argument(
+        '--tracemalloc-at',
+        type=int,
+        nargs='+',
+        default=[],
+        metavar='N',
+        help='снимки tracemalloc после N обработанных сообщений',
+    )
+
+
+def run(args, func, *func_args, **func_kwargs):
+    """
+    Выполняет func с профилированием, если оно запрошено ключами.
+    :return: результат func
+    """
+    global snapshot_points
+
+    prefix = args.profile or 'profile'
+    _state.update(prefix=prefix, top=args.profile_top, previous=None)
+    tracemalloc_at = getattr(args, 'tracemalloc_at', None)
+    if tracemalloc_at:
+        snapshot_points = frozenset(tracemalloc_at)
+        tracemalloc.start()
+    try:
+        if not args.profile:
+            return func(*func_args, **func_kwargs)
+        if args.profile_sampler:
+            return _run_sampler(prefix, func, *func_args, **func_kwargs)
+        return _run_cprofile(prefix, func, *func_args, **func_kwargs)
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        snapshot_points = frozenset()
+
+
+def _run_cprofile(prefix, func, *func_args, **func_kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *func_args, **func_kwargs)
+    finally:
+        profiler.dump_stats(f'{prefix}.pstats')
+        report = io.StringIO()
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats('cumulative').print_stats(_state['top'])
+        stats.sort_stats('tottime').print_stats(_state['top'])
+        with open(f'{prefix}-top.txt', 'w', encoding='utf-8') as top_file:
+            top_file.write(report.getvalue())
+        print(
+            f'Профиль сохранён в {prefix}.pstats, отчёт — {prefix}-top.txt',
+            file=sys.stderr,
+        )
+
+
+def _run_sampler(prefix, func, *func_args, **func_kwargs):
+    if pyinstrument is None:
+        print(
+            'pyinstrument не установлен, используется cProfile',
+            file=sys.stderr,
+        )
+        return _run_cprofile(prefix, func, *func_args, **func_kwargs)
+    profiler = pyinstrument.Profiler()
+    profiler.start()
+    try:
+        return func(*func_args, **func_kwargs)
+    finally:
+        profiler.stop()
+        with open(f'{prefix}-top.txt', 'w', encoding='utf-8') as top_file:
+            top_file.write(profiler.output_text())
+        with open(f'{prefix}.html', 'w', encoding='utf-8') as html_file:
+            html_file.write(profiler.output_html())
+        print(
+            f'Профиль сохранён в {prefix}-top.txt и {prefix}.html',
+            file=sys.stderr,
+        )
+
+
+def take_snapshot(messages_count):
+    """
+    Делает снимок tracemalloc и записывает отчёт с самыми затратными
+    по памяти строками, а также разницу с предыдущим снимком.
+    :param messages_count: количество обработанных сообщений
+    """
+    if not tracemalloc.is_tracing():
+        return
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ]
+    )
+    path = f'{_state["prefix"]}-tracemalloc-{messages_count}'
+    snapshot.dump(f'{path}.dump')
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [
+        f'Сообщений: {messages_count}',
+        f'Текущая память: {current / 1024 / 1024:.1f} МБ, '
+        f'пик: {peak / 1024 / 1024:.1f} МБ',
+        '',
+        'Самые затратные строки:',
+    ]
+    lines += map(str, snapshot.statistics('lineno')[: _state['top']])
+    previous = _state['previous']
+    if previous is not None:
+        lines += ['', 'Рост относительно предыдущего снимка:']
+        lines += map(
+            str, snapshot.compare_to(previous, 'lineno')[: _state['top']]
+        )
+    with open(f'{path}.txt', 'w', encoding='utf-8') as report_file:
+        report_file.write('\n'.join(lines) + '\n')
+    _state['previous'] = snapshot
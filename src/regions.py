@@ -0,0 +1,307 @@
+"""
+Справочник субъектов РФ для приведения регионов к единому виду.
+
+Natasha возвращает регион в разных написаниях («Московская область»,
+«Московская обл», «Москва город», «г. Москва»), из-за чего один регион
+попадает в разные группы. Справочник сопоставляет написанию или первым
+трём цифрам почтового индекса компактный id — код субъекта РФ
+(77 — Москва, 50 — Московская область) — и каноническое название.
+
+Справочник хранится здесь же, без обращения к внешним сервисам;
+в БД он дублируется таблицей Region (create_tables.sql).
+"""
+
+import functools
+import re
+
+# (код субъекта, каноническое название, основы написаний,
+#  диапазоны первых трёх цифр почтового индекса)
+REGIONS = [
+    (1, 'Республика Адыгея', ['адыге'], [(385, 385)]),
+    (2, 'Республика Башкортостан', ['башкортостан', 'башкир'], [(450, 453)]),
+    (3, 'Республика Бурятия', ['бурят'], [(670, 671)]),
+    (4, 'Республика Алтай', ['алтай'], [(649, 649)]),
+    (5, 'Республика Дагестан', ['дагестан'], [(367, 368)]),
+    (6, 'Республика Ингушетия', ['ингушет'], [(386, 386)]),
+    (7, 'Кабардино-Балкарская Республика', ['кабардин'], [(360, 361)]),
+    (8, 'Республика Калмыкия', ['калмык'], [(358, 359)]),
+    (9, 'Карачаево-Черкесская Республика', ['карачаев'], [(369, 369)]),
+    (10, 'Республика Карелия', ['карел'], [(185, 186)]),
+    (11, 'Республика Коми', ['коми'], [(167, 169)]),
+    (12, 'Республика Марий Эл', ['марий'], [(424, 425)]),
+    (13, 'Республика Мордовия', ['мордов'], [(430, 431)]),
+    (14, 'Республика Саха (Якутия)', ['саха', 'якут'], [(677, 678)]),
+    (
+        15,
+        'Республика Северная Осетия — Алания',
+        ['осети', 'алания'],
+        [(362, 363)],
+    ),
+    (16, 'Республика Татарстан', ['татарстан'], [(420, 423)]),
+    (17, 'Республика Тыва', ['тыва', 'тува'], [(667, 668)]),
+    (18, 'Удмуртская Республика', ['удмурт'], [(426, 427)]),
+    (19, 'Республика Хакасия', ['хакас'], [(655, 655)]),
+    (20, 'Чеченская Республика', ['чечен', 'чечн'], [(364, 366)]),
+    (21, 'Чувашская Республика', ['чуваш'], [(428, 429)]),
+    (22, 'Алтайский край', ['алтайск'], [(656, 659)]),
+    (23, 'Краснодарский край', ['краснодарск'], [(350, 354)]),
+    (24, 'Красноярский край', ['красноярск'], [(660, 663)]),
+    (25, 'Приморский край', ['приморск'], [(690, 692)]),
+    (26, 'Ставропольский край', ['ставропольск'], [(355, 357)]),
+    (27, 'Хабаровский край', ['хабаровск'], [(680, 682)]),
+    (28, 'Амурская область', ['амурск'], [(675, 676)]),
+    (29, 'Архангельская область', ['архангельск'], [(163, 165)]),
+    (30, 'Астраханская область', ['астраханск'], [(414, 416)]),
+    (31, 'Белгородская область', ['белгородск'], [(308, 309)]),
+    (32, 'Брянская область', ['брянск'], [(241, 243)]),
+    (33, 'Владимирская область', ['владимирск'], [(600, 602)]),
+    (34, 'Волгоградская область', ['волгоградск'], [(400, 404)]),
+    (35, 'Вологодская область', ['вологодск'], [(160, 162)]),
+    (36, 'Воронежская область', ['воронежск'], [(394, 397)]),
+    (37, 'Ивановская область', ['ивановск'], [(153, 155)]),
+    (38, 'Иркутская область', ['иркутск'], [(664, 666), (669, 669)]),
+    (39, 'Калининградская область', ['калининградск'], [(236, 238)]),
+    (40, 'Калужская область', ['калужск'], [(248, 249)]),
+    (41, 'Камчатский край', ['камчатск'], [(683, 684), (688, 688)]),
+    (
+        42,
+        'Кемеровская область — Кузбасс',
+        ['кемеровск', 'кузбасс'],
+        [(650, 654)],
+    ),
+    (43, 'Кировская область', ['кировск'], [(610, 613)]),
+    (44, 'Костромская область', ['костромск'], [(156, 157)]),
+    (45, 'Курганская область', ['курганск'], [(640, 641)]),
+    (46, 'Курская область', ['курск'], [(305, 307)]),
+    (47, 'Ленинградская область', ['ленинградск'], [(187, 189)]),
+    (48, 'Липецкая область', ['липецк'], [(398, 399)]),
+    (49, 'Магаданская область', ['магаданск'], [(685, 686)]),
+    (50, 'Московская область', ['московск'], [(140, 144)]),
+    (51, 'Мурманская область', ['мурманск'], [(183, 184)]),
+    (52, 'Нижегородская область', ['нижегородск'], [(603, 607)]),
+    (53, 'Новгородская область', ['новгородск'], [(173, 175)]),
+    (54, 'Новосибирская область', ['новосибирск'], [(630, 633)]),
+    (55, 'Омская область', ['омск'], [(644, 646)]),
+    (56, 'Оренбургская область', ['оренбургск'], [(460, 462)]),
+    (57, 'Орловская область', ['орловск'], [(302, 303)]),
+    (58, 'Пензенская область', ['пензенск'], [(440, 442)]),
+    (59, 'Пермский край', ['пермск'], [(614, 619)]),
+    (60, 'Псковская область', ['псковск'], [(180, 182)]),
+    (61, 'Ростовская область', ['ростовск'], [(344, 347)]),
+    (62, 'Рязанская область', ['рязанск'], [(390, 391)]),
+    (63, 'Самарская область', ['самарск'], [(443, 446)]),
+    (64, 'Саратовская область', ['саратовск'], [(410, 413)]),
+    (65, 'Сахалинская область', ['сахалинск'], [(693, 694)]),
+    (66, 'Свердловская область', ['свердловск'], [(620, 624)]),
+    (67, 'Смоленская область', ['смоленск'], [(214, 216)]),
+    (68, 'Тамбовская область', ['тамбовск'], [(392, 393)]),
+    (69, 'Тверская область', ['тверск'], [(170, 172)]),
+    (70, 'Томская область', ['томск'], [(634, 636)]),
+    (71, 'Тульская область', ['тульск'], [(300, 301)]),
+    (72, 'Тюменская область', ['тюменск'], [(625, 627)]),
+    (73, 'Ульяновская область', ['ульяновск'], [(432, 433)]),
+    (74, 'Челябинская область', ['челябинск'], [(454, 457)]),
+    (75, 'Забайкальский край', ['забайкальск'], [(672, 674)]),
+    (76, 'Ярославская область', ['ярославск'], [(150, 152)]),
+    (77, 'г. Москва', ['москва'], [(101, 129)]),
+    (78, 'г. Санкт-Петербург', ['петербург'], [(190, 199)]),
+    (79, 'Еврейская автономная область', ['еврейск'], [(679, 679)]),
+    (83, 'Ненецкий автономный округ', ['ненецк'], [(166, 166)]),
+    (
+        86,
+        'Ханты-Мансийский автономный округ — Югра',
+        ['ханты', 'югра'],
+        [(628, 628)],
+    ),
+    (87, 'Чукотский автономный округ', ['чукотск'], [(689, 689)]),
+    (89, 'Ямало-Ненецкий автономный округ', ['ямало'], [(629, 629)]),
+    (91, 'Республика Крым', ['крым'], [(295, 298)]),
+    (92, 'г. Севастополь', ['севастопол'], [(299, 299)]),
+]
+
+REGION_NAMES = {region_id: name for region_id, name, _, _ in REGIONS}
+
+# Города федерального значения и административные центры субъектов.
+# Часть адреса без слова «область», «край» и т. п. сопоставляется
+# с регионом только по точному названию города из этого списка:
+# по основам «г. Кировск» или «пос. Московский» не отличить от региона
+CITY_REGIONS = {
+    'Москва': 77,
+    'Санкт-Петербург': 78,
+    'Севастополь': 92,
+    'Майкоп': 1,
+    'Уфа': 2,
+    'Улан-Удэ': 3,
+    'Горно-Алтайск': 4,
+    'Махачкала': 5,
+    'Магас': 6,
+    'Нальчик': 7,
+    'Элиста': 8,
+    'Черкесск': 9,
+    'Петрозаводск': 10,
+    'Сыктывкар': 11,
+    'Йошкар-Ола': 12,
+    'Саранск': 13,
+    'Якутск': 14,
+    'Владикавказ': 15,
+    'Казань': 16,
+    'Кызыл': 17,
+    'Ижевск': 18,
+    'Абакан': 19,
+    'Грозный': 20,
+    'Чебоксары': 21,
+    'Барнаул': 22,
+    'Краснодар': 23,
+    'Красноярск': 24,
+    'Владивосток': 25,
+    'Ставрополь': 26,
+    'Хабаровск': 27,
+    'Благовещенск': 28,
+    'Архангельск': 29,
+    'Астрахань': 30,
+    'Белгород': 31,
+    'Брянск': 32,
+    'Владимир': 33,
+    'Волгоград': 34,
+    'Вологда': 35,
+    'Воронеж': 36,
+    'Иваново': 37,
+    'Иркутск': 38,
+    'Калининград': 39,
+    'Калуга': 40,
+    'Петропавловск-Камчатский': 41,
+    'Кемерово': 42,
+    'Киров': 43,
+    'Кострома': 44,
+    'Курган': 45,
+    'Курск': 46,
+    'Гатчина': 47,
+    'Липецк': 48,
+    'Магадан': 49,
+    'Красногорск': 50,
+    'Мурманск': 51,
+    'Нижний Новгород': 52,
+    'Великий Новгород': 53,
+    'Новосибирск': 54,
+    'Омск': 55,
+    'Оренбург': 56,
+    'Орёл': 57,
+    'Пенза': 58,
+    'Пермь': 59,
+    'Псков': 60,
+    'Ростов-на-Дону': 61,
+    'Рязань': 62,
+    'Самара': 63,
+    'Саратов': 64,
+    'Южно-Сахалинск': 65,
+    'Екатеринбург': 66,
+    'Смоленск': 67,
+    'Тамбов': 68,
+    'Тверь': 69,
+    'Томск': 70,
+    'Тула': 71,
+    'Тюмень': 72,
+    'Ульяновск': 73,
+    'Челябинск': 74,
+    'Чита': 75,
+    'Ярославль': 76,
+    'Биробиджан': 79,
+    'Нарьян-Мар': 83,
+    'Ханты-Мансийск': 86,
+    'Анадырь': 87,
+    'Салехард': 89,
+    'Симферополь': 91,
+}
+
+# Основы проверяются от длинных к коротким: «алтайск» раньше «алтай»,
+# «сахалинск» раньше «саха»
+_STEMS = sorted(
+    (
+        (stem, region_id)
+        for region_id, _, stems, _ in REGIONS
+        for stem in stems
+    ),
+    key=lambda item: -len(item[0]),
+)
+
+_POSTAL_PREFIXES = {
+    prefix: region_id
+    for region_id, _, _, ranges in REGIONS
+    for start, end in ranges
+    for prefix in range(start, end + 1)
+}
+
+_WORD_RE = re.compile(r'[а-я]+')
+# Слова, по которым часть адреса — это регион, а не населённый пункт
+# или улица с похожим названием; только в такой части ищутся основы
+_REGION_WORD_RE = re.compile(
+    r'\b(?:обл|область|край|респ|республика|ао|автономн[а-я]*|округ'
+    r'|югра|кузбасс|якутия|чувашия|крым)\b'
+)
+# Обозначения города, которые не входят в название
+_CITY_TYPE_WORDS = {'г', 'гор', 'город'}
+
+
+def _name_key(name):
+    """
+    :return: название в нижнем регистре, слова через пробел
+    """
+    return ' '.join(_WORD_RE.findall(name.lower().replace('ё', 'е')))
+
+
+_CITY_KEYS = {
+    _name_key(city): region_id for city, region_id in CITY_REGIONS.items()
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def region_id_by_name(region):
+    """
+    Основы названий проверяются, только если в написании есть слово
+    «область», «край», «республика», «АО» и т. п. Иначе написание
+    сравнивается с названиями городов из CITY_REGIONS целиком.
+    :param region: регион в произвольном написании
+    :return: код субъекта РФ или None, если регион не распознан
+    """
+    if not region:
+        return None
+    key = _name_key(region)
+    if not _REGION_WORD_RE.search(key):
+        city = ' '.join(
+            word for word in key.split() if word not in _CITY_TYPE_WORDS
+        )
+        return _CITY_KEYS.get(city)
+    for word in key.split():
+        for stem, region_id in _STEMS:
+            if word.startswith(stem):
+                return region_id
+    return None
+
+
+def region_id_by_postal_code(postal_code):
+    """
+    :param postal_code: почтовый индекс (шесть цифр)
+    :return: код субъекта РФ или None
+    """
+    if (
+        not postal_code
+        or len(postal_code) < 3
+        or not postal_code[:3].isdigit()
+    ):
+        return None
+    return _POSTAL_PREFIXES.get(int(postal_code[:3]))
+
+
+def resolve_region(region, postal_code=None):
+    """
+    Определяет регион по почтовому индексу, а если индекса нет
+    или он не из справочника — по написанию.
+    :return: кортеж (код субъекта РФ или None, каноническое название
+        или исходное написание, если регион не распознан)
+    """
+    region_id = region_id_by_postal_code(postal_code) or region_id_by_name(
+        region
+    )
+    if region_id is None:
+        return None, region
+    return region_id, REGION_NAMES[region_id]
@@ -0,0 +1,105 @@
+"""
+Модуль с отчётами из директории sql_queries, посчитанными средствами pandas
+по локальному снимку (см. snapshot.py) — без обращения к MySQL.
+
+- first_sql_query.sql — топ должников по количеству обязательств
+- second_sql_query.sql — топ должников по общей сумме долга
+- third_sql_query.sql — процент погашения обязательств по должникам
+"""
+
+import argparse
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+from snapshot import SNAPSHOT_PATH, load_snapshot
+
+# Должник в БД уникален по (name, birth_date, inn)
+DEBTOR_KEY = ['debtor_name', 'birth_date', 'inn']
+
+REPORT_COLUMNS = DEBTOR_KEY + ['total_sum', 'debt_sum']
+
+
+def load_obligations(path=SNAPSHOT_PATH, filters=None):
+    """
+    Читает из снимка только строки с денежными обязательствами
+    и только колонки, нужные для отчётов.
+    :param path: директория снимка
+    :param filters: дополнительное условие pyarrow.dataset.Expression,
+        например ds.field('publish_month') >= '2024-01'
+    :return: DataFrame с колонками REPORT_COLUMNS
+    """
+    condition = ds.field('total_sum').is_valid()
+    if filters is not None:
+        condition = condition & filters
+    return load_snapshot(path, columns=REPORT_COLUMNS, filters=condition)
+
+
+def _by_debtor(df):
+    return df.groupby(DEBTOR_KEY, dropna=False, sort=False)
+
+
+def top_by_obligations_count(df, limit=10):
+    """
+    Аналог first_sql_query.sql.
+    :param df: DataFrame из load_obligations
+    :param limit: количество должников в отчёте
+    :return: DataFrame с колонками debtor_name, inn, obligations_count
+    """
+    result = _by_debtor(df).size().rename('obligations_count').reset_index()
+    result = result.nlargest(limit, 'obligations_count', keep='first')
+    return result[['debtor_name', 'inn', 'obligations_count']].reset_index(
+        drop=True
+    )
+
+
+def top_by_total_debt(df, limit=10):
+    """
+    Аналог second_sql_query.sql.
+    :param df: DataFrame из load_obligations
+    :param limit: количество должников в отчёте
+    :return: DataFrame с колонками debtor_name, inn, total_debt
+    """
+    result = _by_debtor(df)['debt_sum'].sum().rename('total_debt')
+    result = result.reset_index().nlargest(limit, 'total_debt', keep='first')
+    return result[['debtor_name', 'inn', 'total_debt']].reset_index(drop=True)
+
+
+def paid_percent(df):
+    """
+    Аналог third_sql_query.sql.
+    :param df: DataFrame из load_obligations
+    :return: DataFrame с колонками debtor_name, inn, TotalSum, DebtSum,
+        paid_percent, отсортированный по возрастанию paid_percent
+    """
+    df = df.assign(paid_sum=df['total_sum'] - df['debt_sum'])
+    result = _by_debtor(df).agg(
+        TotalSum=('total_sum', 'sum'), DebtSum=('paid_sum', 'sum')
+    )
+    result = result.reset_index()
+    total = result['TotalSum']
+    result['paid_percent'] = (
+        (100 * result['DebtSum'] / total.where(total != 0)).round(2).fillna(0)
+    )
+    result = result.sort_values('paid_percent', kind='stable')
+    return result[
+        ['debtor_name', 'inn', 'TotalSum', 'DebtSum', 'paid_percent']
+    ].reset_index(drop=True)
+
+
+def main(path=SNAPSHOT_PATH):
+    """
+    Выводит в терминал три отчёта по локальному снимку.
+    """
+    df = load_obligations(path)
+    with pd.option_context('display.width', 200):
+        print(top_by_obligations_count(df))
+        print(top_by_total_debt(df))
+        print(paid_percent(df))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Отчёты по снимку')
+    parser.add_argument('--path', default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+    main(path=args.path)
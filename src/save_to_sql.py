@@ -8,11 +8,17 @@
 Перед использованием необходима созданная база данных (create_tables.sql)
 """
 
-from datetime import datetime
+import argparse
+from datetime import date
 
 import pymysql
 
-from main import FILE_PATH, parse_messages
+import address_parser
+import metrics
+import profiling
+from main import FILE_PATH, parse_date, parse_messages
+from metrics import stage, timed
+from regions import REGIONS, resolve_region
 
 # Конфигурация подключения к базе данных MySQL
 DB_CONFIG = {
@@ -24,27 +30,54 @@ DB_CONFIG = {
 }
 
 
-def to_mysql_date(date_str):
+def to_mysql_date(value):
     """
-    Преобразует строку даты из XML в формат YYYY-MM-DD для MySQL.
-    :param date_str: строка даты (может содержать время)
+    Преобразует дату в формат YYYY-MM-DD для MySQL.
+    :param value: datetime.date из парсера или строка даты из XML
     :return: строка в формате YYYY-MM-DD или None
     """
-    if not date_str:
-        return None
-    try:
-        return (
-            datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            .date()
-            .isoformat()
-        )
-    except Exception:
-        try:
-            return (
-                datetime.strptime(date_str[:10], '%Y-%m-%d').date().isoformat()
+    if not isinstance(value, date):
+        value = parse_date(value)
+    return value.isoformat() if value else None
+
+
+def ensure_regions(cur):
+    """
+    Дописывает в таблицу Region недостающие субъекты из справочника.
+    :param cur: курсор MySQL
+    """
+    cur.execute('SELECT id FROM Region')
+    known = {row[0] for row in cur.fetchall()}
+    for region_id, name, _, _ in REGIONS:
+        if region_id not in known:
+            cur.execute(
+                'INSERT INTO Region (id, name) VALUES (%s, %s)',
+                (region_id, name),
             )
-        except Exception:
-            return None
+
+
+def backfill_regions(cur):
+    """
+    Заполняет region_id у должников, загруженных до появления справочника
+    регионов: регион определяется по индексу и написанию (resolve_region),
+    в Debtor.region записывается каноническое название.
+    :param cur: курсор MySQL
+    :return: количество обновлённых должников
+    """
+    cur.execute(
+        'SELECT id, region, postal_code FROM Debtor WHERE region_id IS NULL'
+    )
+    updated = 0
+    for debtor_id, region, postal_code in cur.fetchall():
+        region_id, name = resolve_region(region, postal_code)
+        if region_id is None:
+            continue
+        cur.execute(
+            'UPDATE Debtor SET region_id=%s, region=%s WHERE id=%s',
+            (region_id, name, debtor_id),
+        )
+        updated += 1
+    return updated
 
 
 def insert_publisher(cur, publisher):
@@ -61,8 +94,8 @@ def insert_debtor(cur, debtor):
     birth_date = to_mysql_date(debtor['birth_date'])
     cur.execute(
         """INSERT INTO Debtor
-        (name, birth_date, birth_place, address, postal_code, region, district, locality, street, house, flat, inn)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+        (name, birth_date, birth_place, address, postal_code, region, region_id, district, locality, street, house, flat, inn)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
         (
             debtor['name'],
             birth_date,
@@ -70,6 +103,7 @@ def insert_debtor(cur, debtor):
             debtor['address'],
             debtor['postal_code'],
             debtor['region'],
+            debtor['region_id'],
             debtor['district'],
             debtor['locality'],
             debtor['street'],
@@ -166,54 +200,85 @@ def get_or_create_publisher(cur, publisher):
     return cur.lastrowid
 
 
-def get_or_create_debtor(cur, debtor):
+def get_or_create_debtor(cur, debtor, known=None):
+    """
+    Возвращает id должника, создавая его при необходимости, и дописывает
+    недостающие предыдущие имена.
+    :param cur: курсор MySQL
+    :param debtor: словарь должника
+    :param known: словарь уже загруженных в этом сеансе должников
+        {(ФИО, дата рождения, ИНН): (id, множество предыдущих имён)};
+        для них запросы к БД выполняются только для новых имён
+    :return: id должника
+    """
     birth_date = to_mysql_date(debtor['birth_date'])
+    key = (debtor['name'], birth_date, debtor['inn'])
+    if known is not None and key in known:
+        debtor_id, names = known[key]
+    else:
+        debtor_id, names = _select_or_insert_debtor(cur, debtor, birth_date)
+        if known is not None:
+            known[key] = (debtor_id, names)
+    # Добавляем предыдущие имена, если их нет
+    for prev_name in debtor['previous_names']:
+        if prev_name not in names:
+            cur.execute(
+                'INSERT INTO debtor_previous_name (debtor_id, value) VALUES (%s, %s)',
+                (debtor_id, prev_name),
+            )
+            names.add(prev_name)
+    return debtor_id
+
+
+def _select_or_insert_debtor(cur, debtor, birth_date):
+    """
+    :return: кортеж (id должника, множество его предыдущих имён в БД)
+    """
     if debtor['inn'] is None:
         cur.execute(
-            'SELECT id FROM Debtor WHERE name=%s AND birth_date=%s AND inn IS NULL',
+            'SELECT id, region_id FROM Debtor WHERE name=%s AND birth_date=%s AND inn IS NULL',
             (debtor['name'], birth_date),
         )
     else:
         cur.execute(
-            'SELECT id FROM Debtor WHERE name=%s AND birth_date=%s AND inn=%s',
+            'SELECT id, region_id FROM Debtor WHERE name=%s AND birth_date=%s AND inn=%s',
             (debtor['name'], birth_date, debtor['inn']),
         )
     row = cur.fetchone()
     if row:
-        debtor_id = row[0]
-    else:
-        cur.execute(
-            """INSERT INTO Debtor
-            (name, birth_date, birth_place, address, postal_code, region, district, locality, street, house, flat, inn)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (
-                debtor['name'],
-                birth_date,
-                debtor['birth_place'],
-                debtor['address'],
-                debtor['postal_code'],
-                debtor['region'],
-                debtor['district'],
-                debtor['locality'],
-                debtor['street'],
-                debtor['house'],
-                debtor['flat'],
-                debtor['inn'],
-            ),
-        )
-        debtor_id = cur.lastrowid
-    # Добавляем предыдущие имена, если их нет
-    for prev_name in debtor['previous_names']:
-        cur.execute(
-            'SELECT id FROM debtor_previous_name WHERE debtor_id=%s AND value=%s',
-            (debtor_id, prev_name),
-        )
-        if not cur.fetchone():
+        debtor_id, region_id = row
+        # Должник загружен до появления справочника регионов
+        if region_id is None and debtor['region_id'] is not None:
             cur.execute(
-                'INSERT INTO debtor_previous_name (debtor_id, value) VALUES (%s, %s)',
-                (debtor_id, prev_name),
+                'UPDATE Debtor SET region_id=%s, region=%s WHERE id=%s',
+                (debtor['region_id'], debtor['region'], debtor_id),
             )
-    return debtor_id
+        cur.execute(
+            'SELECT value FROM debtor_previous_name WHERE debtor_id=%s',
+            (debtor_id,),
+        )
+        return debtor_id, {name for (name,) in cur.fetchall()}
+    cur.execute(
+        """INSERT INTO Debtor
+        (name, birth_date, birth_place, address, postal_code, region, region_id, district, locality, street, house, flat, inn)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+        (
+            debtor['name'],
+            birth_date,
+            debtor['birth_place'],
+            debtor['address'],
+            debtor['postal_code'],
+            debtor['region'],
+            debtor['region_id'],
+            debtor['district'],
+            debtor['locality'],
+            debtor['street'],
+            debtor['house'],
+            debtor['flat'],
+            debtor['inn'],
+        ),
+    )
+    return cur.lastrowid, set()
 
 
 def get_or_create_bank(cur, bank):
@@ -314,15 +379,18 @@ def get_or_create_creditors_non_from_entrepreneurship(cur, cne):
     return cne_id
 
 
-def insert_messages(cur, msg):
+@timed('db_insert')
+def insert_messages(cur, msg, debtors=None):
     """
     Вставляет сообщение о банкротстве и связанные с ним сущности в базу данных.
     :param cur: курсор MySQL
     :param msg: словарь с данными сообщения
+    :param debtors: словарь уже загруженных должников (см.
+        get_or_create_debtor), общий для всех сообщений одной загрузки
     :return: id вставленного сообщения
     """
     publisher_id = get_or_create_publisher(cur, msg['publisher'])
-    debtor_id = get_or_create_debtor(cur, msg['debtor'])
+    debtor_id = get_or_create_debtor(cur, msg['debtor'], debtors)
     publish_date = to_mysql_date(msg['publish_date'])
     # Проверяем, есть ли уже такое сообщение
     cur.execute(
@@ -387,16 +455,22 @@ def main():
     results = parse_messages(FILE_PATH)
     conn = pymysql.connect(**DB_CONFIG)
     success = True
+    debtors = {}
     try:
         with conn.cursor() as cur:
+            ensure_regions(cur)
+            backfilled = backfill_regions(cur)
+            if backfilled:
+                print(f'Заполнен region_id у {backfilled} должников.')
             for msg in results:
                 try:
-                    insert_messages(cur, msg)
+                    insert_messages(cur, msg, debtors)
                 except Exception as e:
                     print(f'Ошибка при добавлении сообщения: {e}')
                     success = False
             if success:
-                conn.commit()
+                with stage('db_commit'):
+                    conn.commit()
                 print('Записи успешно добавлены в базу данных.')
             else:
                 conn.rollback()
@@ -407,4 +481,12 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Загрузка сообщений в БД')
+    address_parser.add_arguments(parser)
+    metrics.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+    address_parser.configure(args)
+    profiling.run(args, main)
+    metrics.finish(args)
@@ -0,0 +1,264 @@
+"""
+Модуль для локального колоночного снимка данных о банкротствах.
+
+Объединённые данные должник / сообщение / денежное обязательство
+выгружаются в Parquet-датасет, разбитый на партиции по месяцу публикации
+(publish_month=YYYY-MM). Источник — результат парсинга XML или база данных.
+Снимок читается только по нужным колонкам с фильтрацией по условиям,
+поэтому графики и отчёты можно строить без обращения к MySQL.
+
+Для работы необходим pyarrow.
+"""
+
+import argparse
+import os
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pymysql
+
+from main import BASE_DIR, FILE_PATH, parse_date, parse_messages
+from save_to_sql import DB_CONFIG
+
+SNAPSHOT_PATH = os.path.join(BASE_DIR, '..', 'snapshot')
+
+# Количество строк в одном пакете записи
+BATCH_SIZE = 50_000
+
+# Одна строка снимка — одно денежное обязательство сообщения.
+# Сообщения без обязательств попадают в снимок одной строкой
+# с пустыми полями обязательства. Суммы хранятся в float64, округлёнными
+# до копеек: в отличие от DECIMAL(20,2) в БД, точно представимы суммы
+# до ~10^13 рублей, а итоги отчётов могут расходиться в последней копейке.
+# Зато отчёты считаются векторно, без Decimal-объектов в pandas.
+SCHEMA = pa.schema(
+    [
+        ('message_id', pa.string()),
+        ('number', pa.string()),
+        ('publish_date', pa.date32()),
+        ('publish_month', pa.string()),
+        ('publisher_name', pa.string()),
+        ('debtor_name', pa.string()),
+        ('inn', pa.string()),
+        ('birth_date', pa.date32()),
+        ('region', pa.string()),
+        ('region_id', pa.int16()),
+        ('creditor_name', pa.string()),
+        ('total_sum', pa.float64()),
+        ('debt_sum', pa.float64()),
+    ]
+)
+
+DB_SNAPSHOT_QUERY = """
+    SELECT
+        m.message_id,
+        m.number,
+        m.publish_date,
+        p.name AS publisher_name,
+        d.name AS debtor_name,
+        d.inn,
+        d.birth_date,
+        d.region,
+        d.region_id,
+        mo.creditor_name,
+        mo.total_sum,
+        mo.debt_sum
+    FROM
+        ExtrajudicialBankruptcyMessage m
+        JOIN Debtor d ON m.debtor_id = d.id
+        LEFT JOIN publisher p ON m.publisher_id = p.id
+        LEFT JOIN creditors_non_from_entrepreneurship cne ON m.creditors_non_from_entrepreneurship_id = cne.id
+        LEFT JOIN cne_monetary_obligation cne_mo ON cne.id = cne_mo.cne_id
+        LEFT JOIN MonetaryObligation mo ON cne_mo.mo_id = mo.id
+    """
+
+
+def to_date(value):
+    """
+    Преобразует строку даты из XML или значение из БД в datetime.date.
+    :param value: строка, date/datetime или None
+    :return: datetime.date или None
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if value is None or isinstance(value, date):
+        return value
+    return parse_date(value)
+
+
+def publish_month(publish_date):
+    """
+    :param publish_date: datetime.date или None
+    :return: месяц публикации в виде YYYY-MM или None
+    """
+    return publish_date.strftime('%Y-%m') if publish_date else None
+
+
+def message_rows(msg):
+    """
+    Разворачивает сообщение (словарь из parse_messages)
+    в строки снимка — по одной на денежное обязательство. Одинаковые
+    обязательства (creditor_name, total_sum, debt_sum) внутри сообщения
+    дают одну строку, как при загрузке в БД и в stream_reports.py.
+    :param msg: словарь сообщения
+    :return: список словарей со столбцами SCHEMA
+    """
+    debtor = msg['debtor'] or {}
+    publisher = msg['publisher'] or {}
+    published = to_date(msg['publish_date'])
+    base = {
+        'message_id': msg['id'],
+        'number': msg['number'],
+        'publish_date': published,
+        'publish_month': publish_month(published),
+        'publisher_name': publisher.get('name'),
+        'debtor_name': debtor.get('name'),
+        'inn': debtor.get('inn'),
+        'birth_date': to_date(debtor.get('birth_date')),
+        'region': debtor.get('region'),
+        'region_id': debtor.get('region_id'),
+        'creditor_name': None,
+        'total_sum': None,
+        'debt_sum': None,
+    }
+    cne = msg['creditors_non_from_entrepreneurship']
+    obligations = cne['monetary_obligations'] if cne else []
+    unique = dict.fromkeys(
+        (
+            mo['creditor_name'],
+            round(float(mo['total_sum']), 2),
+            round(float(mo['debt_sum']), 2),
+        )
+        for mo in obligations
+    )
+    if not unique:
+        return [base]
+    return [
+        {
+            **base,
+            'creditor_name': creditor_name,
+            'total_sum': total_sum,
+            'debt_sum': debt_sum,
+        }
+        for creditor_name, total_sum, debt_sum in unique
+    ]
+
+
+def batches_from_messages(messages, batch_size=BATCH_SIZE):
+    """
+    Формирует пакеты записей снимка из сообщений парсера.
+    :param messages: итерируемый объект словарей сообщений
+    :param batch_size: количество строк в пакете
+    :return: генератор pyarrow.RecordBatch
+    """
+    rows = []
+    for msg in messages:
+        rows.extend(message_rows(msg))
+        if len(rows) >= batch_size:
+            yield pa.RecordBatch.from_pylist(rows, schema=SCHEMA)
+            rows = []
+    if rows:
+        yield pa.RecordBatch.from_pylist(rows, schema=SCHEMA)
+
+
+def batches_from_db(batch_size=BATCH_SIZE):
+    """
+    Формирует пакеты записей снимка из базы данных.
+    Данные читаются серверным курсором порциями по batch_size строк.
+    :param batch_size: количество строк в пакете
+    :return: генератор pyarrow.RecordBatch
+    """
+    conn = pymysql.connect(**DB_CONFIG, cursorclass=pymysql.cursors.SSCursor)
+    names = [name for name in SCHEMA.names if name != 'publish_month']
+    try:
+        with conn.cursor() as cur:
+            cur.execute(DB_SNAPSHOT_QUERY)
+            while True:
+                fetched = cur.fetchmany(batch_size)
+                if not fetched:
+                    break
+                rows = []
+                for values in fetched:
+                    row = dict(zip(names, values))
+                    row['publish_date'] = to_date(row['publish_date'])
+                    row['birth_date'] = to_date(row['birth_date'])
+                    row['publish_month'] = publish_month(row['publish_date'])
+                    for key in ('total_sum', 'debt_sum'):
+                        if row[key] is not None:
+                            row[key] = float(row[key])
+                    rows.append(row)
+                yield pa.RecordBatch.from_pylist(rows, schema=SCHEMA)
+    finally:
+        conn.close()
+
+
+def write_snapshot(batches, path=SNAPSHOT_PATH):
+    """
+    Записывает пакеты в Parquet-датасет с партициями по месяцу публикации.
+    Партиции, для которых пришли новые данные, перезаписываются целиком.
+    :param batches: итерируемый объект pyarrow.RecordBatch
+    :param path: директория снимка
+    """
+    ds.write_dataset(
+        batches,
+        path,
+        schema=SCHEMA,
+        format='parquet',
+        partitioning=['publish_month'],
+        partitioning_flavor='hive',
+        existing_data_behavior='delete_matching',
+    )
+
+
+def load_snapshot(path=SNAPSHOT_PATH, columns=None, filters=None):
+    """
+    Читает снимок в DataFrame. Файлы отображаются в память,
+    читаются только указанные колонки, а фильтры по publish_month
+    отсекают лишние партиции целиком.
+    :param path: директория снимка
+    :param columns: список колонок или None для всех
+    :param filters: фильтры pyarrow в виде списка условий, например
+        [('publish_month', '>=', '2024-01'), ('debt_sum', '>', 0)],
+        или pyarrow.dataset.Expression
+    :return: DataFrame
+    """
+    table = pq.read_table(
+        path,
+        columns=columns,
+        filters=filters,
+        memory_map=True,
+        partitioning='hive',
+    )
+    return table.to_pandas()
+
+
+def main(source='xml', path=SNAPSHOT_PATH):
+    """
+    Выгружает снимок из результата парсинга XML или из базы данных.
+    :param source: 'xml' или 'db'
+    :param path: директория снимка
+    """
+    if source == 'db':
+        batches = batches_from_db()
+    else:
+        # Для снимка нужен только регион, улицы и дома не разбираются
+        batches = batches_from_messages(
+            parse_messages(FILE_PATH, address_level='region')
+        )
+    write_snapshot(batches, path)
+    print(f'Снимок сохранён в {os.path.abspath(path)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Выгрузка снимка в Parquet')
+    parser.add_argument(
+        '--source',
+        choices=('xml', 'db'),
+        default='xml',
+        help='источник данных: результат парсинга XML или база данных',
+    )
+    parser.add_argument('--path', default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+    main(source=args.source, path=args.path)
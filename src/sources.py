@@ -0,0 +1,258 @@
+"""
+Открытие исходных выгрузок для потокового разбора XML.
+
+Поддерживаются:
+- .xml — несжатый файл, читается через mmap без копирования в буфер
+  чтения;
+- .xml.gz — распаковка zlib блоками по READ_SIZE (меньше вызовов,
+  чем у gzip.open с буфером по умолчанию), в том числе многотомные
+  архивы, склеенные через cat;
+- .xml.zst — распаковка zstandard (нужен пакет zstandard);
+- стандартный ввод (путь '-') в любом из этих форматов.
+
+Формат определяется по первым байтам (сигнатуре), а не по расширению:
+архив с неверным расширением всё равно откроется правильно. С ключом
+--decompress-thread распаковка идёт в отдельном потоке и опережает
+разбор на THREAD_QUEUE_SIZE блоков — zlib и zstandard отпускают GIL,
+поэтому распаковка и разбор XML выполняются параллельно.
+"""
+
+import contextlib
+import mmap
+import queue
+import sys
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+STDIN = '-'
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# Размер блока чтения сжатых данных
+READ_SIZE = 1 << 20
+# Сколько распакованных блоков поток распаковки держит впереди разбора
+THREAD_QUEUE_SIZE = 8
+# wbits для zlib: формат gzip с максимальным окном
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+SETTINGS = {'decompress_thread': False}
+
+
+def add_arguments(parser):
+    """
+    Добавляет в argparse-парсер ключи чтения выгрузок.
+    """
+    parser.add_argument(
+        '--decompress-thread',
+        action='store_true',
+        help='распаковывать архив в отдельном потоке параллельно с разбором',
+    )
+
+
+def configure(args):
+    """
+    Применяет настройки чтения из ключей командной строки.
+    """
+    SETTINGS['decompress_thread'] = args.decompress_thread
+
+
+def detect_format(head):
+    """
+    :param head: первые байты файла
+    :return: 'gzip', 'zstd' или 'xml'
+    """
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    return 'xml'
+
+
+class ChunkReader:
+    """
+    Файловый объект для ET.iterparse поверх итератора блоков bytes.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+        self._offset = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            rest = self._buffer[self._offset :] + b''.join(self._chunks)
+            self._buffer, self._offset = b'', 0
+            return rest
+        while self._offset >= len(self._buffer):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b''
+            self._buffer, self._offset = chunk, 0
+        data = self._buffer[self._offset : self._offset + size]
+        self._offset += len(data)
+        return data
+
+    def close(self):
+        self._chunks.close()
+
+
+def gzip_chunks(raw, members=None):
+    """
+    Распаковывает gzip (в том числе из нескольких склеенных частей).
+    :param raw: двоичный файловый объект со сжатыми данными
+    :param members: список, в который дописываются начала частей
+        архива — пары (смещение в сжатом файле, смещение в распакованных
+        данных); с начала каждой части распаковку можно начать заново
+    :return: генератор распакованных блоков
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    fed = False
+    # Часть закончилась ровно на конце прочитанного блока
+    at_boundary = False
+    consumed = produced = 0
+    if members is not None:
+        members.append((0, 0))
+    while True:
+        data = raw.read(READ_SIZE)
+        if not data:
+            break
+        if at_boundary and members is not None:
+            members.append((consumed, produced))
+        at_boundary = False
+        consumed += len(data)
+        while data:
+            fed = True
+            chunk = decompressor.decompress(data)
+            if chunk:
+                produced += len(chunk)
+                yield chunk
+            if not decompressor.eof:
+                break
+            # Следующая часть многотомного архива
+            data = decompressor.unused_data
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+            fed = False
+            if not data:
+                at_boundary = True
+            elif members is not None:
+                members.append((consumed - len(data), produced))
+    if fed and not decompressor.eof:
+        raise EOFError('Архив gzip обрезан')
+
+
+def zstd_chunks(raw):
+    """
+    :param raw: двоичный файловый объект со сжатыми данными
+    :return: генератор распакованных блоков
+    """
+    if zstandard is None:
+        raise RuntimeError('Для чтения .xml.zst нужен пакет zstandard')
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        raw, read_size=READ_SIZE, read_across_frames=True, closefd=False
+    )
+    with reader:
+        while True:
+            chunk = reader.read(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def threaded_chunks(chunks):
+    """
+    Выполняет итератор блоков в отдельном потоке с очередью
+    на THREAD_QUEUE_SIZE блоков. Ошибка распаковки передаётся читателю.
+    :param chunks: итератор блоков bytes
+    :return: генератор тех же блоков
+    """
+    blocks = queue.Queue(maxsize=THREAD_QUEUE_SIZE)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    return
+                put(chunk)
+        except Exception as e:
+            put(e)
+        else:
+            put(end)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = blocks.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Файл закрывается после выхода из генератора, поэтому поток
+        # распаковки должен завершиться раньше
+        stop.set()
+        thread.join()
+
+
+def _peek(raw, size=4):
+    if hasattr(raw, 'peek'):
+        return raw.peek(size)[:size]
+    head = raw.read(size)
+    raw.seek(0)
+    return head
+
+
+@contextlib.contextmanager
+def open_source(path, decompress_thread=None):
+    """
+    Открывает выгрузку для чтения распакованного XML.
+    :param path: путь к файлу или '-' для стандартного ввода
+    :param decompress_thread: распаковывать в отдельном потоке;
+        по умолчанию — как задано ключом --decompress-thread
+    :return: кортеж (двоичный файловый объект, формат: 'xml',
+        'gzip' или 'zstd')
+    """
+    if decompress_thread is None:
+        decompress_thread = SETTINGS['decompress_thread']
+    with contextlib.ExitStack() as stack:
+        if path == STDIN:
+            raw = sys.stdin.buffer
+        else:
+            raw = stack.enter_context(open(path, 'rb'))
+        source_format = detect_format(_peek(raw))
+        if source_format == 'xml':
+            if path == STDIN:
+                yield raw, source_format
+                return
+            try:
+                mapped = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Пустой файл нельзя отобразить в память
+                yield raw, source_format
+                return
+            yield stack.enter_context(mapped), source_format
+            return
+        if source_format == 'gzip':
+            chunks = gzip_chunks(raw)
+        else:
+            chunks = zstd_chunks(raw)
+        if decompress_thread:
+            chunks = threaded_chunks(chunks)
+        reader = ChunkReader(chunks)
+        stack.callback(reader.close)
+        yield reader, source_format
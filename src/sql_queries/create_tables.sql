@@ -1,3 +1,9 @@
+-- Справочник субъектов РФ (заполняется из regions.py при загрузке)
+CREATE TABLE IF NOT EXISTS Region (
+    id SMALLINT PRIMARY KEY,     -- Код субъекта РФ
+    name VARCHAR(100)            -- Каноническое название
+);
+
 -- Таблица для хранения информации о должнике
 CREATE TABLE IF NOT EXISTS Debtor (
     id INT PRIMARY KEY AUTO_INCREMENT,
@@ -6,13 +12,15 @@ CREATE TABLE IF NOT EXISTS Debtor (
     birth_place VARCHAR(255),    -- Место рождения
     address TEXT,                -- Адрес (исходная строка)
     postal_code VARCHAR(20),     -- Почтовый индекс
-    region VARCHAR(255),         -- Регион
+    region VARCHAR(255),         -- Регион (название из справочника или исходное написание)
+    region_id SMALLINT,          -- Внешний ключ на Region
     district VARCHAR(255),       -- Район
     locality VARCHAR(255),       -- Населённый пункт
     street VARCHAR(255),         -- Улица
     house VARCHAR(50),           -- Дом
     flat VARCHAR(50),            -- Квартира
     inn VARCHAR(20),              -- ИНН
+    FOREIGN KEY (region_id) REFERENCES Region(id),
     UNIQUE KEY uniq_debtor (name, birth_date, inn) -- Уникальное значение
 );
 
@@ -0,0 +1,183 @@
+"""
+Модуль для расчёта отчётов из директории sql_queries без базы данных.
+
+Отчёты считаются за один потоковый проход по XML-архиву: для каждого
+должника (естественный ключ — имя, дата рождения, ИНН, как в таблице Debtor)
+копятся количество денежных обязательств, сумма задолженности и общая сумма.
+Адреса не разбираются, а память пропорциональна числу разных должников.
+
+- first_sql_query.sql — топ должников по количеству обязательств
+- second_sql_query.sql — топ должников по общей сумме долга
+- third_sql_query.sql — процент погашения обязательств по должникам
+"""
+
+import argparse
+import heapq
+from array import array
+from pprint import pprint
+
+from main import FILE_PATH, get_date, get_text, iter_message_elements
+
+
+class DebtorStats:
+    """
+    Накопитель статистики по должникам. Ключ должника отображается
+    в номер строки, а счётчики хранятся в компактных массивах.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.keys = []
+        self.obligations_count = array('q')
+        self.debt_sum = array('d')
+        self.total_sum = array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, obligations):
+        """
+        Добавляет денежные обязательства одного сообщения.
+        Одинаковые обязательства внутри сообщения учитываются один раз —
+        так же, как при загрузке в БД (уникальность creditor_name,
+        total_sum, debt_sum и связи cne_monetary_obligation).
+
+        :param key: кортеж (name, birth_date, inn)
+        :param obligations: список кортежей
+            (creditor_name, total_sum, debt_sum)
+        """
+        unique = set(obligations)
+        if not unique:
+            return
+        row = self.index.get(key)
+        if row is None:
+            row = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.obligations_count.append(0)
+            self.debt_sum.append(0.0)
+            self.total_sum.append(0.0)
+        self.obligations_count[row] += len(unique)
+        for _, total_sum, debt_sum in unique:
+            self.total_sum[row] += total_sum
+            self.debt_sum[row] += debt_sum
+
+    def _row(self, row, **values):
+        name, _, inn = self.keys[row]
+        return {'debtor_name': name, 'inn': inn, **values}
+
+    def top_by_obligations_count(self, limit=10):
+        """
+        Аналог first_sql_query.sql.
+        :return: список словарей debtor_name, inn, obligations_count
+        """
+        rows = heapq.nlargest(
+            limit, range(len(self)), key=self.obligations_count.__getitem__
+        )
+        return [
+            self._row(row, obligations_count=self.obligations_count[row])
+            for row in rows
+        ]
+
+    def top_by_total_debt(self, limit=10):
+        """
+        Аналог second_sql_query.sql.
+        :return: список словарей debtor_name, inn, total_debt
+        """
+        rows = heapq.nlargest(
+            limit, range(len(self)), key=self.debt_sum.__getitem__
+        )
+        return [
+            self._row(row, total_debt=round(self.debt_sum[row], 2))
+            for row in rows
+        ]
+
+    def paid_percent(self, limit=None):
+        """
+        Аналог third_sql_query.sql.
+        :param limit: количество должников с наименьшим процентом
+            или None для всех
+        :return: список словарей debtor_name, inn, TotalSum, DebtSum,
+            paid_percent по возрастанию paid_percent
+        """
+
+        def percent(row):
+            total = self.total_sum[row]
+            if total == 0:
+                return 0
+            return round(100 * (total - self.debt_sum[row]) / total, 2)
+
+        rows = range(len(self))
+        if limit is None:
+            rows = sorted(rows, key=percent)
+        else:
+            rows = heapq.nsmallest(limit, rows, key=percent)
+        return [
+            self._row(
+                row,
+                TotalSum=round(self.total_sum[row], 2),
+                DebtSum=round(self.total_sum[row] - self.debt_sum[row], 2),
+                paid_percent=percent(row),
+            )
+            for row in rows
+        ]
+
+
+def message_obligations(elem):
+    """
+    Достаёт из XML-элемента сообщения ключ должника и его
+    денежные обязательства без построения объектов сущностей.
+    :param elem: XML-элемент ExtrajudicialBankruptcyMessage
+    :return: кортеж (ключ должника, список обязательств)
+    """
+    debtor = elem.find('Debtor')
+    key = (
+        get_text(debtor, 'Name'),
+        get_date(debtor, 'BirthDate'),
+        get_text(debtor, 'Inn'),
+    )
+    obligations = [
+        (
+            get_text(mo, 'CreditorName'),
+            round(float(get_text(mo, 'TotalSum') or 0), 2),
+            round(float(get_text(mo, 'DebtSum') or 0), 2),
+        )
+        for mo in elem.iterfind(
+            'CreditorsNonFromEntrepreneurship/MonetaryObligations/'
+            'MonetaryObligation'
+        )
+    ]
+    return key, obligations
+
+
+def collect_stats(file_path=FILE_PATH):
+    """
+    Один потоковый проход по архиву со сбором статистики по должникам.
+    :param file_path: путь к архиву XML
+    :return: DebtorStats
+    """
+    stats = DebtorStats()
+    for elem in iter_message_elements(file_path):
+        if elem.find('Debtor') is None:
+            continue
+        stats.add(*message_obligations(elem))
+    return stats
+
+
+def main(file_path=FILE_PATH, limit=10):
+    """
+    Выводит в терминал три отчёта, посчитанные без базы данных.
+    """
+    stats = collect_stats(file_path)
+    pprint(stats.top_by_obligations_count(limit))
+    pprint(stats.top_by_total_debt(limit))
+    pprint(stats.paid_percent())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Отчёты из sql_queries без базы данных'
+    )
+    parser.add_argument('--file', default=FILE_PATH)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    main(args.file, args.limit)
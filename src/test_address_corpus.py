@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+from address_parser import parse_addresses
+from bench_address import (
+    ENGINES,
+    FIELDS,
+    accuracy,
+    check_floor,
+    compare,
+    load_corpus,
+    percentile,
+)
+
+
+def make_result(engine, p99_ms, **scores):
+    return {
+        'engine': engine,
+        'accuracy': dict(dict.fromkeys(FIELDS, 1.0), **scores),
+        'p50_ms': 10.0,
+        'p95_ms': 20.0,
+        'p99_ms': p99_ms,
+    }
+
+
+class TestAddressCorpus(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = load_corpus()
+
+    def test_corpus_is_complete(self):
+        self.assertGreaterEqual(len(self.corpus), 50)
+        addresses = [row['address'] for row in self.corpus]
+        self.assertEqual(len(set(addresses)), len(addresses))
+        for row in self.corpus:
+            self.assertEqual(set(row), {'address', *FIELDS})
+
+    def test_accuracy_floor(self):
+        addresses = [row['address'] for row in self.corpus]
+        for engine in ('full', 'region'):
+            level = ENGINES[engine].get('level', 'full')
+            scores, mismatches = accuracy(
+                self.corpus,
+                parse_addresses(addresses, level),
+                ENGINES[engine]['fields'],
+            )
+            result = {'engine': engine, 'accuracy': scores}
+            self.assertEqual(check_floor([result]), [], mismatches)
+
+
+class TestRegressionGate(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+
+    def test_compare_reports_regressions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, 'address-base.json')
+            with open(baseline, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {
+                        'commit': 'base',
+                        'results': [make_result('full', 50.0)],
+                    },
+                    f,
+                )
+            self.assertEqual(
+                compare([make_result('full', 60.0)], baseline), []
+            )
+            failures = compare(
+                [make_result('full', 80.0, street=0.9)], baseline
+            )
+        self.assertEqual(len(failures), 2)
+        self.assertIn('street', failures[0])
+        self.assertIn('p99', failures[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
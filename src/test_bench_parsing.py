@@ -0,0 +1,24 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import bench_parsing
+
+
+class TestMeasure(unittest.TestCase):
+    @patch('bench_parsing.POLL_SECONDS', 0.1)
+    def test_dead_child_is_reported(self):
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            patch('bench_parsing.BENCH_DATA_DIR', tmp),
+        ):
+            # Неизвестный замер: процесс падает с KeyError до отправки
+            # результата, а measure не должен ждать его вечно
+            with self.assertRaisesRegex(RuntimeError, 'с кодом 1'):
+                bench_parsing.measure('missing', 5)
+            self.assertTrue(os.listdir(tmp))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from debtor_search import (
+    DebtorSearchIndex,
+    SearchHandler,
+    build_from_xml,
+    normalize_name,
+)
+from generate_data import generate
+from test_save_to_sql import make_message
+
+
+class TestDebtorSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = DebtorSearchIndex()
+        self.index.add_debtor(
+            'Иванова Анна Сергеевна',
+            '1980-01-01T00:00:00',
+            '7701 234567 89',
+            ['Петрова Анна Сергеевна'],
+            'm1',
+        )
+        self.index.add_debtor('Фёдоров Пётр Ильич', '1975-05-05', None)
+
+    def test_normalize_name(self):
+        self.assertEqual(
+            normalize_name(' Фёдоров  Пётр-Ильич '), 'федоров петр ильич'
+        )
+
+    def test_by_inn(self):
+        (result,) = self.index.by_inn('770123456789')
+        self.assertEqual(result['name'], 'Иванова Анна Сергеевна')
+        self.assertEqual(result['birth_date'], '1980-01-01')
+        self.assertEqual(self.index.by_inn('000'), [])
+
+    def test_search_exact_and_fuzzy(self):
+        exact = self.index.search('федоров петр ильич')
+        self.assertEqual(exact[0]['name'], 'Фёдоров Пётр Ильич')
+        self.assertEqual(exact[0]['score'], 1.0)
+        fuzzy = self.index.search('Иванова Ана')
+        self.assertEqual(fuzzy[0]['name'], 'Иванова Анна Сергеевна')
+        self.assertLess(fuzzy[0]['score'], 1.0)
+        self.assertEqual(self.index.search('Сидоров Олег Олегович'), [])
+
+    def test_search_previous_names(self):
+        (result,) = self.index.search('Петрова Анна Сергеевна', threshold=0.9)
+        self.assertEqual(result['name'], 'Иванова Анна Сергеевна')
+        self.assertEqual(result['matched'], 'петрова анна сергеевна')
+
+    def test_incremental_update(self):
+        msg = make_message('m2', debtor_name='Иванова Анна Сергеевна')
+        msg['debtor'].update(
+            birth_date='1980-01-01',
+            inn='770123456789',
+            previous_names=['Смирнова Анна Сергеевна'],
+        )
+        self.index.add_message(msg)
+        self.assertEqual(len(self.index), 2)
+        (result,) = self.index.by_inn('770123456789')
+        self.assertEqual(result['messages'], ['m1', 'm2'])
+        self.assertEqual(
+            self.index.search('Смирнова Анна Сергеевна')[0]['name'],
+            'Иванова Анна Сергеевна',
+        )
+
+    def test_build_from_xml(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.xml.gz')
+            generate(path, 30, seed=3)
+            index = build_from_xml(path)
+        messages = sum(len(record.messages) for record in index.records)
+        self.assertEqual(messages, 30)
+        record = index.records[0]
+        self.assertIn(
+            record.name, [r['name'] for r in index.search(record.name)]
+        )
+
+
+class TestSearchHandler(unittest.TestCase):
+    def setUp(self):
+        SearchHandler.index = DebtorSearchIndex()
+        self.server = HTTPServer(('127.0.0.1', 0), SearchHandler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_post_then_query(self):
+        request = Request(
+            f'{self.url}/messages',
+            data=json.dumps([make_message('1')]).encode(),
+            method='POST',
+        )
+        with urlopen(request) as response:
+            self.assertEqual(json.load(response)['debtors'], 1)
+        with urlopen(f'{self.url}/debtors?inn=123') as response:
+            body = json.load(response)
+        self.assertEqual(body['results'][0]['name'], 'Иванов Иван')
+        with urlopen(
+            f'{self.url}/debtors?q={quote("Петров Иван")}'
+        ) as response:
+            body = json.load(response)
+        self.assertEqual(body['results'][0]['matched'], 'петров иван')
+
+    def test_invalid_message_is_rejected(self):
+        broken = make_message('2')
+        del broken['debtor']['name']
+        for payload, position in (
+            ([make_message('1'), broken], 1),
+            (['not a message'], 0),
+            ([make_message('1'), {'debtor': {'name': 'Иванов'}}], 1),
+        ):
+            request = Request(
+                f'{self.url}/messages',
+                data=json.dumps(payload).encode(),
+                method='POST',
+            )
+            with self.assertRaises(HTTPError) as error:
+                urlopen(request)
+            self.assertEqual(error.exception.code, 400)
+            self.assertEqual(json.load(error.exception)['index'], position)
+            error.exception.close()
+        # Корректные сообщения из отклонённого пакета не добавлены
+        self.assertEqual(len(SearchHandler.index), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+from export import TABLES, write_csv, write_jsonl
+from generate_data import generate
+from main import export_messages
+from test_save_to_sql import make_message
+
+
+def typed_message(message_id):
+    msg = make_message(message_id)
+    msg['publish_date'] = date(2024, 1, 5)
+    msg['debtor']['birth_date'] = date(1980, 1, 1)
+    msg['creditors_non_from_entrepreneurship']['monetary_obligations'][
+        0
+    ].update(total_sum=Decimal('100.10'), debt_sum=Decimal('50.00'))
+    return msg
+
+
+class TestWriteJsonl(unittest.TestCase):
+    def test_gzip_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'messages.jsonl.gz')
+            written = write_jsonl(
+                (typed_message(str(i)) for i in range(3)), path, True
+            )
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(written, 3)
+        self.assertEqual([line['id'] for line in lines], ['0', '1', '2'])
+        self.assertEqual(lines[0]['publish_date'], '2024-01-05')
+        self.assertEqual(lines[0]['debtor']['name'], 'Иванов Иван')
+        obligation = lines[0]['creditors_non_from_entrepreneurship'][
+            'monetary_obligations'
+        ][0]
+        self.assertEqual(obligation['total_sum'], '100.10')
+
+    def test_json_fallback_matches_orjson(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fast = os.path.join(tmp, 'fast.jsonl')
+            slow = os.path.join(tmp, 'slow.jsonl')
+            write_jsonl([typed_message('1')], fast)
+            with patch('export.orjson', None):
+                write_jsonl([typed_message('1')], slow)
+            with open(fast, encoding='utf-8') as f:
+                expected = json.load(f)
+            with open(slow, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), expected)
+
+
+class TestWriteCsv(unittest.TestCase):
+    def read_table(self, directory, table):
+        with open(
+            os.path.join(directory, f'{table}.csv'), encoding='utf-8'
+        ) as f:
+            return list(csv.DictReader(f))
+
+    def test_tables_reference_messages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            written = write_csv([typed_message('1'), make_message('2')], tmp)
+            tables = {table: self.read_table(tmp, table) for table in TABLES}
+        self.assertEqual(written, 2)
+        self.assertEqual(
+            [row['message_id'] for row in tables['messages']], ['1', '2']
+        )
+        self.assertEqual(tables['messages'][0]['publish_date'], '2024-01-05')
+        self.assertEqual(len(tables['debtors']), 2)
+        self.assertEqual(tables['debtors'][0]['birth_date'], '1980-01-01')
+        self.assertEqual(
+            tables['debtor_previous_names'][1],
+            {'message_id': '2', 'name': 'Петров Иван'},
+        )
+        self.assertEqual(
+            tables['monetary_obligations'][0]['total_sum'], '100.10'
+        )
+        self.assertEqual(tables['obligatory_payments'], [])
+
+    def test_export_messages_from_archive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.xml.gz')
+            generate(path, 10, seed=7)
+            output = os.path.join(tmp, 'csv')
+            exported = export_messages(
+                path, 'csv', output, compress=True, address_level='region'
+            )
+            with gzip.open(
+                os.path.join(output, 'messages.csv.gz'),
+                'rt',
+                encoding='utf-8',
+            ) as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual(exported, 10)
+        self.assertEqual(len(rows), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import asyncio
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from bench_loader import CountingCursor, StatementStats, sqlite_schema
+from generate_data import generate
+from ingest_daemon import DONE_DIR, FAILED_DIR, IngestDaemon
+
+
+class SqliteConnection:
+    """
+    Соединение SQLite, курсоры которого понимают плейсхолдеры %s.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self):
+        return CountingCursor(self._conn.cursor(), StatementStats(), 'qmark')
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class TestIngestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.watch_dir = os.path.join(self.tmp.name, 'incoming')
+        os.makedirs(self.watch_dir)
+        self.db_path = os.path.join(self.tmp.name, 'db.sqlite')
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executescript(sqlite_schema())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_daemon(self, **kwargs):
+        return IngestDaemon(
+            self.watch_dir,
+            lambda: SqliteConnection(self.db_path),
+            settle=0,
+            **kwargs,
+        )
+
+    def count_messages(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM ExtrajudicialBankruptcyMessage'
+            ).fetchone()[0]
+
+    def test_ingests_ready_files_in_batches(self):
+        generate(os.path.join(self.watch_dir, 'a.xml.gz'), 5, seed=1)
+        generate(os.path.join(self.watch_dir, 'b.xml.gz'), 3, seed=2)
+        with open(os.path.join(self.watch_dir, 'c.xml.gz.part'), 'w'):
+            pass
+
+        async def scenario():
+            daemon = self.make_daemon(workers=2, batch_size=2)
+            try:
+                await daemon.run_once()
+                # Повторный проход ничего не загружает
+                await daemon.run_once()
+            finally:
+                daemon.close()
+            return daemon
+
+        daemon = asyncio.run(scenario())
+        # Номера сообщений в b совпадают с первыми тремя из a,
+        # повторно они не записываются
+        self.assertEqual(self.count_messages(), 5)
+        status = daemon.status_dict()
+        self.assertEqual(status['files_done'], 2)
+        self.assertEqual(status['files_failed'], 0)
+        self.assertEqual(status['messages'], 8)
+        self.assertLessEqual(status['pool']['connections'], 2)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.watch_dir, DONE_DIR))),
+            ['a.xml.gz', 'b.xml.gz'],
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.watch_dir, 'c.xml.gz.part'))
+        )
+
+    def test_concurrent_files_share_entities(self):
+        # b — те же должники, издатели и банки, что в a, но другие сообщения
+        first = os.path.join(self.tmp.name, 'a.xml.gz')
+        generate(first, 6, seed=3)
+        with gzip.open(first, 'rt', encoding='utf-8') as f:
+            xml = f.read()
+        second = re.sub(r'<Id>0+', '<Id>b', xml)
+        second = re.sub(r'<Number>1', '<Number>2', second)
+        shutil.move(first, os.path.join(self.watch_dir, 'a.xml.gz'))
+        with gzip.open(
+            os.path.join(self.watch_dir, 'b.xml.gz'), 'wt', encoding='utf-8'
+        ) as f:
+            f.write(second)
+
+        active = []
+        overlaps = []
+
+        async def scenario():
+            daemon = self.make_daemon(workers=2, batch_size=1)
+            load_batch = daemon._load_batch
+
+            def tracked(*args):
+                active.append(1)
+                overlaps.append(len(active))
+                time.sleep(0.01)
+                try:
+                    return load_batch(*args)
+                finally:
+                    active.pop()
+
+            daemon._load_batch = tracked
+            try:
+                await daemon.run_once()
+            finally:
+                daemon.close()
+            return daemon
+
+        daemon = asyncio.run(scenario())
+        status = daemon.status_dict()
+        self.assertEqual(status['files_done'], 2)
+        self.assertEqual(status['files_failed'], 0)
+        self.assertEqual(self.count_messages(), 12)
+        # Транзакции разных файлов не пересекаются
+        self.assertEqual(max(overlaps), 1)
+        with sqlite3.connect(self.db_path) as conn:
+            debtors = conn.execute('SELECT COUNT(*) FROM Debtor').fetchone()
+            unique = conn.execute(
+                'SELECT COUNT(*) FROM'
+                ' (SELECT DISTINCT name, birth_date, inn FROM Debtor)'
+            ).fetchone()
+        self.assertEqual(debtors, unique)
+
+    def test_broken_file_is_moved_to_failed(self):
+        with open(os.path.join(self.watch_dir, 'bad.xml.gz'), 'wb') as f:
+            f.write(b'not a gzip archive')
+
+        async def scenario():
+            daemon = self.make_daemon()
+            try:
+                await daemon.run_once()
+            finally:
+                daemon.close()
+            return daemon
+
+        daemon = asyncio.run(scenario())
+        self.assertEqual(daemon.status.files_failed, 1)
+        self.assertIn('bad.xml.gz', daemon.status.last_error)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.watch_dir, FAILED_DIR, 'bad.xml.gz')
+            )
+        )
+
+    def test_file_stays_when_database_is_unavailable(self):
+        path = os.path.join(self.watch_dir, 'a.xml.gz')
+        generate(path, 2, seed=1)
+
+        def connect():
+            raise sqlite3.OperationalError('unable to open database')
+
+        async def scenario():
+            daemon = IngestDaemon(self.watch_dir, connect, settle=0)
+            try:
+                await daemon.run_once()
+                # Файл снова в очереди на загрузку
+                self.assertEqual(daemon.scan(), [path])
+            finally:
+                daemon.close()
+            return daemon
+
+        daemon = asyncio.run(scenario())
+        self.assertEqual(daemon.status.files_failed, 0)
+        self.assertIn('a.xml.gz', daemon.status.last_error)
+        self.assertEqual(daemon.health()[0], 503)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.watch_dir, FAILED_DIR))
+        )
+
+    def test_status_endpoint(self):
+        async def scenario():
+            daemon = self.make_daemon()
+            server = await asyncio.start_server(
+                daemon._serve_status, host='127.0.0.1', port=0
+            )
+            port = server.sockets[0].getsockname()[1]
+            responses = []
+            try:
+                for path in ('/health', '/status', '/missing'):
+                    reader, writer = await asyncio.open_connection(
+                        '127.0.0.1', port
+                    )
+                    writer.write(f'GET {path} HTTP/1.1\r\n\r\n'.encode())
+                    responses.append(await reader.read())
+                    writer.close()
+            finally:
+                server.close()
+                daemon.close()
+            return responses
+
+        health, status, missing = asyncio.run(scenario())
+        self.assertTrue(health.startswith(b'HTTP/1.1 200'))
+        self.assertEqual(
+            json.loads(health.split(b'\r\n\r\n', 1)[1]), {'status': 'ok'}
+        )
+        body = json.loads(status.split(b'\r\n\r\n', 1)[1])
+        self.assertEqual(body['files_done'], 0)
+        self.assertIn('messages_per_second', body)
+        self.assertTrue(missing.startswith(b'HTTP/1.1 404'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from generate_data import generate
+from main import parse_messages
+from message_index import (
+    MessageIndex,
+    build_index,
+    find_messages,
+    get_message,
+    write_seekable,
+)
+
+
+class TestMessageIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'data.xml.gz')
+        generate(self.path, 40, seed=12)
+        self.messages = parse_messages(self.path, address_level='region')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def assert_all_messages(self, index):
+        self.assertEqual(len(index), len(self.messages))
+        for msg in reversed(self.messages):
+            self.assertEqual(index.get(msg['id'], 'region'), msg)
+
+    def test_get_message_by_id(self):
+        msg = self.messages[25]
+        self.assertEqual(get_message(self.path, msg['id'], 'region'), msg)
+        self.assertIsNone(get_message(self.path, 'missing'))
+        self.assertTrue(os.path.exists(self.path + '.idx'))
+
+    def test_find_by_number_and_inn(self):
+        msg = self.messages[7]
+        (by_number,) = find_messages(
+            self.path, number=msg['number'], address_level='region'
+        )
+        self.assertEqual(by_number, msg)
+        by_inn = find_messages(
+            self.path, inn=msg['debtor']['inn'], address_level='region'
+        )
+        self.assertIn(msg, by_inn)
+
+    @patch('message_index.LOOKUP_READ_SIZE', 256)
+    @patch('message_index.CHECKPOINT_SPACING', 2048)
+    def test_in_memory_checkpoints(self):
+        index = MessageIndex(self.path)
+        self.assert_all_messages(index)
+        self.assertGreater(len(index._snapshots), 1)
+        index.close()
+
+    def test_seekable_rewrite(self):
+        seekable = os.path.join(self.tmp.name, 'seekable.xml.gz')
+        write_seekable(self.path, seekable, member_size=4096)
+        with gzip.open(self.path) as a, gzip.open(seekable) as b:
+            self.assertEqual(a.read(), b.read())
+        index = MessageIndex(seekable)
+        self.assertGreater(len(index._checkpoints), 2)
+        self.assertFalse(index.linear_lookups)
+        self.assert_all_messages(index)
+        index.close()
+
+    def test_single_member_gzip_is_linear(self):
+        index = MessageIndex(self.path)
+        self.assertFalse(index.linear_lookups)
+        with patch('message_index.CHECKPOINT_SPACING', 4096):
+            self.assertTrue(index.linear_lookups)
+        index.close()
+
+    def test_plain_xml_and_stale_index(self):
+        plain = os.path.join(self.tmp.name, 'data.xml')
+        with gzip.open(self.path) as f, open(plain, 'wb') as out:
+            out.write(f.read())
+        self.assertEqual(build_index(plain), 40)
+        index = MessageIndex(plain)
+        self.assertEqual(index.meta['format'], 'xml')
+        self.assert_all_messages(index)
+        index.close()
+        # Выгрузка изменилась — индекс строится заново
+        generate(plain + '.gz', 5, seed=1)
+        os.replace(plain + '.gz', plain)
+        index = MessageIndex(plain)
+        self.assertEqual(len(index), 5)
+        index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import argparse
+import io
+import os
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stderr
+
+import profiling
+from metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled_metrics_collect_nothing(self):
+        metrics = Metrics()
+
+        @metrics.timed('work')
+        def work():
+            return 42
+
+        self.assertEqual(work(), 42)
+        with metrics.stage('outer'):
+            metrics.count('messages')
+        self.assertEqual(metrics.to_dict(), {'stages': {}, 'counters': {}})
+
+    def test_nested_stage_time_is_excluded(self):
+        metrics = Metrics()
+        metrics.enable()
+        with metrics.stage('outer'):
+            with metrics.stage('inner'):
+                time.sleep(0.02)
+        self.assertEqual(metrics.stages['outer'].count, 1)
+        self.assertGreaterEqual(metrics.stages['inner'].seconds, 0.02)
+        self.assertLess(metrics.stages['outer'].seconds, 0.01)
+
+    def test_prometheus_textfile(self):
+        metrics = Metrics()
+        metrics.enable()
+        metrics.observe('address', 0.003)
+        metrics.count('messages', 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pipeline.prom')
+            metrics.write_prometheus(path)
+            with open(path, encoding='utf-8') as prom_file:
+                content = prom_file.read()
+        self.assertIn(
+            'bankruptcy_pipeline_stage_seconds_bucket'
+            '{stage="address",le="0.005"} 1',
+            content,
+        )
+        self.assertIn('bankruptcy_pipeline_messages_total 2', content)
+
+
+class TestProfiling(unittest.TestCase):
+    def test_profile_writes_pstats_and_report(self):
+        parser = argparse.ArgumentParser()
+        profiling.add_arguments(parser)
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = os.path.join(tmp, 'job')
+            args = parser.parse_args(
+                ['--profile', prefix, '--tracemalloc-at', '1']
+            )
+
+            def job():
+                profiling.take_snapshot(1)
+                return sum(range(1000))
+
+            self.assertEqual(profiling.run(args, job), 499500)
+            for suffix in ('.pstats', '-top.txt', '-tracemalloc-1.txt'):
+                self.assertTrue(os.path.exists(prefix + suffix))
+        self.assertEqual(profiling.snapshot_points, frozenset())
+
+    def test_tracemalloc_only_for_message_scripts(self):
+        parser = argparse.ArgumentParser()
+        profiling.add_arguments(parser, messages=False)
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            parser.parse_args(['--tracemalloc-at', '1'])
+        args = parser.parse_args([])
+        self.assertEqual(profiling.run(args, sum, [1, 2]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
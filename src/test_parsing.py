@@ -1,12 +1,32 @@
+import io
+import os
+import tempfile
 import unittest
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr
+from datetime import date
+from decimal import Decimal
 from unittest.mock import MagicMock, patch
 
+from address_parser import (
+    normalize_addresses,
+    parse_address,
+    parse_addresses,
+    set_budget,
+)
+from generate_data import generate
 from main import (
     Debtor,
+    DebtorIndex,
     ExtrajudicialBankruptcyMessage,
     MonetaryObligation,
     ObligatoryPayment,
+    iter_message_elements,
+    iter_messages,
+    parse_date,
 )
+from regions import CITY_REGIONS, REGIONS, resolve_region
 
 
 class TestDebtor(unittest.TestCase):
@@ -38,7 +58,7 @@ class TestDebtor(unittest.TestCase):
         elem.find.return_value = name_history
         debtor = Debtor(elem)
         self.assertEqual(debtor.name, 'Sasha')
-        self.assertEqual(debtor.birth_date, '1990-01-01')
+        self.assertEqual(debtor.birth_date, date(1990, 1, 1))
         self.assertEqual(debtor.previous_names, ['Old Name'])
         self.assertEqual(debtor.postal_code, '111')
         self.assertEqual(debtor.region, 'Region')
@@ -49,6 +69,265 @@ class TestDebtor(unittest.TestCase):
         self.assertEqual(debtor.flat, '2')
 
 
+def debtor_elem(previous_names=(), address='г. Москва, ул. Ленина, д. 1'):
+    names = ''.join(
+        f'<PreviousName><Value>{name}</Value></PreviousName>'
+        for name in previous_names
+    )
+    return ET.fromstring(
+        '<Debtor><Name>Иванова Анна</Name>'
+        '<BirthDate>1980-01-01T00:00:00</BirthDate>'
+        f'<Address>{address}</Address><Inn>123</Inn>'
+        f'<NameHistory>{names}</NameHistory></Debtor>'
+    )
+
+
+class TestDebtorIndex(unittest.TestCase):
+    @patch('main.parse_address', return_value={})
+    def test_repeated_debtor_is_parsed_once(self, mock_parse_address):
+        index = DebtorIndex()
+        first = index.get(debtor_elem(['Петрова Анна']))
+        second = index.get(debtor_elem(['Сидорова Анна', 'Петрова Анна']))
+        self.assertIs(first, second)
+        self.assertEqual(mock_parse_address.call_count, 1)
+        self.assertEqual(index.hits, 1)
+        self.assertEqual(
+            first.previous_names, ['Петрова Анна', 'Сидорова Анна']
+        )
+        self.assertIs(index.to_dict(first), index.to_dict(second))
+
+    @patch('main.parse_address', return_value={})
+    def test_old_debtors_are_evicted(self, mock_parse_address):
+        index = DebtorIndex(max_size=1)
+        index.get(debtor_elem())
+        index.get(ET.fromstring('<Debtor><Name>Петров Пётр</Name></Debtor>'))
+        index.get(debtor_elem())
+        self.assertEqual(len(index), 1)
+        self.assertEqual(mock_parse_address.call_count, 3)
+
+    @patch('main.parse_addresses')
+    def test_batch_parses_pending_together(self, mock_parse_addresses):
+        mock_parse_addresses.side_effect = lambda addresses, level: [
+            {'region': address} for address in addresses
+        ]
+        index = DebtorIndex(batch=True)
+        first = index.get(debtor_elem())
+        second = index.get(
+            ET.fromstring(
+                '<Debtor><Name>Петров Пётр</Name>'
+                '<Address>г. Омск</Address></Debtor>'
+            )
+        )
+        self.assertIsNone(second.region)
+        index.parse_pending()
+        index.parse_pending()
+        mock_parse_addresses.assert_called_once_with(
+            [first.address, 'г. Омск'], 'full'
+        )
+        self.assertEqual(second.region, 'г. Омск')
+
+    def test_iter_messages_in_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.xml.gz')
+            generate(path, 7, seed=5)
+            with patch(
+                'main.parse_addresses', wraps=parse_addresses
+            ) as mock_parse_addresses:
+                messages = list(
+                    iter_messages(path, address_level='region', chunk_size=3)
+                )
+        self.assertEqual(len(messages), 7)
+        self.assertEqual(mock_parse_addresses.call_count, 3)
+        for message in messages:
+            debtor = message['debtor']
+            expected = parse_address(debtor['address'], 'region')
+            self.assertEqual(debtor['region_id'], expected['region_id'])
+
+
+class TestRegions(unittest.TestCase):
+    def test_spellings_map_to_one_region(self):
+        for spelling in ('Москва город', 'г. Москва', 'Москва г'):
+            self.assertEqual(resolve_region(spelling), (77, 'г. Москва'))
+        for spelling in ('Московская область', 'обл Московская'):
+            self.assertEqual(resolve_region(spelling)[0], 50)
+        self.assertEqual(resolve_region('Республика Алтай')[0], 4)
+        self.assertEqual(resolve_region('Алтайский край')[0], 22)
+        self.assertEqual(resolve_region('Ямало-Ненецкий АО')[0], 89)
+
+    def test_city_names_need_exact_match(self):
+        # Похожие на регион названия без слова «область», «край» и т. п.
+        for spelling in (
+            'г. Кировск',
+            'пос. Московский',
+            'Ленинградское ш.',
+            'с. Алтайское',
+        ):
+            self.assertEqual(resolve_region(spelling), (None, spelling))
+        # Административные центры сопоставляются со своим субъектом
+        self.assertEqual(resolve_region('г. Калининград')[0], 39)
+        self.assertEqual(resolve_region('г. Тверь')[0], 69)
+        self.assertEqual(resolve_region('Ростов-на-Дону г')[0], 61)
+        self.assertIsNone(
+            parse_address('г. Кировск, ул. Ленина, д. 1')['region_id']
+        )
+
+    def test_postal_code_fallback(self):
+        self.assertEqual(resolve_region(None, '630099')[0], 54)
+        self.assertEqual(
+            resolve_region('Неизвестно', None), (None, 'Неизвестно')
+        )
+
+    def test_dictionary_is_consistent(self):
+        ids = [region_id for region_id, _, _, _ in REGIONS]
+        self.assertEqual(len(ids), len(set(ids)))
+        for region_id, name, _, _ in REGIONS:
+            self.assertEqual(resolve_region(name)[0], region_id)
+        self.assertLessEqual(set(CITY_REGIONS.values()), set(ids))
+        prefixes = [
+            prefix
+            for _, _, _, ranges in REGIONS
+            for start, end in ranges
+            for prefix in range(start, end + 1)
+        ]
+        self.assertEqual(len(prefixes), len(set(prefixes)))
+
+
+class TestParseRegion(unittest.TestCase):
+    @patch('address_parser.addr_extractor')
+    def test_region_level_skips_natasha(self, mock_extractor):
+        result = parse_address(
+            '141400, Московская обл, Одинцовский р-н, г. Одинцово, '
+            'ул. Московская, д. 1',
+            level='region',
+        )
+        mock_extractor.assert_not_called()
+        self.assertEqual(result['postal_code'], '141400')
+        self.assertEqual(result['region_id'], 50)
+        self.assertEqual(result['region'], 'Московская область')
+        self.assertEqual(result['district'], 'Одинцовский район')
+        self.assertIsNone(result['street'])
+
+    def test_region_without_postal_code(self):
+        result = parse_address(
+            'Республика Татарстан, г. Казань, ул. Ленина, д. 5', level='region'
+        )
+        self.assertEqual(result['region_id'], 16)
+        result = parse_address('г. Омск, ул. Мира, д. 1', level='region')
+        self.assertEqual(result['region_id'], 55)
+        result = parse_address('ул. Московская, д. 1', level='region')
+        self.assertIsNone(result['region_id'])
+
+
+class TestParseAddresses(unittest.TestCase):
+    def test_normalize_addresses(self):
+        self.assertEqual(
+            normalize_addresses(
+                ['гор. Тула, Ленинский р-н', 'Сургутский р-он']
+            ),
+            ['г. Тула, Ленинский район', 'Сургутский район'],
+        )
+
+    @patch('address_parser._extract')
+    def test_duplicates_are_parsed_once(self, mock_extract):
+        mock_extract.side_effect = lambda address: {'raw': address}
+        results = parse_addresses(
+            ['гор. Тула', None, 'г. Омск', 'гор. Тула', '']
+        )
+        self.assertEqual(mock_extract.call_count, 2)
+        self.assertEqual(
+            [result['raw'] for result in results],
+            ['г. Тула', None, 'г. Омск', 'г. Тула', None],
+        )
+        self.assertIs(results[0], results[3])
+
+    def test_region_level_matches_single(self):
+        addresses = ['г. Омск, ул. Мира, д. 1', 'Республика Татарстан']
+        self.assertEqual(
+            parse_addresses(addresses * 2, level='region'),
+            [parse_address(address, 'region') for address in addresses * 2],
+        )
+
+
+class TestAddressBudget(unittest.TestCase):
+    ADDRESS = 'Краснодарский край, Сочи, ст. Лазаревская, мкр. 5, д. 1'
+
+    def tearDown(self):
+        set_budget()
+
+    @patch('address_parser.addr_extractor')
+    def test_long_address_skips_natasha(self, mock_extractor):
+        set_budget(max_length=20)
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            result = parse_address('354000, ' + self.ADDRESS)
+        mock_extractor.assert_not_called()
+        self.assertIn('символов', stderr.getvalue())
+        self.assertEqual(result['postal_code'], '354000')
+        self.assertEqual(result['region_id'], 23)
+        self.assertEqual(result['street'], 'мкр. 5')
+        self.assertEqual(result['locality'], 'ст. Лазаревская')
+
+    @patch('address_parser.addr_extractor')
+    def test_joined_addresses_skip_natasha(self, mock_extractor):
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            result = parse_address(
+                '354000, ' + self.ADDRESS + '; 115191, г. Москва'
+            )
+            parse_address(', '.join(['ул. Мира'] * 13))
+        mock_extractor.assert_not_called()
+        self.assertIn('индексов: 2', stderr.getvalue())
+        self.assertIn('частей: 13', stderr.getvalue())
+        self.assertEqual(result['postal_code'], '354000')
+        self.assertEqual(result['region_id'], 23)
+
+    def test_slow_address_keeps_natasha_result(self):
+        expected = parse_address(self.ADDRESS)
+        set_budget(max_seconds=1e-9)
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            first = parse_address(self.ADDRESS)
+            second = parse_address(self.ADDRESS)
+        self.assertIn('дольше порога', stderr.getvalue())
+        self.assertEqual(first, expected)
+        self.assertEqual(second, expected)
+
+    def test_threads_under_load_get_full_result(self):
+        addresses = [
+            '115191, г. Москва, Холодильный пер., д. 3, кв. 48',
+            self.ADDRESS,
+        ]
+        expected = [parse_address(address) for address in addresses]
+        stderr = io.StringIO()
+        # Восемь потоков делят GIL: по часам каждый адрес разбирается
+        # дольше порога, но процессорное время потока в него укладывается
+        with redirect_stderr(stderr), ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(parse_address, addresses * 8))
+        self.assertEqual(results, expected * 8)
+        self.assertEqual(stderr.getvalue(), '')
+
+
+class TestParseDate(unittest.TestCase):
+    def test_formats(self):
+        for value in (
+            '2024-03-05',
+            '2024-03-05T10:00:00',
+            '2024-03-05T10:00:00.123+03:00',
+            '05.03.2024',
+            '20240305',
+        ):
+            self.assertEqual(parse_date(value), date(2024, 3, 5))
+        for value in (None, '', '2024-02-30', 'вчера'):
+            self.assertIsNone(parse_date(value))
+
+    def test_mixed_formats_in_threads(self):
+        values = ['05.03.2024', '20240305', '05/03/2024'] * 200
+        # Без кэша, чтобы каждый вызов перебирал форматы
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(parse_date.__wrapped__, values))
+        self.assertEqual(results, [date(2024, 3, 5)] * len(values))
+
+
 class TestObligatoryPayment(unittest.TestCase):
     def test_obligatory_payment_fields(self):
         elem = MagicMock()
@@ -58,7 +337,7 @@ class TestObligatoryPayment(unittest.TestCase):
         }.get(tag)
         op = ObligatoryPayment(elem)
         self.assertEqual(op.name, 'Tax')
-        self.assertEqual(op.payment_sum, 123.45)
+        self.assertEqual(op.payment_sum, Decimal('123.45'))
 
 
 class TestMonetaryObligation(unittest.TestCase):
@@ -75,8 +354,8 @@ class TestMonetaryObligation(unittest.TestCase):
         self.assertEqual(mo.creditor_name, 'Creditor')
         self.assertEqual(mo.content, 'Loan')
         self.assertEqual(mo.basis, 'Contract')
-        self.assertEqual(mo.total_sum, 1000.0)
-        self.assertEqual(mo.debt_sum, 200.0)
+        self.assertEqual(mo.total_sum, Decimal('1000'))
+        self.assertEqual(mo.debt_sum, Decimal('200'))
 
 
 class TestExtrajudicialBankruptcyMessage(unittest.TestCase):
@@ -98,12 +377,26 @@ class TestExtrajudicialBankruptcyMessage(unittest.TestCase):
         self.assertEqual(d['id'], 'message42')
         self.assertEqual(d['number'], '42')
         self.assertEqual(d['type'], 'TestType')
-        self.assertEqual(d['publish_date'], '2025-01-01')
+        self.assertEqual(d['publish_date'], date(2025, 1, 1))
         self.assertEqual(d['finish_reason'], 'Done')
         self.assertIsNotNone(d['debtor'])
         self.assertIsNotNone(d['publisher'])
         self.assertIsInstance(d['banks'], list)
 
 
+class TestGenerateData(unittest.TestCase):
+    def test_generated_archive_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = os.path.join(tmp, 'first.xml.gz')
+            second = os.path.join(tmp, 'second.xml.gz')
+            generate(first, 50, seed=1)
+            generate(second, 50, seed=1)
+            with open(first, 'rb') as a, open(second, 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+            elements = list(iter_message_elements(first))
+            self.assertEqual(len(elements), 50)
+            self.assertIsNotNone(elements[0].findtext('Debtor/Address'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from bench_loader import CountingCursor, StatementStats, connect
+from save_to_sql import backfill_regions, insert_messages
+
+
+def make_message(message_id, debtor_name='Иванов Иван'):
+    return {
+        'id': message_id,
+        'number': message_id,
+        'type': 'ExtrajudicialBankruptcy',
+        'publish_date': '2024-01-05T10:00:00',
+        'finish_reason': None,
+        'debtor': {
+            'name': debtor_name,
+            'birth_date': '1980-01-01T00:00:00',
+            'birth_place': None,
+            'address': None,
+            'postal_code': None,
+            'region': 'г. Москва',
+            'region_id': 77,
+            'district': None,
+            'locality': None,
+            'street': None,
+            'house': None,
+            'flat': None,
+            'inn': '123',
+            'previous_names': ['Петров Иван'],
+        },
+        'publisher': {'name': 'МФЦ', 'inn': '1', 'ogrn': '2'},
+        'banks': [{'name': 'Банк', 'bik': '044525225'}],
+        'creditors_from_entrepreneurship': None,
+        'creditors_non_from_entrepreneurship': {
+            'obligatory_payments': [],
+            'monetary_obligations': [
+                {
+                    'creditor_name': 'ООО Альфа',
+                    'content': None,
+                    'basis': None,
+                    'total_sum': 100.0,
+                    'debt_sum': 50.0,
+                }
+            ],
+        },
+    }
+
+
+class TestInsertMessages(unittest.TestCase):
+    def setUp(self):
+        self.conn, paramstyle = connect('sqlite')
+        self.stats = StatementStats()
+        self.cur = CountingCursor(self.conn.cursor(), self.stats, paramstyle)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def count(self, table):
+        self.cur.execute(f'SELECT COUNT(*) FROM {table}')
+        return self.cur.fetchone()[0]
+
+    def test_repeated_debtor_is_stored_once(self):
+        insert_messages(self.cur, make_message('1'))
+        insert_messages(self.cur, make_message('2'))
+        self.assertEqual(self.count('ExtrajudicialBankruptcyMessage'), 2)
+        self.assertEqual(self.count('Debtor'), 1)
+        self.assertEqual(self.count('debtor_previous_name'), 1)
+        self.assertEqual(self.count('MonetaryObligation'), 1)
+        self.assertEqual(self.stats.count['INSERT Debtor'], 1)
+        self.cur.execute(
+            'SELECT r.name FROM Debtor d JOIN Region r ON r.id = d.region_id'
+        )
+        self.assertEqual(self.cur.fetchone()[0], 'г. Москва')
+
+    def test_known_debtors_skip_lookups(self):
+        debtors = {}
+        first = make_message('1')
+        second = make_message('2')
+        second['debtor']['previous_names'] = ['Петров Иван', 'Сидоров Иван']
+        insert_messages(self.cur, first, debtors)
+        insert_messages(self.cur, second, debtors)
+        insert_messages(self.cur, make_message('3'), debtors)
+        self.assertEqual(self.stats.count['SELECT Debtor'], 1)
+        self.assertEqual(self.stats.count['SELECT debtor_previous_name'], 0)
+        self.assertEqual(self.stats.count['INSERT debtor_previous_name'], 2)
+        self.assertEqual(self.count('Debtor'), 1)
+        self.assertEqual(self.count('debtor_previous_name'), 2)
+
+    def test_typed_values_match_strings(self):
+        typed = make_message('2')
+        typed['publish_date'] = date(2024, 1, 5)
+        typed['debtor']['birth_date'] = date(1980, 1, 1)
+        typed['creditors_non_from_entrepreneurship']['monetary_obligations'][
+            0
+        ].update(total_sum=Decimal('100.00'), debt_sum=Decimal('50.00'))
+        insert_messages(self.cur, make_message('1'))
+        insert_messages(self.cur, typed)
+        self.assertEqual(self.count('Debtor'), 1)
+        self.assertEqual(self.count('MonetaryObligation'), 1)
+        self.cur.execute(
+            'SELECT publish_date FROM ExtrajudicialBankruptcyMessage '
+            "WHERE message_id = '2'"
+        )
+        self.assertEqual(self.cur.fetchone()[0], '2024-01-05')
+
+
+class TestBackfillRegions(unittest.TestCase):
+    def setUp(self):
+        self.conn, paramstyle = connect('sqlite')
+        self.cur = CountingCursor(
+            self.conn.cursor(), StatementStats(), paramstyle
+        )
+
+    def tearDown(self):
+        self.conn.close()
+
+    def add_old_debtor(self, name, region, postal_code):
+        # Строка из базы, созданной до появления Debtor.region_id
+        self.cur.execute(
+            'INSERT INTO Debtor (name, region, postal_code) VALUES (%s, %s, %s)',
+            (name, region, postal_code),
+        )
+
+    def regions(self):
+        self.cur.execute('SELECT name, region, region_id FROM Debtor')
+        return sorted(self.cur.fetchall())
+
+    def test_backfill_resolves_old_rows(self):
+        self.add_old_debtor('А', 'Москва', None)
+        self.add_old_debtor('Б', 'неизвестно', '190000')
+        self.add_old_debtor('В', 'неизвестно', None)
+        self.assertEqual(backfill_regions(self.cur), 2)
+        self.assertEqual(
+            self.regions(),
+            [
+                ('А', 'г. Москва', 77),
+                ('Б', 'г. Санкт-Петербург', 78),
+                ('В', 'неизвестно', None),
+            ],
+        )
+
+    def test_known_debtor_gets_region_on_load(self):
+        insert_messages(self.cur, make_message('1'))
+        self.cur.execute('UPDATE Debtor SET region_id = NULL')
+        insert_messages(self.cur, make_message('2'))
+        self.assertEqual(self.regions(), [('Иванов Иван', 'г. Москва', 77)])
+
+
+if __name__ == '__main__':
+    unittest.main()
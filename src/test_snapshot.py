@@ -0,0 +1,157 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import pyarrow.dataset as ds
+
+from main import parse_messages
+from reports import (
+    load_obligations,
+    paid_percent,
+    top_by_obligations_count,
+    top_by_total_debt,
+)
+from snapshot import batches_from_messages, load_snapshot, write_snapshot
+from stream_reports import collect_stats
+
+# Обязательство перед X повторяется в первом сообщении дважды
+XML = """<?xml version="1.0" encoding="utf-8"?>
+<ExtrajudicialData>
+  <ExtrajudicialBankruptcyMessage>
+    <Id>1</Id><Number>1</Number><PublishDate>2024-01-05</PublishDate>
+    <Debtor><Name>A</Name><BirthDate>1980-01-01</BirthDate>
+      <Inn>1</Inn></Debtor>
+    <CreditorsNonFromEntrepreneurship><MonetaryObligations>
+      <MonetaryObligation><CreditorName>X</CreditorName>
+        <TotalSum>100</TotalSum><DebtSum>50</DebtSum></MonetaryObligation>
+      <MonetaryObligation><CreditorName>X</CreditorName>
+        <TotalSum>100.00</TotalSum><DebtSum>50</DebtSum></MonetaryObligation>
+      <MonetaryObligation><CreditorName>Y</CreditorName>
+        <TotalSum>300</TotalSum><DebtSum>0</DebtSum></MonetaryObligation>
+    </MonetaryObligations></CreditorsNonFromEntrepreneurship>
+  </ExtrajudicialBankruptcyMessage>
+  <ExtrajudicialBankruptcyMessage>
+    <Id>2</Id><Number>2</Number><PublishDate>2024-02-05</PublishDate>
+    <Debtor><Name>B</Name><BirthDate>1990-01-01</BirthDate>
+      <Inn>2</Inn></Debtor>
+    <CreditorsNonFromEntrepreneurship><MonetaryObligations>
+      <MonetaryObligation><CreditorName>Z</CreditorName>
+        <TotalSum>1000</TotalSum><DebtSum>400</DebtSum></MonetaryObligation>
+    </MonetaryObligations></CreditorsNonFromEntrepreneurship>
+  </ExtrajudicialBankruptcyMessage>
+</ExtrajudicialData>
+"""
+
+
+def make_message(message_id, publish_date, debtor_name, obligations):
+    return {
+        'id': message_id,
+        'number': message_id,
+        'type': 'ExtrajudicialBankruptcy',
+        'publish_date': publish_date,
+        'finish_reason': None,
+        'debtor': {
+            'name': debtor_name,
+            'birth_date': '1980-01-01',
+            'inn': f'inn-{debtor_name}',
+            'region': 'г. Москва',
+            'region_id': 77,
+        },
+        'publisher': {'name': 'Publisher', 'inn': None, 'ogrn': None},
+        'banks': [],
+        'creditors_from_entrepreneurship': None,
+        'creditors_non_from_entrepreneurship': {
+            'obligatory_payments': [],
+            'monetary_obligations': [
+                {
+                    'creditor_name': 'Creditor',
+                    'content': None,
+                    'basis': None,
+                    'total_sum': total_sum,
+                    'debt_sum': debt_sum,
+                }
+                for total_sum, debt_sum in obligations
+            ],
+        },
+    }
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        messages = [
+            make_message(
+                '1', '2024-01-05T10:00:00', 'A', [(100, 50), (10, 10)]
+            ),
+            make_message('2', '2024-02-05T10:00:00', 'B', [(200, 200)]),
+            make_message('3', '2024-02-06T10:00:00', 'A', []),
+        ]
+        self.tmp = tempfile.TemporaryDirectory()
+        write_snapshot(
+            batches_from_messages(messages, batch_size=2), self.tmp.name
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_partitions_and_filters(self):
+        df = load_snapshot(
+            self.tmp.name,
+            columns=['message_id'],
+            filters=[('publish_month', '=', '2024-02')],
+        )
+        self.assertEqual(sorted(df['message_id']), ['2', '3'])
+
+    def test_reports(self):
+        df = load_obligations(self.tmp.name)
+        self.assertEqual(len(df), 3)
+        top_count = top_by_obligations_count(df)
+        self.assertEqual(top_count.iloc[0]['debtor_name'], 'A')
+        self.assertEqual(top_count.iloc[0]['obligations_count'], 2)
+        top_debt = top_by_total_debt(df)
+        self.assertEqual(top_debt.iloc[0]['total_debt'], 200)
+        paid = paid_percent(df)
+        self.assertEqual(list(paid['paid_percent']), [0.0, 45.45])
+
+    def test_obligations_filter(self):
+        df = load_obligations(
+            self.tmp.name, ds.field('publish_month') >= '2024-02'
+        )
+        self.assertEqual(list(df['debtor_name']), ['B'])
+
+
+class TestSnapshotMatchesStreamReports(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.xml_path = os.path.join(self.tmp.name, 'data.xml.gz')
+        with gzip.open(self.xml_path, 'wt', encoding='utf-8') as xml_file:
+            xml_file.write(XML)
+        self.snapshot_path = os.path.join(self.tmp.name, 'snapshot')
+        write_snapshot(
+            batches_from_messages(
+                parse_messages(self.xml_path, address_level='region')
+            ),
+            self.snapshot_path,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_duplicated_obligation_counted_once(self):
+        df = load_obligations(self.snapshot_path)
+        stats = collect_stats(self.xml_path)
+        self.assertEqual(
+            top_by_obligations_count(df).to_dict('records'),
+            stats.top_by_obligations_count(),
+        )
+        self.assertEqual(
+            top_by_total_debt(df).to_dict('records'),
+            stats.top_by_total_debt(),
+        )
+        self.assertEqual(
+            paid_percent(df).to_dict('records'), stats.paid_percent()
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
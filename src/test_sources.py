@@ -0,0 +1,126 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sources
+from generate_data import generate
+from main import iter_message_elements, parse_messages
+
+XML = (
+    '<?xml version="1.0" encoding="utf-8"?><Root>'
+    + ''.join(
+        f'<ExtrajudicialBankruptcyMessage><Id>{i}</Id>'
+        '</ExtrajudicialBankruptcyMessage>'
+        for i in range(200)
+    )
+    + '</Root>'
+).encode('utf-8')
+
+
+class TestOpenSource(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def read_ids(self, path):
+        return [elem.findtext('Id') for elem in iter_message_elements(path)]
+
+    def test_formats_are_detected_by_magic(self):
+        expected = [str(i) for i in range(200)]
+        for name, data, source_format in (
+            ('plain.xml', XML, 'xml'),
+            ('packed.xml.gz', gzip.compress(XML), 'gzip'),
+            # Неверное расширение не мешает распознать gzip
+            ('packed.xml', gzip.compress(XML), 'gzip'),
+        ):
+            path = self.write(name, data)
+            with sources.open_source(path) as (_, detected):
+                self.assertEqual(detected, source_format)
+            self.assertEqual(self.read_ids(path), expected)
+
+    def test_multi_member_gzip(self):
+        half = len(XML) // 2
+        path = self.write(
+            'parts.xml.gz',
+            gzip.compress(XML[:half]) + gzip.compress(XML[half:]),
+        )
+        self.assertEqual(len(self.read_ids(path)), 200)
+
+    def test_member_at_read_boundary(self):
+        parts = [XML[:1000], XML[1000:3000], XML[3000:]]
+        packed = [gzip.compress(part) for part in parts]
+        members = []
+        with patch('sources.READ_SIZE', len(packed[0])):
+            data = b''.join(
+                sources.gzip_chunks(io.BytesIO(b''.join(packed)), members)
+            )
+        self.assertEqual(data, XML)
+        self.assertEqual(
+            members,
+            [
+                (0, 0),
+                (len(packed[0]), len(parts[0])),
+                (
+                    len(packed[0]) + len(packed[1]),
+                    len(parts[0]) + len(parts[1]),
+                ),
+            ],
+        )
+
+    def test_truncated_gzip_fails(self):
+        path = self.write('cut.xml.gz', gzip.compress(XML)[:-100])
+        with self.assertRaises(EOFError):
+            self.read_ids(path)
+
+    @patch('sources.READ_SIZE', 64)
+    def test_decompress_thread(self):
+        path = self.write('packed.xml.gz', gzip.compress(XML))
+        with sources.open_source(path, decompress_thread=True) as (f, _):
+            self.assertEqual(f.read(), XML)
+        # Разбор, прерванный на середине, останавливает поток распаковки
+        with sources.open_source(path, decompress_thread=True) as (f, _):
+            head = f.read(10)
+            self.assertTrue(head and XML.startswith(head))
+
+    def test_stdin(self):
+        stdin = io.TextIOWrapper(
+            io.BufferedReader(io.BytesIO(gzip.compress(XML)))
+        )
+        with patch('sys.stdin', stdin):
+            self.assertEqual(len(self.read_ids(sources.STDIN)), 200)
+
+    def test_empty_file(self):
+        path = self.write('empty.xml', b'')
+        with sources.open_source(path) as (f, source_format):
+            self.assertEqual((f.read(), source_format), (b'', 'xml'))
+
+    @unittest.skipIf(sources.zstandard is None, 'zstandard не установлен')
+    def test_zstd(self):
+        data = sources.zstandard.ZstdCompressor().compress(XML)
+        path = self.write('packed.xml.zst', data)
+        self.assertEqual(len(self.read_ids(path)), 200)
+
+    def test_same_messages_as_gzip(self):
+        path = os.path.join(self.tmp.name, 'data.xml.gz')
+        generate(path, 20, seed=11)
+        with gzip.open(path) as f:
+            plain = self.write('data.xml', f.read())
+        self.assertEqual(
+            parse_messages(plain, address_level='region'),
+            parse_messages(path, address_level='region'),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
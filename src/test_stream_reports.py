@@ -0,0 +1,99 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from main import iter_message_elements
+from stream_reports import collect_stats
+
+XML = """<?xml version="1.0" encoding="utf-8"?>
+<ExtrajudicialData>
+  <ExtrajudicialBankruptcyMessage>
+    <Id>1</Id>
+    <Debtor><Name>A</Name><BirthDate>1980-01-01T00:00:00</BirthDate>
+      <Inn>1</Inn></Debtor>
+    <CreditorsNonFromEntrepreneurship><MonetaryObligations>
+      <MonetaryObligation><CreditorName>X</CreditorName>
+        <TotalSum>100</TotalSum><DebtSum>50</DebtSum></MonetaryObligation>
+      <MonetaryObligation><CreditorName>X</CreditorName>
+        <TotalSum>100</TotalSum><DebtSum>50</DebtSum></MonetaryObligation>
+      <MonetaryObligation><CreditorName>Y</CreditorName>
+        <TotalSum>300</TotalSum><DebtSum>0</DebtSum></MonetaryObligation>
+    </MonetaryObligations></CreditorsNonFromEntrepreneurship>
+  </ExtrajudicialBankruptcyMessage>
+  <ExtrajudicialBankruptcyMessage>
+    <Id>2</Id>
+    <Debtor><Name>A</Name><BirthDate>1980-01-01</BirthDate>
+      <Inn>1</Inn></Debtor>
+    <CreditorsNonFromEntrepreneurship><MonetaryObligations>
+      <MonetaryObligation><CreditorName>X</CreditorName>
+        <TotalSum>100</TotalSum><DebtSum>50</DebtSum></MonetaryObligation>
+    </MonetaryObligations></CreditorsNonFromEntrepreneurship>
+  </ExtrajudicialBankruptcyMessage>
+  <ExtrajudicialBankruptcyMessage>
+    <Id>3</Id>
+    <Debtor><Name>B</Name><BirthDate>1990-01-01</BirthDate></Debtor>
+    <CreditorsNonFromEntrepreneurship><MonetaryObligations>
+      <MonetaryObligation><CreditorName>Z</CreditorName>
+        <TotalSum>1000</TotalSum><DebtSum>1000</DebtSum></MonetaryObligation>
+    </MonetaryObligations></CreditorsNonFromEntrepreneurship>
+  </ExtrajudicialBankruptcyMessage>
+  <ExtrajudicialBankruptcyMessage>
+    <Id>4</Id>
+    <Debtor><Name>C</Name></Debtor>
+  </ExtrajudicialBankruptcyMessage>
+</ExtrajudicialData>
+"""
+
+
+class TestStreamReports(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'data.xml.gz')
+        with gzip.open(self.path, 'wt', encoding='utf-8') as xml_file:
+            xml_file.write(XML)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_iter_message_elements(self):
+        ids = [
+            elem.findtext('Id') for elem in iter_message_elements(self.path)
+        ]
+        self.assertEqual(ids, ['1', '2', '3', '4'])
+
+    def test_reports_match_sql_semantics(self):
+        stats = collect_stats(self.path)
+        # Должник C без обязательств не попадает в отчёты (JOIN в SQL)
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(
+            stats.top_by_obligations_count(1),
+            [{'debtor_name': 'A', 'inn': '1', 'obligations_count': 3}],
+        )
+        self.assertEqual(
+            stats.top_by_total_debt(1),
+            [{'debtor_name': 'B', 'inn': None, 'total_debt': 1000.0}],
+        )
+        self.assertEqual(
+            stats.paid_percent(),
+            [
+                {
+                    'debtor_name': 'B',
+                    'inn': None,
+                    'TotalSum': 1000.0,
+                    'DebtSum': 0.0,
+                    'paid_percent': 0,
+                },
+                {
+                    'debtor_name': 'A',
+                    'inn': '1',
+                    'TotalSum': 500.0,
+                    'DebtSum': 400.0,
+                    'paid_percent': 80.0,
+                },
+            ],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+from matplotlib.figure import Figure
+
+from batch_render import build_jobs, load_manifest, render_batch, render_job
+from visualization import (
+    DebtAggregator,
+    compute_aggregates,
+    draw_region_debt,
+    prepare_data,
+)
+
+
+class TestComputeAggregates(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame(
+            {
+                'region_id': [77, 77, 69, None],
+                'birth_date': ['1990-05-01', '1960-01-01', None, '2000-01-01'],
+                'debt_sum': [100.0, 50.0, 25.0, 10.0],
+            }
+        )
+
+    def test_aggregates(self):
+        aggregates = compute_aggregates(
+            prepare_data(self.df), now=datetime(2025, 1, 1)
+        )
+        self.assertEqual(aggregates['region_debt'][77], 150.0)
+        self.assertEqual(aggregates['region_debt'][69], 25.0)
+        self.assertEqual(aggregates['age_debt']['Группа 30 летних'], 100.0)
+        self.assertEqual(aggregates['age_debt']['Группа 60 летних'], 50.0)
+        self.assertEqual(aggregates['age_debt']['Группа 20 летних'], 10.0)
+        self.assertEqual(aggregates['age_counts'].sum(), 3)
+
+    def test_prepare_data_does_not_mutate(self):
+        prepared = prepare_data(self.df)
+        self.assertEqual(self.df['region_id'].dtype, 'float64')
+        self.assertIsInstance(prepared['region_id'].dtype, pd.CategoricalDtype)
+        self.assertEqual(prepared['debt_sum'].dtype, 'float64')
+
+    def test_large_sums_keep_kopecks(self):
+        df = pd.DataFrame(
+            {
+                'region_id': [77, 77],
+                'birth_date': [None, None],
+                'debt_sum': [Decimal('1234567.89'), Decimal('7654321.01')],
+            }
+        )
+        aggregates = compute_aggregates(prepare_data(df))
+        self.assertEqual(round(aggregates['region_debt'][77], 2), 8888888.9)
+
+    def test_aggregator_matches_single_pass(self):
+        now = datetime(2025, 1, 1)
+        expected = compute_aggregates(prepare_data(self.df), now=now)
+        aggregator = DebtAggregator(now=now)
+        for start in range(0, len(self.df), 3):
+            aggregator.add(prepare_data(self.df.iloc[start : start + 3]))
+        result = aggregator.result()
+        for key in ('region_debt', 'age_debt', 'age_counts'):
+            pd.testing.assert_series_equal(
+                result[key].sort_index(),
+                expected[key].sort_index(),
+                check_dtype=False,
+                check_index_type=False,
+                check_categorical=False,
+            )
+
+    def test_region_labels_come_from_dictionary(self):
+        aggregates = compute_aggregates(prepare_data(self.df))
+        ax = Figure().add_subplot()
+        draw_region_debt(ax, aggregates)
+        self.assertEqual(
+            [label.get_text() for label in ax.get_xticklabels()],
+            ['г. Москва', 'Тверская область'],
+        )
+
+
+class TestBatchRender(unittest.TestCase):
+    def test_unchanged_charts_are_skipped(self):
+        df = prepare_data(
+            pd.DataFrame(
+                {
+                    'region_id': [77, 69],
+                    'birth_date': ['1990-05-01', '1960-01-01'],
+                    'debt_sum': [100.0, 50.0],
+                }
+            )
+        )
+        df['publisher_name'] = pd.Categorical(['P', 'P'])
+        df['publish_month'] = pd.Categorical(['2024-01', '2024-02'])
+        with tempfile.TemporaryDirectory() as out_dir:
+            jobs, skipped = build_jobs(df, out_dir)
+            # все данные, 2 региона, 1 источник, 2 месяца — по 2 графика
+            self.assertEqual((len(jobs), skipped), (12, 0))
+            manifest = dict(render_job(job) for job in jobs[:2])
+            self.assertTrue(os.path.exists(jobs[0][3]))
+            jobs, skipped = build_jobs(df, out_dir, manifest)
+            self.assertEqual((len(jobs), skipped), (10, 2))
+
+    def test_empty_slices_get_placeholder(self):
+        df = prepare_data(
+            pd.DataFrame(
+                {
+                    'region_id': [77, 69],
+                    'birth_date': ['1990-05-01', None],
+                    'debt_sum': [100.0, 0.0],
+                }
+            )
+        )
+        df['publisher_name'] = pd.Categorical(['P', 'P'])
+        df['publish_month'] = pd.Categorical(['2024-01', '2024-02'])
+        with tempfile.TemporaryDirectory() as out_dir:
+            # Разрезы «Тверская область» и «2024-02» без ненулевых долгов
+            self.assertEqual(render_batch(df, out_dir, workers=1), (12, 0, 0))
+            manifest = load_manifest(out_dir)
+            empty = os.path.join(
+                out_dir, 'region_id', 'Тверская_область', 'age_debt.png'
+            )
+            self.assertIn(empty, manifest)
+            self.assertTrue(os.path.exists(empty))
+
+
+if __name__ == '__main__':
+    unittest.main()
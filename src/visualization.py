@@ -4,30 +4,36 @@
 Для визуализации — matplotlib
 """
 
+import argparse
 from datetime import datetime
 
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
 import pymysql
 
+import profiling
+from regions import REGION_NAMES
+from snapshot import SNAPSHOT_PATH, load_snapshot
 
-def load_data():
-    """
-    Загружает данные о регионе, дате рождения и сумме долга
-    из базы данных.
-    :return: DataFrame с колонками region, birth_date, debt_sum
-    """
-    conn = pymysql.connect(
-        host='localhost',
-        user='root',
-        password='',
-        database='BankruptcyMessages',
-        charset='utf8mb4',
-    )
-    query = """
+
+# Конфигурация подключения к базе данных MySQL
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '',
+    'database': 'BankruptcyMessages',
+    'charset': 'utf8mb4',
+}
+
+# Размер порции строк по умолчанию для потоковой загрузки
+DEFAULT_CHUNKSIZE = 50_000
+
+DEBT_QUERY = """
     SELECT
-        d.region,
+        d.region_id,
         d.birth_date,
         mo.debt_sum
     FROM
@@ -39,72 +45,283 @@ def load_data():
     WHERE
         mo.debt_sum IS NOT NULL
     """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
 
 
-def plot_region_debt(df, save_path=None):
+def load_data():
     """
-    Строит столбчатую диаграмму по сумме долгов в разрезе регионов.
-    Сохраняет график в PNG, если указан save_path, иначе показывает на экране.
+    Загружает данные о регионе, дате рождения и сумме долга
+    из базы данных.
+    :return: DataFrame с колонками region_id, birth_date, debt_sum
+        в компактных типах (см. prepare_data)
+    """
+    conn = pymysql.connect(**DB_CONFIG)
+    try:
+        df = pd.read_sql(DEBT_QUERY, conn)
+    finally:
+        conn.close()
+    return prepare_data(df)
 
-    :param df: DataFrame с колонками region и debt_sum
-    :param save_path: путь для сохранения PNG-файла (или None)
+
+def load_snapshot_data(path=SNAPSHOT_PATH, filters=None):
+    """
+    Загружает те же данные, что и load_data, из локального снимка
+    (см. snapshot.py) без обращения к базе данных.
+    :param path: директория снимка
+    :param filters: дополнительное условие pyarrow.dataset.Expression,
+        например ds.field('publish_month') >= '2024-01'
+    :return: DataFrame с колонками region_id, birth_date, debt_sum
+        в компактных типах (см. prepare_data)
+    """
+    condition = ds.field('debt_sum').is_valid()
+    if filters is not None:
+        condition = condition & filters
+    df = load_snapshot(
+        path,
+        columns=['region_id', 'birth_date', 'debt_sum'],
+        filters=condition,
+    )
+    return prepare_data(df)
+
+
+def iter_data(chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Потоково читает те же данные, что и load_data, порциями по chunksize
+    строк. Используется серверный курсор, поэтому MySQL не передаёт
+    клиенту весь результат сразу и память ограничена размером порции.
+
+    :param chunksize: количество строк в порции
+    :return: генератор DataFrame в компактных типах (см. prepare_data)
     """
+    conn = pymysql.connect(**DB_CONFIG, cursorclass=pymysql.cursors.SSCursor)
+    try:
+        for chunk in pd.read_sql(DEBT_QUERY, conn, chunksize=chunksize):
+            yield prepare_data(chunk)
+    finally:
+        conn.close()
+
+
+# Возрастные группы по 10 лет: [10, 20), [20, 30), ... [80, 90)
+AGE_BINS = list(range(10, 100, 10))
+AGE_LABELS = [f'Группа {b} летних' for b in AGE_BINS[:-1]]
+
 
-    # Группируем и сортируем по сумме долгов по регионам
-    region_debt = (
-        df.groupby('region')['debt_sum'].sum().sort_values(ascending=False)
+def prepare_data(df):
+    """
+    Приводит типы колонок к компактным: код региона (region_id из
+    справочника regions.py) — категориальный тип, дата рождения —
+    datetime64, сумма долга — float64 (у float32 около 7 значащих цифр,
+    и суммы от 100 тыс. руб. теряют копейки). Группировка идёт по коду,
+    поэтому разные написания одного субъекта попадают в одну группу.
+    Исходный DataFrame не изменяется.
+
+    :param df: DataFrame с колонками region_id, birth_date, debt_sum
+    :return: новый DataFrame с компактными типами
+    """
+    return pd.DataFrame(
+        {
+            'region_id': pd.to_numeric(df['region_id'], errors='coerce')
+            .astype('Int16')
+            .astype('category'),
+            'birth_date': pd.to_datetime(df['birth_date'], errors='coerce'),
+            'debt_sum': pd.to_numeric(df['debt_sum'], errors='coerce')
+            .fillna(0)
+            .astype('float64'),
+        }
     )
+
+
+def age_group_codes(birth_date, now=None):
+    """
+    Векторно вычисляет номер возрастной группы для каждой даты рождения.
+    Возраст считается как разница календарных лет.
+
+    :param birth_date: Series с датами рождения
+    :param now: дата, относительно которой считается возраст
+    :return: массив int8, -1 — возраст вне групп или неизвестен
+    """
+    now = now or datetime.now()
+    years = pd.to_datetime(birth_date, errors='coerce').dt.year
+    age = now.year - years.to_numpy(dtype='float64', na_value=np.nan)
+    codes = np.floor_divide(age, 10) - 1
+    valid = (codes >= 0) & (codes < len(AGE_LABELS))
+    return np.where(valid, codes, -1).astype('int8')
+
+
+def compute_aggregates(df, now=None):
+    """
+    За один проход по данным считает суммы долгов по регионам,
+    суммы долгов и количество записей по возрастным группам.
+
+    :param df: DataFrame с колонками region_id, birth_date, debt_sum
+    :param now: дата, относительно которой считается возраст
+    :return: словарь с Series region_debt (по кодам регионов),
+        age_debt, age_counts
+    """
+    region = df['region_id']
+    if not isinstance(region.dtype, pd.CategoricalDtype):
+        region = region.astype('category')
+    debt = df['debt_sum'].to_numpy(dtype='float64', na_value=0)
+
+    region_codes = region.cat.codes.to_numpy()
+    known = region_codes >= 0
+    region_sums = np.bincount(
+        region_codes[known],
+        weights=debt[known],
+        minlength=len(region.cat.categories),
+    )
+
+    age_codes = age_group_codes(df['birth_date'], now)
+    in_group = age_codes >= 0
+    age_sums = np.bincount(
+        age_codes[in_group], weights=debt[in_group], minlength=len(AGE_LABELS)
+    )
+    age_counts = np.bincount(age_codes[in_group], minlength=len(AGE_LABELS))
+
+    return {
+        'region_debt': pd.Series(
+            region_sums,
+            index=pd.Index(region.cat.categories, name='region_id'),
+        ),
+        'age_debt': pd.Series(
+            age_sums, index=pd.Index(AGE_LABELS, name='age_group')
+        ),
+        'age_counts': pd.Series(
+            age_counts, index=pd.Index(AGE_LABELS, name='age_group')
+        ),
+    }
+
+
+class DebtAggregator:
+    """
+    Накопитель агрегатов для потоковой обработки: каждая порция данных
+    сворачивается в текущие суммы по регионам и возрастным группам,
+    сами строки после этого не хранятся.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.now()
+        self.region_debt = pd.Series(
+            dtype='float64', index=pd.Index([], name='region_id')
+        )
+        self.age_debt = np.zeros(len(AGE_LABELS))
+        self.age_counts = np.zeros(len(AGE_LABELS), dtype='int64')
+
+    def add(self, df):
+        """
+        Добавляет порцию данных к накопленным агрегатам.
+
+        :param df: DataFrame с колонками region_id, birth_date, debt_sum
+        """
+        part = compute_aggregates(df, self.now)
+        self.region_debt = self.region_debt.add(
+            part['region_debt'], fill_value=0
+        )
+        self.age_debt += part['age_debt'].to_numpy()
+        self.age_counts += part['age_counts'].to_numpy()
+
+    def result(self):
+        """
+        :return: агрегаты в том же виде, что и compute_aggregates
+        """
+        index = pd.Index(AGE_LABELS, name='age_group')
+        return {
+            'region_debt': self.region_debt.copy(),
+            'age_debt': pd.Series(self.age_debt, index=index),
+            'age_counts': pd.Series(self.age_counts, index=index),
+        }
+
+
+def load_aggregates(chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Строит агрегаты для графиков потоково, не загружая
+    весь результат запроса в память.
+
+    :param chunksize: количество строк в порции
+    :return: агрегаты в том же виде, что и compute_aggregates
+    """
+    aggregator = DebtAggregator()
+    for chunk in iter_data(chunksize):
+        aggregator.add(chunk)
+    return aggregator.result()
+
+
+def _as_aggregates(data):
+    """
+    Принимает DataFrame или уже посчитанные агрегаты
+    и возвращает агрегаты.
+    """
+    if isinstance(data, pd.DataFrame):
+        return compute_aggregates(data)
+    return data
+
+
+REGION_TITLE = 'Сумма долгов по регионам'
+AGE_TITLE = (
+    'Доля суммы долгов по возрастным группам\n(в скобках — количество людей)'
+)
+REGION_FIGSIZE = (12, 6)
+AGE_FIGSIZE = (8, 8)
+NO_DATA_TEXT = 'Нет данных о долгах'
+
+
+def draw_no_data(ax, title):
+    """
+    Рисует на осях ax заглушку для разреза без ненулевых долгов.
+    """
+    ax.set_title(title)
+    ax.text(0.5, 0.5, NO_DATA_TEXT, ha='center', va='center')
+    ax.set_axis_off()
+
+
+def draw_region_debt(ax, aggregates, title=REGION_TITLE):
+    """
+    Рисует на осях ax столбчатую диаграмму по сумме долгов
+    в разрезе регионов.
+
+    :param ax: matplotlib.axes.Axes
+    :param aggregates: агрегаты из compute_aggregates
+    :param title: заголовок графика
+    """
+
+    # Сортируем по сумме долгов по регионам, подписи — из справочника
+    region_debt = aggregates['region_debt'].sort_values(ascending=False)
     region_debt = region_debt[region_debt > 0]
-    fig, ax = plt.subplots(figsize=(12, 6))
+    if region_debt.empty:
+        draw_no_data(ax, title)
+        return
+    region_debt.index = [
+        REGION_NAMES.get(region_id, region_id)
+        for region_id in region_debt.index
+    ]
     region_debt.plot(kind='bar', ax=ax)
-    plt.title('Сумма долгов по регионам')
-    plt.ylabel('Сумма долга')
-    plt.xlabel('Регион')
-    plt.xticks(rotation=45, ha='right')
+    ax.set_title(title)
+    ax.set_ylabel('Сумма долга')
+    ax.set_xlabel('Регион')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
 
     # Форматируем ось Y в миллионах
     ax.yaxis.set_major_formatter(
         mticker.FuncFormatter(lambda x, _: f'{x / 1_000_000:.1f} млн')
     )
-    plt.tight_layout()
-    if save_path:
-        save_plot_to_png(fig, save_path)
-    else:
-        plt.show()
 
 
-def plot_age_debt(df, save_path=None):
+def draw_age_debt(ax, aggregates, title=AGE_TITLE):
     """
-    Строит круговую диаграмму по сумме долгов в разрезе возрастных групп.
-    Сохраняет график в PNG, если указан save_path, иначе показывает на экране.
+    Рисует на осях ax круговую диаграмму по сумме долгов
+    в разрезе возрастных групп.
 
-    :param df: DataFrame с колонками birth_date и debt_sum
-    :param save_path: путь для сохранения PNG-файла (или None)
+    :param ax: matplotlib.axes.Axes
+    :param aggregates: агрегаты из compute_aggregates
+    :param title: заголовок графика
     """
 
-    # Преобразуем дату рождения в возраст
-    df['birth_date'] = pd.to_datetime(df['birth_date'], errors='coerce')
-    df['age'] = df['birth_date'].apply(
-        lambda x: datetime.now().year - x.year if pd.notnull(x) else None
-    )
-
-    # Формируем возрастные группы по 10 лет
-    bins = list(range(10, 100, 10))
-    labels = [f'Группа {b} летних' for b in bins]
-    df['age_group'] = pd.cut(
-        df['age'], bins=bins, labels=labels[:-1], right=False
-    )
-
-    # Сумма долгов по возрастным группам
-    age_debt = df.groupby('age_group', observed=False)['debt_sum'].sum()
+    # Сумма долгов и количество людей по возрастным группам
+    age_debt = aggregates['age_debt']
     age_debt = age_debt[age_debt > 0]
-
-    # Количество людей в каждой возрастной группе
-    age_counts = df['age_group'].value_counts(sort=False).sort_index()
-    age_counts = age_counts.loc[age_debt.index]
+    if age_debt.empty:
+        draw_no_data(ax, title)
+        return
+    age_counts = aggregates['age_counts'].loc[age_debt.index]
 
     # Подписи для круговой диаграммы "пример — Группа 30 летних (25 чел)"
     pie_labels = [
@@ -112,7 +329,6 @@ def plot_age_debt(df, save_path=None):
         for group, count in zip(age_debt.index, age_counts)
     ]
 
-    fig, ax = plt.subplots(figsize=(8, 8))
     age_debt.plot(
         kind='pie',
         labels=pie_labels,
@@ -122,11 +338,39 @@ def plot_age_debt(df, save_path=None):
         legend=False,
         ax=ax,
     )
-    plt.title(
-        'Доля суммы долгов по возрастным группам\n'
-        '(в скобках — количество людей)'
-    )
-    plt.tight_layout()
+    ax.set_title(title)
+
+
+def plot_region_debt(data, save_path=None):
+    """
+    Строит столбчатую диаграмму по сумме долгов в разрезе регионов.
+    Сохраняет график в PNG, если указан save_path, иначе показывает на экране.
+
+    :param data: DataFrame с колонками region_id и debt_sum
+        или агрегаты из compute_aggregates
+    :param save_path: путь для сохранения PNG-файла (или None)
+    """
+    fig, ax = plt.subplots(figsize=REGION_FIGSIZE)
+    draw_region_debt(ax, _as_aggregates(data))
+    fig.tight_layout()
+    if save_path:
+        save_plot_to_png(fig, save_path)
+    else:
+        plt.show()
+
+
+def plot_age_debt(data, save_path=None):
+    """
+    Строит круговую диаграмму по сумме долгов в разрезе возрастных групп.
+    Сохраняет график в PNG, если указан save_path, иначе показывает на экране.
+
+    :param data: DataFrame с колонками birth_date и debt_sum
+        или агрегаты из compute_aggregates
+    :param save_path: путь для сохранения PNG-файла (или None)
+    """
+    fig, ax = plt.subplots(figsize=AGE_FIGSIZE)
+    draw_age_debt(ax, _as_aggregates(data))
+    fig.tight_layout()
     if save_path:
         save_plot_to_png(fig, save_path)
     else:
@@ -144,15 +388,53 @@ def save_plot_to_png(fig, filename):
     plt.close(fig)
 
 
-def main():
+def main(stream=False, chunksize=DEFAULT_CHUNKSIZE, snapshot=None):
     """
     Основная функция: загружает данные и строит графики
     по регионам и возрастным группам.
+
+    :param stream: читать данные порциями и считать агрегаты на лету
+    :param chunksize: количество строк в порции при потоковом чтении
+    :param snapshot: директория локального снимка; если указана,
+        данные читаются из него, а не из БД
     """
-    df = load_data()
-    plot_region_debt(df, save_path='region_debt.png')
-    plot_age_debt(df, save_path='age_debt.png')
+    if snapshot:
+        aggregates = compute_aggregates(load_snapshot_data(snapshot))
+    elif stream:
+        aggregates = load_aggregates(chunksize)
+    else:
+        aggregates = compute_aggregates(load_data())
+    plot_region_debt(aggregates, save_path='region_debt.png')
+    plot_age_debt(aggregates, save_path='age_debt.png')
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Построение графиков')
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='читать данные из БД порциями (серверный курсор)',
+    )
+    parser.add_argument(
+        '--chunksize',
+        type=int,
+        default=DEFAULT_CHUNKSIZE,
+        help='количество строк в порции при потоковом чтении',
+    )
+    parser.add_argument(
+        '--snapshot',
+        nargs='?',
+        const=SNAPSHOT_PATH,
+        help='строить графики по локальному снимку (snapshot.py)',
+    )
+    # Графики строятся по агрегатам, а не по сообщениям: снимкам
+    # tracemalloc после N сообщений здесь неоткуда взяться
+    profiling.add_arguments(parser, messages=False)
+    args = parser.parse_args()
+    profiling.run(
+        args,
+        main,
+        stream=args.stream,
+        chunksize=args.chunksize,
+        snapshot=args.snapshot,
+    )